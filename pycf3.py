@@ -29,11 +29,42 @@ __all__ = [
     "AbstractClient",
     "NAM",
     "CF3",
+    "AsyncAbstractClient",
+    "AsyncNAM",
+    "AsyncCF3",
+    "CatalogRunner",
     "Result",
+    "ResultSet",
+    "ResultView",
+    "RaggedArray",
     "NoCache",
+    "default_cache",
+    "MemoryCache",
+    "MappedCache",
+    "CacheBackend",
+    "RedisCache",
+    "TwoLevelCache",
+    "ExpirePolicy",
+    "AlwaysExpire",
+    "LazyExpire",
+    "CountExpire",
+    "TimerExpire",
     "RetrySession",
+    "SingleFlight",
     "CFDeprecationWarning",
     "MixedCoordinateSystemError",
+    "RowError",
+    "Quantization",
+    "NearestMatch",
+    "SpatialIndex",
+    "WarmReport",
+    "CacheStats",
+    "CacheUsage",
+    "sky_tiling",
+    "export_bundle",
+    "import_bundle",
+    "merge_bundles",
+    "main",
 ]
 
 __version__ = "2022.11"
@@ -43,13 +74,33 @@ __version__ = "2022.11"
 # IMPORTS
 # =============================================================================
 
+import argparse
+import asyncio
+import contextlib
+import hashlib
 import itertools as it
 import json
+import mmap
 import os
+import struct
+import sys
+import threading
+import time
 import typing as t
-from collections import namedtuple
-from collections.abc import MutableMapping
-from enum import Enum
+import weakref
+import zlib
+from collections import Counter, OrderedDict, deque, namedtuple
+from collections.abc import Mapping, MutableMapping
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    as_completed,
+    wait as futures_wait,
+)
+from enum import Enum, IntFlag
+from http import HTTPStatus
 
 import attr
 
@@ -83,6 +134,35 @@ class Parameter(Enum):
     velocity = "velocity"
 
 
+class RowError(IntFlag):
+    """Flags of the problems found validating the rows of a batch."""
+
+    #: The row is valid.
+    NONE = 0
+
+    #: The alpha coordinate is NaN or infinite.
+    ALPHA_NAN = 1
+
+    #: The delta coordinate is NaN.
+    DELTA_NAN = 2
+
+    #: The delta coordinate is < -90 or > 90.
+    DELTA_OUT_OF_RANGE = 4
+
+    #: The distance or velocity is NaN.
+    VALUE_NAN = 8
+
+    #: The distance or velocity is <= 0.
+    VALUE_NOT_POSITIVE = 16
+
+    #: The distance or velocity is greater than the maximum of the client.
+    VALUE_OUT_OF_RANGE = 32
+
+    #: The calculator failed (an HTTP error or the retries were exhausted),
+    #: now or in the negative cache.
+    CALCULATOR_ERROR = 64
+
+
 ALPHA = {
     CoordinateSystem.equatorial: "ra",
     CoordinateSystem.galactic: "glon",
@@ -108,6 +188,42 @@ PYCF3_DATA = os.path.expanduser(os.path.join("~", "pycf3_data"))
 
 DEFAULT_CACHE_DIR = os.path.join(PYCF3_DATA, "_cache_")
 
+#: Maximum size in bytes of the default cache (1 GB, as ``diskcache``).
+DEFAULT_CACHE_SIZE_LIMIT = 2**30
+
+#: Eviction policy of the default cache (as ``diskcache``). The reads don't
+#: write to the cache (unlike ``"least-recently-used"`` and
+#: ``"least-frequently-used"``), so many processes can share it.
+DEFAULT_CACHE_EVICTION_POLICY = "least-recently-stored"
+
+# binary cache keys: calculator id, coordinate system id, parameter id,
+# alpha, delta and value
+_CACHE_KEY = struct.Struct("<IBBddd")
+
+# the same layout of the binary keys as a numpy structured dtype
+_CACHE_KEY_DTYPE = np.dtype(
+    [
+        ("calculator", "<u4"),
+        ("system", "u1"),
+        ("parameter", "u1"),
+        ("alpha", "<f8"),
+        ("delta", "<f8"),
+        ("value", "<f8"),
+    ]
+)
+
+_COORDINATE_SYSTEM_ID = {
+    CoordinateSystem.equatorial: 0,
+    CoordinateSystem.galactic: 1,
+    CoordinateSystem.supergalactic: 2,
+}
+
+_ID_COORDINATE_SYSTEM = {v: k for k, v in _COORDINATE_SYSTEM_ID.items()}
+
+_PARAMETER_ID = {Parameter.distance: 0, Parameter.velocity: 1}
+
+_ID_PARAMETER = {v: k for k, v in _PARAMETER_ID.items()}
+
 RESULT_HTML_TEMPLATE = """
 <div class="result-container" id="result-{{ id_result }}">
     <div class="result-css">
@@ -207,6 +323,78 @@ RESULT_HTML_TEMPLATE = """
 """
 
 
+# =============================================================================
+# COORDINATE TRANSFORMATIONS
+# =============================================================================
+
+# rotation from J2000 equatorial to galactic cartesian coordinates
+_EQUATORIAL_TO_GALACTIC = np.array(
+    [
+        [-0.0548755604162154, -0.8734370902348850, -0.4838350155487132],
+        [+0.4941094278755837, -0.4448296299600112, +0.7469822444972189],
+        [-0.8676661490190047, -0.1980763734312015, +0.4559837761750669],
+    ]
+)
+
+# rotation from galactic to supergalactic cartesian coordinates; the rows
+# are the directions of SGL=0, SGL=90 and the supergalactic pole
+# (l=47.37, b=6.32) in galactic coordinates
+_GALACTIC_TO_SUPERGALACTIC = np.array(
+    [
+        [-0.7357425748043749, +0.6772612964138943, +0.0000000000000000],
+        [-0.0745537783652337, -0.0809914713069767, +0.9939225903997749],
+        [+0.6731453021092076, +0.7312711658169645, +0.1100812622247821],
+    ]
+)
+
+_TO_SUPERGALACTIC = {
+    CoordinateSystem.equatorial: (
+        _GALACTIC_TO_SUPERGALACTIC @ _EQUATORIAL_TO_GALACTIC
+    ),
+    CoordinateSystem.galactic: _GALACTIC_TO_SUPERGALACTIC,
+    CoordinateSystem.supergalactic: np.identity(3),
+}
+
+
+# decimals of the canonical cache keys (0.36 arcseconds), coarser than the
+# precision of the catalog coordinates (~1e-5 degrees) after the rotation
+_CANONICAL_DECIMALS = 4
+
+
+def _to_supergalactic_many(coordinate_system, alpha, delta, decimals=6):
+    """Convert arrays of positions to supergalactic coordinates in degrees.
+
+    The result is rounded to ``decimals`` to absorb the floating point
+    error of the rotation, and at the poles the longitude is always ``0``.
+
+    """
+    alpha = np.radians(np.atleast_1d(np.asarray(alpha, dtype=float)))
+    delta = np.radians(np.atleast_1d(np.asarray(delta, dtype=float)))
+    cos_delta = np.cos(delta)
+    vectors = np.stack(
+        [cos_delta * np.cos(alpha), cos_delta * np.sin(alpha), np.sin(delta)]
+    )
+    x, y, z = _TO_SUPERGALACTIC[coordinate_system] @ vectors
+
+    sgl = np.round(np.degrees(np.arctan2(y, x)) % 360.0, decimals) % 360.0
+    sgb = np.round(np.degrees(np.arcsin(np.clip(z, -1.0, 1.0))), decimals)
+    sgl[np.abs(sgb) == 90.0] = 0.0
+    return sgl, sgb
+
+
+def _to_supergalactic(coordinate_system, alpha, delta, decimals=6):
+    """Convert a position to supergalactic coordinates in degrees.
+
+    The same conversion of ``_to_supergalactic_many()``, so a position
+    produces the same cache key alone or in a batch.
+
+    """
+    sgl, sgb = _to_supergalactic_many(
+        coordinate_system, [alpha], [delta], decimals=decimals
+    )
+    return float(sgl[0]), float(sgb[0])
+
+
 # =============================================================================
 # EXCEPTIONS
 # =============================================================================
@@ -253,6 +441,10 @@ class RetrySession(requests.Session):
         response status code is in status_forcelist.
         By default, this is ``500, 502, 504``.
 
+    pool_size: ``int`` (default: ``requests.adapters.DEFAULT_POOLSIZE``)
+        Maximum number of connections to keep open for every host. It must
+        be at least the number of threads that share the session.
+
     """
 
     def __init__(
@@ -260,6 +452,7 @@ class RetrySession(requests.Session):
         retries=3,
         backoff_factor=0.3,
         status_forcelist=(500, 502, 504),
+        pool_size=requests.adapters.DEFAULT_POOLSIZE,
         **session_options,
     ):
         """Create a new instance."""
@@ -273,11 +466,85 @@ class RetrySession(requests.Session):
             backoff_factor=backoff_factor,
             status_forcelist=status_forcelist,
         )
-        self.adapter_ = requests.adapters.HTTPAdapter(max_retries=self.retry_)
+        self.pool_size_ = None
+        self.resize_pool(pool_size)
+
+        self.total_backoff_ = float(backoff_factor) * (2 ** (retries - 1))
+
+    def resize_pool(self, pool_size):
+        """Mount a new adapter with a connection pool of the given size.
+
+        The adapter is only replaced if the size changes.
+
+        Parameters
+        ----------
+        pool_size: ``int``
+            Maximum number of connections to keep open for every host.
+
+        """
+        if pool_size == self.pool_size_:
+            return
+        self.adapter_ = requests.adapters.HTTPAdapter(
+            max_retries=self.retry_,
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+        )
         self.mount("http://", self.adapter_)
         self.mount("https://", self.adapter_)
+        self.pool_size_ = pool_size
 
-        self.total_backoff_ = float(backoff_factor) * (2 ** (retries - 1))
+
+# =============================================================================
+# DEFAULT CACHE
+# =============================================================================
+
+
+def default_cache(
+    directory=DEFAULT_CACHE_DIR,
+    size_limit=DEFAULT_CACHE_SIZE_LIMIT,
+    eviction_policy=DEFAULT_CACHE_EVICTION_POLICY,
+):
+    """Create the ``diskcache.Cache`` used by default by the clients.
+
+    The cache has an index over the tags of the entries (the calculator and
+    the coordinate system), so the ``evict()`` of the clients doesn't scan
+    the whole cache. The default size limit and eviction policy are the
+    same of ``diskcache``; they can be changed here or with the
+    ``cache_size_limit`` and ``cache_eviction_policy`` of the clients. The
+    settings are persisted in the cache directory.
+
+    Parameters
+    ----------
+    directory : ``str`` (default: ``pycf3.DEFAULT_CACHE_DIR``)
+        Directory of the cache.
+    size_limit : ``int`` (default: ``pycf3.DEFAULT_CACHE_SIZE_LIMIT``)
+        Approximate maximum size of the cache in bytes. When it's exceeded
+        the entries are evicted with the ``eviction_policy``.
+    eviction_policy : ``str``
+        (default: ``pycf3.DEFAULT_CACHE_EVICTION_POLICY``)
+        ``"least-recently-stored"``, ``"least-recently-used"``,
+        ``"least-frequently-used"`` or ``"none"`` (never evict).
+
+    Returns
+    -------
+    diskcache.Cache :
+        The cache.
+
+    """
+    if eviction_policy not in dcache.EVICTION_POLICY:
+        policies = ", ".join(map(repr, dcache.EVICTION_POLICY))
+        raise ValueError(
+            f"Unknown eviction_policy {eviction_policy!r}. "
+            f"Use one of {policies}"
+        )
+    if size_limit <= 0:
+        raise ValueError("size_limit must be > 0")
+    return dcache.Cache(
+        directory=directory,
+        size_limit=size_limit,
+        eviction_policy=eviction_policy,
+        tag_index=True,
+    )
 
 
 # =============================================================================
@@ -300,6 +567,10 @@ class NoCache(MutableMapping):
         """Return 0."""
         return 0
 
+    def evict(self, tag, retry=False):
+        """Return 0."""
+        return 0
+
     def __len__(self):
         """Return 0."""
         return 0
@@ -341,317 +612,4713 @@ class NoCache(MutableMapping):
 
 
 # =============================================================================
-# RESPONSE OBJECT
+# MEMORY CACHE
 # =============================================================================
 
-CalculatedAt = namedtuple(
-    "CalculatedAt", ["ra", "dec", "glon", "glat", "sgl", "sgb"]
-)
 
+class MemoryCache:
+    """Thread-safe in-memory LRU cache.
 
-@attr.s(eq=False, order=False, frozen=True, repr=False)
-class Result:
-    r"""Parsed result.
+    It is used as a first tier in front of the disk cache of the clients:
+    the hits are served from memory without touching the disk, and the
+    least recently used entries are discarded when the cache exceeds
+    ``max_entries`` or ``max_bytes``.
 
     Parameters
     ----------
-    calculator : ``str``
-        The used calculator.
-    url : ``str``
-        The url of the calculator.
-    coordinate : ``Coordinate``
-        Coordinate system used to create this result.
-    alpha : ``int`` or ``float``
-        :math:`\alpha` value for the coordinate system.
-    delta : ``int`` or ``float``
-        :math:`\delta` value for the coordinate system.
-    distance : ``int``, ``float`` or ``None``
-        Distance used to calculate the velocity in Mpc.
-    velocity : ``int``, ``float`` or ``None``
-        Velocity used to calculate the distance in Km/s.
-
-    Attributes
-    ----------
-    response_ : ``requests.Response``
-        Original response object create by the *requests* library.
-        More information: https://2.python-requests.org
-    observed_distance_: ``numpy.ndarray``
-        Observed distances.
-    observed_velocity_: ``float``
-        Observed velocity
-    adjusted_distance_: ``numpy.ndarray``
-        Cosmologically adjusted distances.
-    adjusted_velocity_: ``float``
-        Cosmologically adjusted velocity, :math:`V^c_{ls}`.
-    calculated_at_: ``pycf3.CalculatedAt``
-        Coordinates in all the three supported systems.
+    max_entries : ``int`` or ``None`` (default: ``4096``)
+        Maximum number of entries. ``None`` means no limit.
+    max_bytes : ``int`` or ``None`` (default: ``None``)
+        Maximum size of all the entries. The size of every entry is the
+        length of its ``content`` if it has one (like
+        ``requests.Response``), or its ``sys.getsizeof()`` otherwise.
+        ``None`` means no limit.
 
     """
 
-    calculator = attr.ib()
-    url = attr.ib(repr=False)
-
-    coordinate = attr.ib()
-    calculated_by = attr.ib()
-    alpha = attr.ib()
-    delta = attr.ib()
-    distance = attr.ib()
-    velocity = attr.ib()
-
-    response_ = attr.ib(repr=False)
+    def __init__(self, max_entries=4096, max_bytes=None):
+        if max_entries is None and max_bytes is None:
+            raise ValueError("max_entries or max_bytes must be provided")
+        if max_entries is not None and max_entries < 1:
+            raise ValueError("max_entries must be >= 1")
+        if max_bytes is not None and max_bytes < 1:
+            raise ValueError("max_bytes must be >= 1")
 
-    observed_distance_ = attr.ib(init=False, repr=False)
-    observed_velocity_ = attr.ib(init=False, repr=False)
-    adjusted_distance_ = attr.ib(init=False, repr=False)
-    adjusted_velocity_ = attr.ib(init=False, repr=False)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
 
-    calculated_at_ = attr.ib(init=False, repr=False)
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+        self._nbytes = 0
 
-    # =========================================================================
-    # INTERNAL
-    # =========================================================================
+    def __reduce__(self):
+        """Create an empty cache with the same limits when it's unpickled.
 
-    def _get_call_result(self):
-        alpha_name, delta_name = ALPHA[self.coordinate], DELTA[self.coordinate]
+        The lock can't be pickled, and the entries only make sense in the
+        memory of the process that stored them.
 
-        value = (
-            self.distance
-            if self.calculated_by == Parameter.distance
-            else self.velocity
-        )
+        """
+        return (type(self), (self.max_entries, self.max_bytes))
 
-        call_result = (
-            f"{self.calculator}("
-            f"{self.calculated_by.value}={value}, "
-            f"{alpha_name}={self.alpha}, "
-            f"{delta_name}={self.delta})"
+    def __repr__(self):
+        """x.__repr__() <==> repr(x)."""
+        cls = type(self).__name__
+        return (
+            f"{cls}(max_entries={self.max_entries}, "
+            f"max_bytes={self.max_bytes})"
         )
 
-        return call_result
+    def __len__(self):
+        """Return the number of entries."""
+        return len(self._data)
 
-    def __repr__(self):
-        """x.__repr__() <==> repr(x)."""
-        # header
-        call_result = self._get_call_result()
-        header = f"Result - {call_result}"
+    def __contains__(self, key):
+        """Return True if the key has a non expired entry."""
+        return self.get(key) is not None
 
-        # body
-        table = []
-        table.append(
-            [
-                "Observed\n\n",
-                "Distance (Mpc)\nVelocity (Km/s)",
-                f"{self.observed_distance_}\n{self.observed_velocity_}",
-            ]
+    @property
+    def nbytes(self):
+        """Size of all the entries."""
+        return self._nbytes
+
+    def _sizeof(self, value):
+        content = getattr(value, "content", None)
+        if isinstance(content, bytes):
+            return len(content)
+        return sys.getsizeof(value)
+
+    def _overflow(self):
+        too_many = (
+            self.max_entries is not None and len(self._data) > self.max_entries
         )
-        if self.adjusted_distance_ or self.adjusted_velocity_:
-            table.append(
-                [
-                    "Adjusted\n\n",
-                    "Distance (Mpc)\nVelocity (Km/s)",
-                    f"{self.adjusted_distance_}\n{self.adjusted_velocity_}",
-                ]
-            )
-        body = tabulate.tabulate(table, headers="", tablefmt="grid")
+        too_big = self.max_bytes is not None and self._nbytes > self.max_bytes
+        return too_many or too_big
 
-        # merge and return
-        return f"{header}\n{body}"
+    def _pop(self, key):
+        _, size, _ = self._data.pop(key)
+        self._nbytes -= size
 
-    def _repr_html_(self):
-        """Create an HTML representation of the result.
+    def get(self, key, default=None):
+        """Retrieve the value of ``key`` and mark it as recently used.
 
-        Mostly used inside jupyter environment.
+        Parameters
+        ----------
+        key : hashable
+            Key of the entry.
+        default : object (default: ``None``)
+            Value to return if the key is missing or expired.
+
+        Returns
+        -------
+        object :
+            The value of the key or ``default``.
 
         """
-        import jinja2  # noqa
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
 
-        call_result = self._get_call_result()
+            value, _, expire_time = entry
+            if expire_time is not None and expire_time <= time.time():
+                self._pop(key)
+                return default
 
-        id_result = str(id(self) + np.random.random()).replace(".", "rr")
+            self._data.move_to_end(key)
+            return value
 
-        params = {
-            "result": self,
-            "id_result": id_result,
-            "call_result": call_result,
-            "json_result": json.dumps(self.json_, indent=2),
-        }
-        return jinja2.Template(RESULT_HTML_TEMPLATE).render(**params)
+    def set(self, key, value, expire=None):
+        """Store the value of ``key``, discarding old entries if necessary.
 
-    @property
-    def json_(self):
-        """Proxy to ``response_.json()``."""
-        return self.response_.json()
+        Parameters
+        ----------
+        key : hashable
+            Key of the entry.
+        value : object
+            Value to store.
+        expire : ``float`` or ``None`` (default: ``None``)
+            Seconds until the entry expires. ``None`` means no expiry.
 
-    @observed_distance_.default
-    def _observed_distance_default(self):
-        if "observed" in self.json_:
-            return np.array(self.json_["observed"]["distance"])
-        return np.array(self.json_["distance"])
+        Returns
+        -------
+        bool :
+            ``True`` if the value was stored, ``False`` if it's bigger than
+            ``max_bytes``.
 
-    @observed_velocity_.default
-    def _observed_velocity_default(self):
-        if "observed" in self.json_:
-            return self.json_["observed"]["velocity"]
-        return self.json_["velocity"]
+        """
+        size = self._sizeof(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return False
 
-    @adjusted_distance_.default
-    def _adjusted_distance_default(self):
-        try:
-            return np.array(self.json_["adjusted"]["distance"])
-        except KeyError:
-            return None
+        expire_time = None if expire is None else time.time() + expire
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+            self._data[key] = (value, size, expire_time)
+            self._nbytes += size
 
-    @adjusted_velocity_.default
-    def _adjusted_velocity_default(self):
-        try:
-            return self.json_["adjusted"]["velocity"]
-        except KeyError:
-            return None
+            # the oldest entries are at the beginning of the dictionary
+            while self._overflow():
+                self._pop(next(iter(self._data)))
 
-    @calculated_at_.default
-    def _calculated_at_default(self):
-        data = self.json_
-        return CalculatedAt(
-            ra=data["RA"],
-            dec=data["Dec"],
-            glon=data["Glon"],
-            glat=data["Glat"],
-            sgl=data["SGL"],
-            sgb=data["SGB"],
-        )
+        return True
 
-    # =========================================================================
-    # DEPRECATED API
-    # =========================================================================
+    def clear(self):
+        """Remove all the entries."""
+        with self._lock:
+            self._data.clear()
+            self._nbytes = 0
 
-    @property
-    @deprecated(
-        category=CFDeprecationWarning,
-        action="once",
-        reason="Use `calculated_by` instead",
-        version="2020.12",
-    )
-    def search_by(self):
-        """Proxy to ``response.calculated_by``.
 
-        .. deprecated:: 2020.12
-            "Use `calculated_by` instead"
+# =============================================================================
+# MAPPED CACHE
+# =============================================================================
 
-        """
-        return self.calculated_by
 
-    @property
-    @deprecated(
-        category=CFDeprecationWarning,
-        action="once",
-        reason="Use `calculated_at_` instead",
-        version="2020.12",
-    )
-    def search_at_(self):
+class MappedCache:
+    """Read-only cache over a sorted and memory-mapped key/value file.
+
+    The file is created with ``MappedCache.build()`` from any cache and it's
+    mapped in memory in read-only mode, so many processes can use the same
+    file at once without locks and sharing the same pages of memory. The
+    lookups are a binary search over the sorted binary keys.
+
+    The new values are never stored (``set()`` does nothing), so it's
+    intended for the read-mostly workers of a cache warmed in advance.
+
+    Parameters
+    ----------
+    path : ``str`` or ``pathlib.Path``
+        The file created with ``MappedCache.build()``.
+
+    """
+
+    # magic, version, number of entries and padding to align the arrays
+    _HEADER = struct.Struct("<8sIQ4x")
+    _MAGIC = b"PYCF3MAP"
+    _VERSION = 1
+
+    def __init__(self, path):
+        self.path = os.fspath(path)
+        with open(self.path, "rb") as fp:
+            self._mmap = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, size = self._HEADER.unpack_from(self._mmap)
+        if magic != self._MAGIC or version != self._VERSION:
+            self._mmap.close()
+            raise ValueError(f"{self.path!r} is not a pycf3 mapped cache")
+
+        # the file is: header, keys (padded to 8 bytes), expiration times,
+        # offsets of the values and values
+        self._size = size
+        self._keys_start = self._HEADER.size
+        keys_size = -(-size * _CACHE_KEY.size // 8) * 8
+        expire_start = self._keys_start + keys_size
+        offsets_start = expire_start + 8 * size
+        self._values_start = offsets_start + 8 * (size + 1)
+
+        self._expire_times = np.frombuffer(
+            self._mmap, dtype="<f8", count=size, offset=expire_start
+        )
+        self._offsets = np.frombuffer(
+            self._mmap, dtype="<i8", count=size + 1, offset=offsets_start
+        )
+
+    @classmethod
+    def build(cls, cache, path):
+        """Create a mapped cache file with the entries of ``cache``.
+
+        Only the entries with the binary keys are copied (the legacy ones
+        are ignored), and the file is replaced atomically. The backends
+        can't report the expire time of their entries, so the entries of a
+        ``pycf3.CacheBackend`` never expire in the file.
+
+        Parameters
+        ----------
+        cache : ``diskcache.Cache``, ``diskcache.FanoutCache`` or
+                ``pycf3.CacheBackend``
+            The source of the entries.
+        path : ``str`` or ``pathlib.Path``
+            Destination of the file.
+
+        Returns
+        -------
+        pycf3.MappedCache :
+            The new mapped cache.
+
+        """
+        entries = []
+        with cache:
+            for key in cache:
+                if not (
+                    isinstance(key, bytes) and len(key) == _CACHE_KEY.size
+                ):
+                    continue
+                if isinstance(cache, CacheBackend):
+                    value, expire_time = cache.get(key), None
+                else:
+                    value, expire_time = cache.get(
+                        key, expire_time=True, retry=True
+                    )
+                if value is None:
+                    continue
+                if isinstance(value, requests.Response):
+                    value = _pack_response(value)
+                expire_time = np.nan if expire_time is None else expire_time
+                entries.append((key, expire_time, bytes(value)))
+        entries.sort(key=lambda entry: entry[0])
+
+        keys = b"".join(entry[0] for entry in entries)
+        keys += bytes(-len(keys) % 8)
+        expire_times = np.array([e[1] for e in entries], dtype="<f8")
+        offsets = np.zeros(len(entries) + 1, dtype="<i8")
+        np.cumsum([len(entry[2]) for entry in entries], out=offsets[1:])
+
+        path = os.fspath(path)
+        with open(f"{path}.tmp", "wb") as fp:
+            fp.write(cls._HEADER.pack(cls._MAGIC, cls._VERSION, len(entries)))
+            fp.write(keys)
+            fp.write(expire_times.tobytes())
+            fp.write(offsets.tobytes())
+            for entry in entries:
+                fp.write(entry[2])
+        os.replace(f"{path}.tmp", path)
+        return cls(path)
+
+    def __reduce__(self):
+        """Reopen the same file when it's unpickled in other process."""
+        return (type(self), (self.path,))
+
+    def __repr__(self):
+        """x.__repr__() <==> repr(x)."""
+        return f"{type(self).__name__}({self.path!r})"
+
+    def _key_at(self, idx):
+        start = self._keys_start + idx * _CACHE_KEY.size
+        return self._mmap[start : start + _CACHE_KEY.size]  # noqa
+
+    def _find(self, key):
+        if not (isinstance(key, bytes) and len(key) == _CACHE_KEY.size):
+            return None
+        low, high = 0, self._size
+        while low < high:
+            middle = (low + high) // 2
+            if self._key_at(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self._size and self._key_at(low) == key:
+            return low
+        return None
+
+    def get(self, key, default=None, *args, **kwargs):
+        """Retrieve the value of ``key`` or ``default`` if it's missing."""
+        idx = self._find(key)
+        if idx is None:
+            return default
+
+        expire_time = self._expire_times[idx]
+        if not np.isnan(expire_time) and expire_time <= time.time():
+            return default
+
+        start = self._values_start + self._offsets[idx]
+        stop = self._values_start + self._offsets[idx + 1]
+        return self._mmap[start:stop]
+
+    def set(self, key, value, *args, **kwargs):
+        """Do nothing and return False (the cache is read-only)."""
+        return False
+
+    def delete(self, key, *args, **kwargs):
+        """Do nothing and return False (the cache is read-only)."""
+        return False
+
+    def expire(self, now=None, retry=False):
+        """Return 0 (the expired values are ignored when they are read)."""
+        return 0
+
+    def evict(self, tag, retry=False):
+        """Do nothing and return 0 (the cache is read-only)."""
+        return 0
+
+    def close(self):
+        """Unmap the file."""
+        self._expire_times = self._offsets = None
+        self._mmap.close()
+
+    def __contains__(self, key):
+        """Return True if the key has a non expired value."""
+        return self.get(key) is not None
+
+    def __getitem__(self, key):
+        """x.__getitem__(y) <==> x[y]."""
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __iter__(self):
+        """Iterate over all the keys in sorted order."""
+        return (self._key_at(idx) for idx in range(self._size))
+
+    def __len__(self):
+        """Return the number of entries (including the expired ones)."""
+        return self._size
+
+    def __enter__(self):
+        """Enter the runtime context (the file stays mapped)."""
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Exit the runtime context (the file stays mapped)."""
+
+
+# =============================================================================
+# CACHE BACKENDS
+# =============================================================================
+
+
+def _get_many(cache, keys):
+    """Retrieve several values with one call if the cache supports it."""
+    # FanoutCache.__getattr__ fails with any unknown attribute, so the
+    # diskcache caches are not inspected
+    if isinstance(cache, CacheBackend):
+        return cache.get_many(keys)
+    return [cache.get(key, default=None, retry=True) for key in keys]
+
+
+def _transact(cache):
+    """Open a transaction on the diskcache caches (nothing on the others)."""
+    if isinstance(cache, (dcache.Cache, dcache.FanoutCache)):
+        return cache.transact(retry=True)
+    return contextlib.nullcontext()
+
+
+def _set_many(cache, items, expire=None, tag=None):
+    """Store several values with one call if the cache supports it.
+
+    Returns if every value was stored, in the same order of ``items``.
+
+    """
+    if isinstance(cache, CacheBackend):
+        stored = cache.set_many(items, expire=expire, tag=tag)
+        return [bool(stored)] * len(items)
+
+    # diskcache has no set_many(), but one transaction is a single commit
+    with _transact(cache):
+        return [
+            bool(cache.set(key, value, expire=expire, tag=tag, retry=True))
+            for key, value in items.items()
+        ]
+
+
+class CacheBackend:
+    """Base class of the cache backends of the clients.
+
+    The backends are a small subset of the ``diskcache.Cache`` API, so the
+    diskcache caches can be used as they are. The subclasses must implement
+    ``get()``, ``set()``, ``delete()`` and ``__iter__()``; the batch
+    operations call them key by key, ``expire()`` does nothing and the
+    context manager doesn't hold any resource.
+
+    The keys are the binary keys of the clients and the values the compact
+    cache records (both ``bytes``). The keyword arguments of diskcache that
+    a backend doesn't need (like ``retry``) are ignored.
+
+    """
+
+    def get(self, key, default=None, **kwargs):
+        """Retrieve the value of ``key`` or ``default`` if it's missing."""
+        raise NotImplementedError()
+
+    def set(self, key, value, expire=None, tag=None, **kwargs):
+        """Store ``value`` for ``key``, for ``expire`` seconds if provided.
+
+        Returns ``True`` if the value was stored.
+
+        """
+        raise NotImplementedError()
+
+    def delete(self, key, **kwargs):
+        """Remove ``key``, returning ``True`` if it was stored."""
+        raise NotImplementedError()
+
+    def get_many(self, keys, default=None):
+        """Retrieve the values of several keys, in the same order."""
+        return [self.get(key, default=default) for key in keys]
+
+    def set_many(self, items, expire=None, tag=None):
+        """Store all the values of the ``items`` mapping."""
+        for key, value in items.items():
+            self.set(key, value, expire=expire, tag=tag)
+        return True
+
+    def expire(self, now=None, retry=False):
+        """Remove the expired entries and return how many (``0``)."""
+        return 0
+
+    def evict(self, tag, retry=False):
+        """Remove the entries with the ``tag`` and return how many (``0``)."""
+        return 0
+
+    def tag_keys(self, tag):
+        """Return the keys of the entries stored with ``tag`` (none)."""
+        return []
+
+    def clear(self, retry=False):
+        """Remove all the entries and return how many."""
+        keys = list(self)
+        for key in keys:
+            self.delete(key)
+        return len(keys)
+
+    def __contains__(self, key):
+        """x.__contains__(y) <==> y in x."""
+        return self.get(key) is not None
+
+    def __iter__(self):
+        """Iterate over all the keys."""
+        raise NotImplementedError()
+
+    def __len__(self):
+        """Return the number of entries."""
+        return sum(1 for _ in self)
+
+    def __enter__(self):
+        """Enter the runtime context."""
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Exit the runtime context."""
+
+
+class RedisCache(CacheBackend):
+    """Cache shared through a Redis server.
+
+    Any client with the API of ``redis.Redis`` works (``get``, ``set``,
+    ``mget``, ``delete``, ``exists``, ``zadd``, ``zrange``,
+    ``zremrangebyscore``, ``scan_iter`` and ``pipeline``), so every server
+    of the Redis protocol can be used. The server removes the expired
+    entries by itself, and the keys of every tag are kept in a Redis sorted
+    set to support ``evict()``. The keys are scored with their expire time,
+    so the expired ones are pruned from the set every time the tag is
+    written (in the same round trip).
+
+    Parameters
+    ----------
+    client : ``redis.Redis``
+        Client of the server. Use ``RedisCache.from_url()`` to create one.
+    prefix : ``str`` (default: ``"pycf3"``)
+        Prefix of all the Redis keys, to share the server with other data.
+
+    """
+
+    def __init__(self, client, prefix="pycf3"):
+        """Create a new instance."""
+        self.client = client
+        self.prefix = prefix
+        self._entry_prefix = f"{prefix}:entry:".encode("utf-8")
+        self._tag_prefix = f"{prefix}:tag:".encode("utf-8")
+
+    @classmethod
+    def from_url(cls, url, prefix="pycf3", **kwargs):
+        """Connect to the server of a URL like ``redis://host:6379/0``.
+
+        Requires the ``redis`` package. The ``kwargs`` are passed to
+        ``redis.Redis.from_url()``.
+
+        """
+        import redis  # noqa
+
+        return cls(redis.Redis.from_url(url, **kwargs), prefix=prefix)
+
+    def __repr__(self):
+        """x.__repr__() <==> repr(x)."""
+        return f"RedisCache(client={self.client!r}, prefix={self.prefix!r})"
+
+    def _key(self, key):
+        # the keys of the old pycf3 versions are tuples
+        if not isinstance(key, bytes):
+            key = repr(key).encode("utf-8")
+        return self._entry_prefix + key
+
+    def _tag_key(self, tag):
+        return self._tag_prefix + tag.encode("utf-8")
+
+    def get(self, key, default=None, **kwargs):
+        """Retrieve the value of ``key`` or ``default`` if it's missing."""
+        value = self.client.get(self._key(key))
+        return default if value is None else value
+
+    def get_many(self, keys, default=None):
+        """Retrieve the values of several keys with a single ``MGET``."""
+        if not keys:
+            return []
+        values = self.client.mget([self._key(key) for key in keys])
+        return [default if value is None else value for value in values]
+
+    def set(self, key, value, expire=None, tag=None, **kwargs):
+        """Store ``value`` for ``key``, for ``expire`` seconds if provided."""
+        return self.set_many({key: value}, expire=expire, tag=tag)
+
+    def set_many(self, items, expire=None, tag=None):
+        """Store all the values of the ``items`` mapping in one round trip."""
+        # redis only accepts positive integer milliseconds
+        px = None if expire is None else max(1, int(expire * 1000))
+        now = time.time()
+        expire_at = float("inf") if px is None else now + px / 1000
+        pipeline = self.client.pipeline(transaction=False)
+        members = {}
+        for key, value in items.items():
+            if not isinstance(value, bytes):
+                raise TypeError("RedisCache only stores bytes values")
+            redis_key = self._key(key)
+            pipeline.set(redis_key, value, px=px)
+            members[redis_key] = expire_at
+        if tag is not None and members:
+            tag_key = self._tag_key(tag)
+            pipeline.zremrangebyscore(tag_key, "-inf", now)
+            pipeline.zadd(tag_key, members)
+        pipeline.execute()
+        return True
+
+    def delete(self, key, **kwargs):
+        """Remove ``key``, returning ``True`` if it was stored."""
+        return bool(self.client.delete(self._key(key)))
+
+    def evict(self, tag, retry=False):
+        """Remove the entries stored with ``tag`` and return how many."""
+        tag_key = self._tag_key(tag)
+        redis_keys = list(self.client.zrange(tag_key, 0, -1))
+        removed = self.client.delete(*redis_keys) if redis_keys else 0
+        self.client.delete(tag_key)
+        return removed
+
+    def tag_keys(self, tag):
+        """Return the keys of the entries stored with ``tag``."""
+        size = len(self._entry_prefix)
+        redis_keys = self.client.zrange(self._tag_key(tag), 0, -1)
+        return [redis_key[size:] for redis_key in redis_keys]
+
+    def __contains__(self, key):
+        """x.__contains__(y) <==> y in x."""
+        return bool(self.client.exists(self._key(key)))
+
+    def __iter__(self):
+        """Iterate over all the keys (scanning the server)."""
+        size = len(self._entry_prefix)
+        pattern = self._entry_prefix + b"*"
+        return (key[size:] for key in self.client.scan_iter(match=pattern))
+
+
+class TwoLevelCache(CacheBackend):
+    """A local cache in front of a shared one.
+
+    The lookups go first to the ``local`` cache and the misses to the
+    ``shared`` one (in a single ``get_many()`` call); the shared hits are
+    copied to the local cache. The new entries are written to both, so a
+    result calculated by any worker of a cluster is a hit for all the
+    others.
+
+    Parameters
+    ----------
+    local : ``diskcache.Cache`` or ``pycf3.CacheBackend``
+        The fast cache of the process or the node.
+    shared : ``pycf3.CacheBackend``
+        The cache shared by all the workers (e.g. ``pycf3.RedisCache``).
+    local_expire : ``float`` or ``None`` (default: ``None``)
+        Seconds until the copies of the shared entries expire in the local
+        cache. ``None`` keeps them until the local cache evicts them; the
+        clients still treat the copies older than their ``cache_expire``
+        (plus the ``stale_grace``) as misses.
+
+    """
+
+    def __init__(self, local, shared, local_expire=None):
+        """Create a new instance."""
+        self.local = local
+        self.shared = shared
+        self.local_expire = local_expire
+
+    def __repr__(self):
+        """x.__repr__() <==> repr(x)."""
+        return f"TwoLevelCache(local={self.local!r}, shared={self.shared!r})"
+
+    @property
+    def directory(self):
+        """Directory of the local cache (if it has one)."""
+        return getattr(self.local, "directory", None)
+
+    def get(self, key, default=None, **kwargs):
+        """Retrieve the value of ``key`` or ``default`` if it's missing."""
+        (value,) = self.get_many([key], default=default)
+        return value
+
+    def get_many(self, keys, default=None):
+        """Retrieve the values of several keys, in the same order."""
+        values = _get_many(self.local, keys)
+        misses = [pos for pos, value in enumerate(values) if value is None]
+        if misses:
+            shared = _get_many(self.shared, [keys[pos] for pos in misses])
+            for pos, value in zip(misses, shared):
+                if value is not None:
+                    self.local.set(
+                        keys[pos], value, expire=self.local_expire, retry=True
+                    )
+                    values[pos] = value
+        return [default if value is None else value for value in values]
+
+    def set(self, key, value, expire=None, tag=None, **kwargs):
+        """Store ``value`` for ``key`` in both caches."""
+        self.local.set(key, value, expire=expire, tag=tag, retry=True)
+        return self.shared.set(key, value, expire=expire, tag=tag)
+
+    def set_many(self, items, expire=None, tag=None):
+        """Store all the values of the ``items`` mapping in both caches."""
+        for key, value in items.items():
+            self.local.set(key, value, expire=expire, tag=tag, retry=True)
+        return self.shared.set_many(items, expire=expire, tag=tag)
+
+    def delete(self, key, **kwargs):
+        """Remove ``key`` from both caches."""
+        local = self.local.delete(key, retry=True)
+        return self.shared.delete(key) or local
+
+    def expire(self, now=None, retry=False):
+        """Remove the expired entries of both caches and return how many."""
+        return self.local.expire(retry=retry) + self.shared.expire()
+
+    def evict(self, tag, retry=False):
+        """Remove the entries with ``tag`` from both caches.
+
+        The copies of the shared entries have no tag in the local cache, so
+        they are deleted by the keys that the shared cache stores with the
+        ``tag``; the other entries of the local cache are kept. Returns the
+        entries removed from the shared cache.
+
+        """
+        keys = self.shared.tag_keys(tag)
+        removed = self.shared.evict(tag)
+        self.local.evict(tag, retry=retry)
+        for key in keys:
+            self.local.delete(key, retry=True)
+        return removed
+
+    def tag_keys(self, tag):
+        """Return the keys of the entries stored with ``tag`` (shared)."""
+        return self.shared.tag_keys(tag)
+
+    def __contains__(self, key):
+        """x.__contains__(y) <==> y in x."""
+        return key in self.local or key in self.shared
+
+    def __iter__(self):
+        """Iterate over the keys of both caches without repetitions."""
+        seen = set()
+        for key in it.chain(self.local, self.shared):
+            if key not in seen:
+                seen.add(key)
+                yield key
+
+    def __enter__(self):
+        """Enter the runtime context of the local cache."""
+        self.local.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Exit the runtime context of the local cache."""
+        return self.local.__exit__(exc_type, exc_value, traceback)
+
+
+# =============================================================================
+# CACHE EXPIRATION
+# =============================================================================
+
+
+class ExpirePolicy:
+    """Base class of the policies to remove the expired cache entries.
+
+    The clients call ``maybe_expire()`` before every cache lookup. Even if
+    the expired entries are never removed, ``diskcache`` never returns them,
+    so the policies only control when the space of the cache is reclaimed.
+
+    """
+
+    def maybe_expire(self, cache):
+        """Decide if the expired entries of ``cache`` must be removed now.
+
+        Parameters
+        ----------
+        cache : ``diskcache.Cache``, ``diskcache.FanoutCache`` or
+                ``pycf3.NoCache``
+            The cache to be checked. It's called inside the cache context.
+
+        """
+        raise NotImplementedError()
+
+    def __repr__(self):
+        """x.__repr__() <==> repr(x)."""
+        return f"{type(self).__name__}()"
+
+
+class AlwaysExpire(ExpirePolicy):
+    """Remove the expired entries before every lookup.
+
+    This is the default policy of the clients, and the cost of every lookup
+    grows with the size of the cache.
+
+    """
+
+    def maybe_expire(self, cache):
+        """Remove the expired entries of ``cache``."""
+        cache.expire(retry=True)
+
+
+class LazyExpire(ExpirePolicy):
+    """Never remove the expired entries.
+
+    The expired entries are ignored by ``diskcache`` when they are read,
+    and a few of them are removed every time a new entry is stored (or all
+    of them by calling ``cache.expire()`` explicitly).
+
+    """
+
+    def maybe_expire(self, cache):
+        """Do nothing."""
+
+
+class CountExpire(ExpirePolicy):
+    """Remove the expired entries once every ``every`` lookups.
+
+    Parameters
+    ----------
+    every : ``int`` (default: ``1000``)
+        Number of lookups between two expirations.
+
+    """
+
+    def __init__(self, every=1000):
+        if every < 1:
+            raise ValueError("every must be >= 1")
+        self.every = every
+        self._lock = threading.Lock()
+        self._calls = 0
+
+    def __reduce__(self):
+        """Create a new policy (with a new lock) when it's unpickled."""
+        return (type(self), (self.every,))
+
+    def __repr__(self):
+        """x.__repr__() <==> repr(x)."""
+        return f"{type(self).__name__}(every={self.every})"
+
+    def maybe_expire(self, cache):
+        """Remove the expired entries of ``cache`` every ``every`` calls."""
+        with self._lock:
+            self._calls = (self._calls + 1) % self.every
+            expire = self._calls == 1 or self.every == 1
+        if expire:
+            cache.expire(retry=True)
+
+
+class TimerExpire(ExpirePolicy):
+    """Remove the expired entries in a background thread.
+
+    The thread is started by the first lookup and removes the expired
+    entries immediately and every ``interval`` seconds after that, until
+    ``stop()`` is called. The lookups never wait for the expiration.
+
+    Parameters
+    ----------
+    interval : ``float`` (default: ``60``)
+        Seconds between two expirations.
+
+    """
+
+    def __init__(self, interval=60.0):
+        if interval <= 0:
+            raise ValueError("interval must be > 0")
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def __reduce__(self):
+        """Create a stopped policy when it's unpickled.
+
+        The thread is started again by the first lookup of the process.
+
+        """
+        return (type(self), (self.interval,))
+
+    def __repr__(self):
+        """x.__repr__() <==> repr(x)."""
+        return f"{type(self).__name__}(interval={self.interval})"
+
+    @property
+    def running(self):
+        """``True`` if the background thread is alive."""
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self, cache):
+        while True:
+            with cache:
+                cache.expire(retry=True)
+            if self._stopped.wait(self.interval):
+                break
+
+    def maybe_expire(self, cache):
+        """Start the background expiration of ``cache`` if it's stopped."""
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._stopped.clear()
+                self._thread = threading.Thread(
+                    target=self._run,
+                    args=(cache,),
+                    name="pycf3-expire",
+                    daemon=True,
+                )
+                self._thread.start()
+
+    def stop(self):
+        """Stop the background thread and wait for it."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+            self._stopped.set()
+        if thread is not None:
+            thread.join()
+
+
+# =============================================================================
+# QUANTIZATION
+# =============================================================================
+
+
+def _check_step(instance, attribute, value):
+    if value is not None and not value > 0:
+        raise ValueError(f"{attribute.name} must be > 0 or None")
+
+
+@attr.s(frozen=True)
+class Quantization:
+    """Grid where the queries are snapped before being calculated or cached.
+
+    Positions and values closer than the step of the grid can't be told
+    apart by the calculators, so snapping them to the same point of the
+    grid makes them share the same cache entry.
+
+    Parameters
+    ----------
+    coordinate : ``float`` or ``None`` (default: ``1e-4``)
+        Step of the grid of the coordinates in degrees.
+    distance : ``float`` or ``None`` (default: ``0.01``)
+        Step of the grid of the distances in Mpc.
+    velocity : ``float`` or ``None`` (default: ``1``)
+        Step of the grid of the velocities in Km/s.
+
+    ``None`` disables the quantization of the component.
+
+    """
+
+    coordinate: float = attr.ib(default=1e-4, validator=_check_step)
+    distance: float = attr.ib(default=0.01, validator=_check_step)
+    velocity: float = attr.ib(default=1.0, validator=_check_step)
+
+    def _snap(self, value, step):
+        if step is None:
+            return value
+        # "+ 0.0" turns -0.0 into 0.0, the keys pack the raw float bits
+        return np.round(np.round(np.divide(value, step)) * step, 10) + 0.0
+
+    def _scalar(self, value):
+        return value if np.ndim(value) else float(value)
+
+    def quantize_coordinates(self, alpha, delta):
+        """Snap a position (or arrays of positions) to the grid.
+
+        The longitudes are wrapped to ``[0, 360)`` and the latitudes that
+        would be snapped beyond the poles are clamped to ``[-90, 90]``.
+
+        """
+        if self.coordinate is None:
+            return alpha, delta
+        alpha = np.mod(self._snap(alpha, self.coordinate), 360.0) + 0.0
+        delta = np.clip(self._snap(delta, self.coordinate), -90.0, 90.0)
+        return self._scalar(alpha), self._scalar(delta)
+
+    def quantize(self, parameter, alpha, delta, value, maximum=None):
+        """Snap a query (or arrays of queries) to the grid.
+
+        Values that would be snapped to ``0`` or less, or above
+        ``maximum``, are kept as-is, so a valid query is never transformed
+        into an invalid one.
+
+        Parameters
+        ----------
+        parameter : ``pycf3.Parameter``
+            The kind of the value (distance or velocity).
+        alpha, delta : ``float`` or ``numpy.ndarray``
+            The coordinates in degrees.
+        value : ``float`` or ``numpy.ndarray``
+            The distance in Mpc or the velocity in Km/s.
+        maximum : ``float`` or ``None`` (default: ``None``)
+            The greatest valid value, ``None`` means no upper limit.
+
+        Returns
+        -------
+        pycf3.QuantizedPoint :
+            The point of the grid.
+
+        """
+        alpha, delta = self.quantize_coordinates(alpha, delta)
+        step = (
+            self.distance if parameter == Parameter.distance else self.velocity
+        )
+        snapped = self._snap(value, step)
+        valid = np.greater(snapped, 0)
+        if maximum is not None:
+            valid &= np.less_equal(snapped, maximum)
+        snapped = self._scalar(np.where(valid, snapped, value))
+        return QuantizedPoint(alpha=alpha, delta=delta, value=snapped)
+
+
+# =============================================================================
+# SPATIAL INDEX
+# =============================================================================
+
+
+@attr.s(frozen=True)
+class NearestMatch:
+    """Tolerances to answer a cache miss with the nearest cached result.
+
+    Parameters
+    ----------
+    radius : ``float``
+        Maximum angular distance in degrees.
+    distance : ``float`` (default: ``0``)
+        Maximum difference of the distances in Mpc.
+    velocity : ``float`` (default: ``0``)
+        Maximum difference of the velocities in Km/s.
+
+    """
+
+    radius: float = attr.ib()
+    distance: float = attr.ib(default=0.0)
+    velocity: float = attr.ib(default=0.0)
+
+    @radius.validator
+    def _check_radius(self, attribute, value):
+        if not 0 < value <= 180:
+            raise ValueError("radius must be > 0 and <= 180")
+
+    @distance.validator
+    @velocity.validator
+    def _check_tolerance(self, attribute, value):
+        if value < 0:
+            raise ValueError(f"{attribute.name} must be >= 0")
+
+    def tolerance(self, parameter):
+        """Return the value tolerance of the given ``pycf3.Parameter``."""
+        if parameter == Parameter.distance:
+            return self.distance
+        return self.velocity
+
+
+class SpatialIndex:
+    """Nearest neighbour index over the binary keys of a cache.
+
+    The positions of the keys are indexed as unit vectors in supergalactic
+    cartesian coordinates with one KD-tree (``scipy.spatial.cKDTree``) for
+    every calculator and parameter, so the keys of any coordinate system can
+    match each other. The trees are built on demand.
+
+    Parameters
+    ----------
+    keys : iterable of ``bytes``
+        The cache keys to index. The keys with other formats are ignored.
+
+    """
+
+    #: Name of the file of the index inside the cache directory.
+    FILENAME = "pycf3-index.npz"
+
+    def __init__(self, keys=()):
+        keys = [
+            key
+            for key in keys
+            if isinstance(key, bytes) and len(key) == _CACHE_KEY.size
+        ]
+        self._init_records(
+            np.frombuffer(b"".join(keys), dtype=_CACHE_KEY_DTYPE)
+        )
+
+    def _init_records(self, records):
+        self.records_ = records
+        self._lock = threading.Lock()
+        self._groups = {}
+
+    @classmethod
+    def from_cache(cls, cache):
+        """Index all the keys of a ``diskcache.Cache`` or ``FanoutCache``."""
+        return cls(iter(cache))
+
+    @classmethod
+    def load(cls, path):
+        """Load an index saved with ``save()``."""
+        with np.load(path, allow_pickle=False) as data:
+            records = data["records"]
+        index = cls.__new__(cls)
+        index._init_records(records.astype(_CACHE_KEY_DTYPE, copy=False))
+        return index
+
+    def save(self, path):
+        """Save the index as a numpy ``.npz`` file."""
+        with open(path, "wb") as fp:
+            np.savez(fp, records=self.records_)
+
+    def __len__(self):
+        """Return the number of indexed keys."""
+        return len(self.records_)
+
+    def __repr__(self):
+        """x.__repr__() <==> repr(x)."""
+        return f"<{type(self).__name__} - {len(self)} keys>"
+
+    def _vectors(self, systems, alpha, delta):
+        alpha, delta = np.radians(alpha), np.radians(delta)
+        cos_delta = np.cos(delta)
+        vectors = np.column_stack(
+            [
+                cos_delta * np.cos(alpha),
+                cos_delta * np.sin(alpha),
+                np.sin(delta),
+            ]
+        )
+        for system_id, system in _ID_COORDINATE_SYSTEM.items():
+            mask = systems == system_id
+            vectors[mask] = vectors[mask] @ _TO_SUPERGALACTIC[system].T
+        return vectors
+
+    def _group(self, calculator, parameter):
+        from scipy.spatial import cKDTree  # noqa
+
+        group_key = (calculator, parameter)
+        with self._lock:
+            group = self._groups.get(group_key)
+            if group is None:
+                records = self.records_
+                (positions,) = np.nonzero(
+                    (records["calculator"] == calculator)
+                    & (records["parameter"] == parameter)
+                )
+                selected = records[positions]
+                vectors = self._vectors(
+                    selected["system"], selected["alpha"], selected["delta"]
+                )
+                tree = cKDTree(vectors) if len(vectors) else None
+                group = self._groups[group_key] = (tree, positions)
+        return group
+
+    def nearest(self, key, radius, tolerance):
+        """Find the indexed key closest to ``key``.
+
+        Parameters
+        ----------
+        key : ``bytes``
+            Binary cache key of the query.
+        radius : ``float``
+            Maximum angular distance in degrees.
+        tolerance : ``float``
+            Maximum difference of the values.
+
+        Returns
+        -------
+        bytes or None :
+            The closest key (weighting the angular distance and the value
+            difference by ``radius`` and ``tolerance``), or ``None`` if no
+            key is inside the limits.
+
+        """
+        calculator, system, parameter, alpha, delta, value = _CACHE_KEY.unpack(
+            key
+        )
+        tree, positions = self._group(calculator, parameter)
+        if tree is None:
+            return None
+
+        (vector,) = self._vectors(np.array([system]), alpha, delta)
+        chord = 2 * np.sin(np.radians(radius) / 2)
+        candidates = positions[tree.query_ball_point(vector, chord)]
+
+        differences = np.abs(self.records_["value"][candidates] - value)
+        candidates = candidates[differences <= tolerance]
+        if not len(candidates):
+            return None
+
+        records = self.records_[candidates]
+        vectors = self._vectors(
+            records["system"], records["alpha"], records["delta"]
+        )
+        angles = np.degrees(
+            2 * np.arcsin(np.linalg.norm(vectors - vector, axis=1) / 2)
+        )
+        scores = (angles / radius) ** 2
+        if tolerance:
+            scores += ((records["value"] - value) / tolerance) ** 2
+        return records[np.argmin(scores)].tobytes()
+
+
+# =============================================================================
+# CACHE BUNDLES
+# =============================================================================
+
+
+def _read_bundle(path):
+    with np.load(path, allow_pickle=False) as data:
+        bundle = {name: data[name] for name in data.files}
+    bundle["records"] = bundle["records"].astype(_CACHE_KEY_DTYPE, copy=False)
+    return bundle
+
+
+def _write_bundle(path, bundle):
+    with open(path, "wb") as fp:
+        np.savez_compressed(fp, **bundle)
+
+
+def _bundle_entries(bundle):
+    names = dict(zip(bundle["calculator_ids"], bundle["calculator_names"]))
+    records, offsets = bundle["records"], bundle["offsets"]
+    body = bundle["body"].tobytes()
+    for idx, record in enumerate(records):
+        start, stop = offsets[idx], offsets[idx + 1]
+        system = _ID_COORDINATE_SYSTEM[int(record["system"])]
+        yield (
+            record.tobytes(),
+            f"{names[record['calculator']]}@{system.value}",
+            float(bundle["stored_at"][idx]),
+            int(bundle["status"][idx]),
+            float(bundle["expire_time"][idx]),
+            body[start:stop],
+        )
+
+
+def _make_bundle(entries):
+    entries = list(entries)
+    names = {}
+    for key, tag, *_ in entries:
+        calculator_id = _CACHE_KEY.unpack(key)[0]
+        names[calculator_id] = tag.split("@", 1)[0]
+
+    keys, _, stored_at, status, expire_time, bodies = (
+        zip(*entries) if entries else [()] * 6
+    )
+    offsets = np.zeros(len(entries) + 1, dtype=np.int64)
+    np.cumsum([len(body) for body in bodies], out=offsets[1:])
+    return {
+        "records": np.frombuffer(b"".join(keys), dtype=_CACHE_KEY_DTYPE),
+        "stored_at": np.array(stored_at, dtype=float),
+        "status": np.array(status, dtype=np.uint16),
+        "expire_time": np.array(expire_time, dtype=float),
+        "offsets": offsets,
+        "body": np.frombuffer(b"".join(bodies), dtype=np.uint8),
+        "calculator_ids": np.array(list(names), dtype=np.uint32),
+        "calculator_names": np.array(list(names.values()), dtype=str),
+    }
+
+
+def _client_calculators():
+    # the calculator names of all the client classes, by calculator id
+    calculators, classes = {}, [AbstractClient]
+    while classes:
+        cls = classes.pop()
+        classes.extend(cls.__subclasses__())
+        name, url = getattr(cls, "CALCULATOR", None), getattr(cls, "URL", None)
+        if name and url:
+            calculators[zlib.crc32(f"{name}@{url}".encode("utf-8"))] = name
+    return calculators
+
+
+def export_bundle(cache, path):
+    """Export the entries of a cache to a portable bundle.
+
+    The bundle is a compressed numpy ``.npz`` file with one column for every
+    part of the entries (the binary keys as a structured array, the storage
+    time, the status code, the expiration time and the JSON bodies), so it
+    doesn't depend on the versions of the libraries that created the cache.
+    The entries with the keys of the old pycf3 versions are exported with
+    the equivalent binary keys.
+
+    The backends don't report the expiration time nor the tag of their
+    entries, so the entries of a ``pycf3.CacheBackend`` are exported
+    without expiration, and with the tag of the client class of their
+    calculator (the entries of unknown calculators are skipped).
+
+    Parameters
+    ----------
+    cache : ``diskcache.Cache``, ``diskcache.FanoutCache`` or
+            ``pycf3.CacheBackend``
+        The cache to export.
+    path : ``str`` or ``pathlib.Path``
+        Destination of the bundle.
+
+    Returns
+    -------
+    int :
+        Number of exported entries.
+
+    """
+    entries, calculators = [], _client_calculators()
+    with cache:
+        for stored_key in iter(cache):
+            key = stored_key
+            if isinstance(key, tuple):
+                key = _legacy_to_key(key)
+            if not (isinstance(key, bytes) and len(key) == _CACHE_KEY.size):
+                continue
+            if isinstance(cache, CacheBackend):
+                record, expire_time, tag = cache.get(key), None, None
+            else:
+                record, expire_time, tag = cache.get(
+                    stored_key, expire_time=True, tag=True, retry=True
+                )
+            if record is None:
+                continue
+            if tag is None and isinstance(stored_key, tuple):
+                tag = "@".join(stored_key[:2])
+            elif tag is None:
+                calculator_id, system_id = _CACHE_KEY.unpack(key)[:2]
+                if calculator_id not in calculators:
+                    continue
+                system = _ID_COORDINATE_SYSTEM[system_id]
+                tag = f"{calculators[calculator_id]}@{system.value}"
+
+            if isinstance(record, requests.Response):
+                record = _pack_response(record)
+            response, stored_at = _unpack_response(record, "")
+            if response is None:
+                continue
+
+            entries.append(
+                (
+                    key,
+                    tag,
+                    np.nan if stored_at is None else stored_at,
+                    response.status_code,
+                    np.nan if expire_time is None else expire_time,
+                    response.content,
+                )
+            )
+
+    _write_bundle(path, _make_bundle(entries))
+    return len(entries)
+
+
+def import_bundle(cache, path, overwrite=False):
+    """Store the entries of a bundle into a cache.
+
+    The entries keep their original expiration time, so the already
+    expired ones are skipped.
+
+    Parameters
+    ----------
+    cache : ``diskcache.Cache``, ``diskcache.FanoutCache`` or
+            ``pycf3.CacheBackend``
+        The destination cache. The entries with the same tag and expiration
+        are stored with a single ``set_many()`` in the backends.
+    path : ``str`` or ``pathlib.Path``
+        The bundle created with ``pycf3.export_bundle()`` or
+        ``pycf3.merge_bundles()``.
+    overwrite : ``bool`` (default: ``False``)
+        If it's ``False`` the keys already stored in the cache are skipped.
+
+    Returns
+    -------
+    int :
+        Number of imported entries.
+
+    """
+    bundle = _read_bundle(path)
+    now, entries = time.time(), []
+    for key, tag, stored_at, status, expire_time, body in _bundle_entries(
+        bundle
+    ):
+        if np.isnan(expire_time):
+            expire = None
+        elif expire_time > now:
+            expire = expire_time - now
+        else:
+            continue
+        entries.append((key, tag, stored_at, status, expire, body))
+
+    with cache, _transact(cache):
+        if not overwrite:
+            stored = _get_many(cache, [entry[0] for entry in entries])
+            entries = [
+                entry
+                for entry, record in zip(entries, stored)
+                if record is None
+            ]
+
+        # one write for every tag and expiration
+        groups = {}
+        for key, tag, stored_at, status, expire, body in entries:
+            response = _build_response("", status, body)
+            stored_at = None if np.isnan(stored_at) else stored_at
+            record = _pack_response(response, stored_at=stored_at)
+            groups.setdefault((tag, expire), {})[key] = record
+        for (tag, expire), records in groups.items():
+            _set_many(cache, records, expire=expire, tag=tag)
+    return len(entries)
+
+
+def merge_bundles(paths, path):
+    """Merge several bundles in a new one without duplicated keys.
+
+    If a key is in more than one bundle, the most recently stored entry is
+    kept.
+
+    Parameters
+    ----------
+    paths : iterable of ``str`` or ``pathlib.Path``
+        The bundles to merge.
+    path : ``str`` or ``pathlib.Path``
+        Destination of the merged bundle.
+
+    Returns
+    -------
+    int :
+        Number of entries of the merged bundle.
+
+    """
+    bundles = [_read_bundle(source) for source in paths]
+
+    def join(name):
+        return np.concatenate([bundle[name] for bundle in bundles])
+
+    records, stored_at = join("records"), join("stored_at")
+    bodies = RaggedArray.concatenate(
+        RaggedArray(bundle["body"], bundle["offsets"]) for bundle in bundles
+    )
+
+    # the rows are sorted by key and storage time, and the last row of every
+    # key is the newest one
+    keys = records.view(np.dtype((np.void, _CACHE_KEY.size)))
+    _, inverse = np.unique(keys, return_inverse=True)
+    order = np.lexsort((np.nan_to_num(stored_at, nan=-np.inf), inverse))
+    sorted_inverse = inverse[order]
+    newest = np.append(sorted_inverse[1:] != sorted_inverse[:-1], True)
+    keep = order[newest] if len(order) else order
+
+    bodies = bodies[keep]
+    merged = {
+        "records": records[keep],
+        "stored_at": stored_at[keep],
+        "status": join("status")[keep],
+        "expire_time": join("expire_time")[keep],
+        "offsets": bodies.offsets,
+        "body": bodies.values,
+        "calculator_ids": join("calculator_ids"),
+        "calculator_names": join("calculator_names"),
+    }
+    merged["calculator_ids"], unique_names = np.unique(
+        merged["calculator_ids"], return_index=True
+    )
+    merged["calculator_names"] = merged["calculator_names"][unique_names]
+
+    _write_bundle(path, merged)
+    return len(keep)
+
+
+# =============================================================================
+# SINGLE FLIGHT
+# =============================================================================
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share the same key.
+
+    The first thread that calls ``do()`` with a key executes the function,
+    and every other thread that calls ``do()`` with the same key while the
+    first one is running waits and receives the same result (or exception).
+
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def __len__(self):
+        """Return the number of calls in flight."""
+        return len(self._calls)
+
+    def do(self, key, function, *args, **kwargs):
+        """Execute ``function(*args, **kwargs)`` once for all the callers.
+
+        Parameters
+        ----------
+        key : hashable
+            Identifier of the call.
+        function : callable
+            Function to execute if no other call with the same key is in
+            flight.
+        args, kwargs :
+            Arguments of the function.
+
+        Returns
+        -------
+        object :
+            The return value of the function.
+
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = function(*args, **kwargs)
+        except BaseException as err:
+            future.set_exception(err)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+class _BackgroundRefresh:
+    """Run refresh calls in background threads, only one per key."""
+
+    def __init__(self, max_workers=4):
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._keys = set()
+        self._executor = None
+
+    def __len__(self):
+        """Return the number of refreshes pending."""
+        return len(self._keys)
+
+    def submit(self, key, function, *args, **kwargs):
+        """Call ``function`` in background if ``key`` is not pending.
+
+        The errors are ignored; the next stale hit tries again.
+
+        """
+        with self._lock:
+            if key in self._keys:
+                return None
+            self._keys.add(key)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="pycf3-refresh",
+                )
+            future = self._executor.submit(function, *args, **kwargs)
+
+        def done(_):
+            with self._lock:
+                self._keys.discard(key)
+
+        future.add_done_callback(done)
+        return future
+
+    def wait(self):
+        """Wait until all the pending refreshes finish."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+# =============================================================================
+# RESPONSE OBJECT
+# =============================================================================
+
+
+def _build_response(url, status_code, content, headers=None, reason=None):
+    """Create a ``requests.Response`` from its raw parts."""
+    response = requests.Response()
+    response.url = url
+    response.status_code = status_code
+    response.reason = reason
+    response.headers = requests.structures.CaseInsensitiveDict(headers or {})
+    response.encoding = "utf-8"
+    response._content = content
+    return response
+
+
+# header of the cache records: magic, version, stored_at and status code.
+_RECORD_HEADER = struct.Struct("<5sBdH")
+
+_RECORD_MAGIC = b"PYCF3"
+
+_RECORD_VERSION = 1
+
+
+def _parse_legacy_key(key):
+    """Decompose a cache key of the old pycf3 versions.
+
+    The old keys were created with ``diskcache.core.args_to_key()`` from the
+    calculator, the coordinate system, the URL and the payload. Returns a
+    tuple with the calculator, the URL and the payload, or ``None`` if
+    ``key`` is not a legacy key.
+
+    """
+    if not (isinstance(key, tuple) and len(key) == 12 and key[3] is None):
+        return None
+    calculator, _, url = key[:3]
+    payload = dict(zip(key[4::2], key[5::2]))
+    return calculator, url, payload
+
+
+def _legacy_to_key(key):
+    """Convert a cache key of the old pycf3 versions to a binary key.
+
+    Returns ``None`` if ``key`` is not a legacy key.
+
+    """
+    parsed = _parse_legacy_key(key)
+    if parsed is None:
+        return None
+    calculator, url, payload = parsed
+    alpha, delta = payload["coordinate"]
+    return _CACHE_KEY.pack(
+        zlib.crc32(f"{calculator}@{url}".encode("utf-8")),
+        _COORDINATE_SYSTEM_ID[CoordinateSystem(payload["system"])],
+        _PARAMETER_ID[Parameter(payload["parameter"])],
+        alpha,
+        delta,
+        payload["value"],
+    )
+
+
+def _pack_response(response, stored_at=None):
+    """Serialize a response as a compact cache record.
+
+    Only the status code and the raw JSON body are stored, preceded by a
+    fixed size header with the format version and the storage time.
+
+    """
+    stored_at = time.time() if stored_at is None else stored_at
+    header = _RECORD_HEADER.pack(
+        _RECORD_MAGIC, _RECORD_VERSION, stored_at, response.status_code
+    )
+    return header + response.content
+
+
+def _unpack_response(record, url):
+    """Recreate the response stored in a cache record.
+
+    Returns a tuple with the response and the time when it was stored. The
+    pickled ``requests.Response`` of the legacy cache entries are returned
+    as-is with ``stored_at`` as ``None``, and the unknown records are
+    treated as misses (``(None, None)``) so they are fetched again.
+
+    """
+    if isinstance(record, requests.Response):
+        return record, None
+
+    if not (
+        isinstance(record, bytes)
+        and len(record) >= _RECORD_HEADER.size
+        and record.startswith(_RECORD_MAGIC)
+    ):
+        return None, None
+
+    _, version, stored_at, status_code = _RECORD_HEADER.unpack_from(record)
+    if version != _RECORD_VERSION:
+        return None, None
+
+    content = bytes(record[_RECORD_HEADER.size :])  # noqa
+    response = _build_response(url, status_code, content, reason="OK")
+    return response, stored_at
+
+
+# the errors of the calculator that are cached and masked
+_FETCH_ERRORS = (requests.HTTPError, requests.exceptions.RetryError)
+
+
+def _failure_response(error, url):
+    """Create the response that represents a failed request.
+
+    The HTTP errors keep their response. The requests that exhausted the
+    retries have no response, so they are represented with the status code
+    ``0`` and the error message as body.
+
+    """
+    response = getattr(error, "response", None)
+    if response is None:
+        response = _build_response(url, 0, str(error).encode())
+    return response
+
+
+def _pack_failure(error, url, stored_at=None):
+    """Serialize a failed request as a negative cache record."""
+    return _pack_response(_failure_response(error, url), stored_at=stored_at)
+
+
+def _is_failure(response):
+    """Return ``True`` if the response comes from a negative cache record."""
+    return response is not None and not 0 < response.status_code < 400
+
+
+def _raise_failure(response):
+    """Raise again the error stored in a negative cache record."""
+    if response.status_code == 0:
+        raise requests.exceptions.RetryError(response.text, response=response)
+    try:
+        response.reason = HTTPStatus(response.status_code).phrase
+    except ValueError:
+        response.reason = None
+    response.raise_for_status()
+
+
+CalculatedAt = namedtuple(
+    "CalculatedAt", ["ra", "dec", "glon", "glat", "sgl", "sgb"]
+)
+
+QuantizedPoint = namedtuple("QuantizedPoint", ["alpha", "delta", "value"])
+
+
+class _ResultReprMixin:
+    """Text representation shared by all the single row results."""
+
+    __slots__ = ()
+
+    def _get_call_result(self):
+        alpha_name, delta_name = ALPHA[self.coordinate], DELTA[self.coordinate]
+
+        value = (
+            self.distance
+            if self.calculated_by == Parameter.distance
+            else self.velocity
+        )
+
+        call_result = (
+            f"{self.calculator}("
+            f"{self.calculated_by.value}={value}, "
+            f"{alpha_name}={self.alpha}, "
+            f"{delta_name}={self.delta})"
+        )
+
+        return call_result
+
+    def __repr__(self):
+        """x.__repr__() <==> repr(x)."""
+        # header
+        call_result = self._get_call_result()
+        header = f"Result - {call_result}"
+
+        # body
+        table = []
+        table.append(
+            [
+                "Observed\n\n",
+                "Distance (Mpc)\nVelocity (Km/s)",
+                f"{self.observed_distance_}\n{self.observed_velocity_}",
+            ]
+        )
+        if self.adjusted_distance_ or self.adjusted_velocity_:
+            table.append(
+                [
+                    "Adjusted\n\n",
+                    "Distance (Mpc)\nVelocity (Km/s)",
+                    f"{self.adjusted_distance_}\n{self.adjusted_velocity_}",
+                ]
+            )
+        body = tabulate.tabulate(table, headers="", tablefmt="grid")
+
+        # merge and return
+        return f"{header}\n{body}"
+
+
+@attr.s(eq=False, order=False, frozen=True, repr=False)
+class Result(_ResultReprMixin):
+    r"""Parsed result.
+
+    Parameters
+    ----------
+    calculator : ``str``
+        The used calculator.
+    url : ``str``
+        The url of the calculator.
+    coordinate : ``Coordinate``
+        Coordinate system used to create this result.
+    alpha : ``int`` or ``float``
+        :math:`\alpha` value for the coordinate system.
+    delta : ``int`` or ``float``
+        :math:`\delta` value for the coordinate system.
+    distance : ``int``, ``float`` or ``None``
+        Distance used to calculate the velocity in Mpc.
+    velocity : ``int``, ``float`` or ``None``
+        Velocity used to calculate the distance in Km/s.
+
+    Attributes
+    ----------
+    response_ : ``requests.Response``
+        Original response object create by the *requests* library.
+        More information: https://2.python-requests.org
+    observed_distance_: ``numpy.ndarray``
+        Observed distances.
+    observed_velocity_: ``float``
+        Observed velocity
+    adjusted_distance_: ``numpy.ndarray``
+        Cosmologically adjusted distances.
+    adjusted_velocity_: ``float``
+        Cosmologically adjusted velocity, :math:`V^c_{ls}`.
+    calculated_at_: ``pycf3.CalculatedAt``
+        Coordinates in all the three supported systems.
+    quantized_: ``pycf3.QuantizedPoint`` or ``None``
+        The point of the grid of the ``pycf3.Quantization`` of the client
+        that was sent to the calculator instead of the given ``alpha``,
+        ``delta`` and distance or velocity (``None`` if the client has no
+        quantization).
+    stale_: ``bool``
+        ``True`` if the result was served from an expired cache entry inside
+        the ``stale_grace`` window of the client (the entry is refreshed in
+        background).
+
+    """
+
+    calculator = attr.ib()
+    url = attr.ib(repr=False)
+
+    coordinate = attr.ib()
+    calculated_by = attr.ib()
+    alpha = attr.ib()
+    delta = attr.ib()
+    distance = attr.ib()
+    velocity = attr.ib()
+
+    response_ = attr.ib(repr=False)
+    quantized_ = attr.ib(default=None, repr=False)
+    stale_ = attr.ib(default=False, repr=False)
+
+    observed_distance_ = attr.ib(init=False, repr=False)
+    observed_velocity_ = attr.ib(init=False, repr=False)
+    adjusted_distance_ = attr.ib(init=False, repr=False)
+    adjusted_velocity_ = attr.ib(init=False, repr=False)
+
+    calculated_at_ = attr.ib(init=False, repr=False)
+
+    # =========================================================================
+    # INTERNAL
+    # =========================================================================
+
+    def _repr_html_(self):
+        """Create an HTML representation of the result.
+
+        Mostly used inside jupyter environment.
+
+        """
+        import jinja2  # noqa
+
+        call_result = self._get_call_result()
+
+        id_result = str(id(self) + np.random.random()).replace(".", "rr")
+
+        params = {
+            "result": self,
+            "id_result": id_result,
+            "call_result": call_result,
+            "json_result": json.dumps(self.json_, indent=2),
+        }
+        return jinja2.Template(RESULT_HTML_TEMPLATE).render(**params)
+
+    @property
+    def json_(self):
+        """Proxy to ``response_.json()``."""
+        return self.response_.json()
+
+    @observed_distance_.default
+    def _observed_distance_default(self):
+        if "observed" in self.json_:
+            return np.array(self.json_["observed"]["distance"])
+        return np.array(self.json_["distance"])
+
+    @observed_velocity_.default
+    def _observed_velocity_default(self):
+        if "observed" in self.json_:
+            return self.json_["observed"]["velocity"]
+        return self.json_["velocity"]
+
+    @adjusted_distance_.default
+    def _adjusted_distance_default(self):
+        try:
+            return np.array(self.json_["adjusted"]["distance"])
+        except KeyError:
+            return None
+
+    @adjusted_velocity_.default
+    def _adjusted_velocity_default(self):
+        try:
+            return self.json_["adjusted"]["velocity"]
+        except KeyError:
+            return None
+
+    @calculated_at_.default
+    def _calculated_at_default(self):
+        data = self.json_
+        return CalculatedAt(
+            ra=data["RA"],
+            dec=data["Dec"],
+            glon=data["Glon"],
+            glat=data["Glat"],
+            sgl=data["SGL"],
+            sgb=data["SGB"],
+        )
+
+    # =========================================================================
+    # DEPRECATED API
+    # =========================================================================
+
+    @property
+    @deprecated(
+        category=CFDeprecationWarning,
+        action="once",
+        reason="Use `calculated_by` instead",
+        version="2020.12",
+    )
+    def search_by(self):
+        """Proxy to ``response.calculated_by``.
+
+        .. deprecated:: 2020.12
+            "Use `calculated_by` instead"
+
+        """
+        return self.calculated_by
+
+    @property
+    @deprecated(
+        category=CFDeprecationWarning,
+        action="once",
+        reason="Use `calculated_at_` instead",
+        version="2020.12",
+    )
+    def search_at_(self):
         """Proxy to ``response.calculated_at_``.
 
         .. deprecated:: 2020.12
-            "Use `calculated_at` instead"
+            "Use `calculated_at` instead"
+
+        """
+        return self.calculated_at_
+
+
+# =============================================================================
+# RESULT SET
+# =============================================================================
+
+
+@attr.s(eq=False, order=False, frozen=True, slots=True, repr=False)
+class RaggedArray:
+    """Sequence of variable length arrays stored as flat values plus offsets.
+
+    The row ``i`` is ``values[offsets[i]:offsets[i + 1]]``. Integer indexing
+    and contiguous slicing returns views over the same buffers; any other
+    kind of indexing creates a new compacted array.
+
+    Parameters
+    ----------
+    values : ``numpy.ndarray``
+        The values of all the rows concatenated.
+    offsets : ``numpy.ndarray``
+        Integer array with ``len(self) + 1`` boundaries of the rows
+        inside ``values``.
+
+    """
+
+    values = attr.ib(converter=np.asarray)
+    offsets = attr.ib(converter=np.asarray)
+
+    @classmethod
+    def from_sequences(cls, sequences, dtype=float):
+        """Create a new instance from a sequence of sequences."""
+        sequences = [np.asarray(seq, dtype=dtype).ravel() for seq in sequences]
+        offsets = np.zeros(len(sequences) + 1, dtype=np.int64)
+        np.cumsum([len(seq) for seq in sequences], out=offsets[1:])
+        values = np.concatenate(sequences) if sequences else np.empty(0, dtype)
+        return cls(values=values, offsets=offsets)
+
+    @classmethod
+    def concatenate(cls, arrays):
+        """Join a sequence of ragged arrays into a new one."""
+        arrays = list(arrays)
+        if not arrays:
+            return cls.from_sequences([])
+
+        # every array may be a view, so only the used values are copied
+        values, offsets, size = [], [np.zeros(1, dtype=np.int64)], 0
+        for arr in arrays:
+            start, stop = arr.offsets[0], arr.offsets[-1]
+            values.append(arr.values[start:stop])
+            offsets.append(arr.offsets[1:] - start + size)
+            size += stop - start
+
+        return cls(
+            values=np.concatenate(values), offsets=np.concatenate(offsets)
+        )
+
+    def __len__(self):
+        """x.__len__() <==> len(x)."""
+        return len(self.offsets) - 1
+
+    def __getitem__(self, idx):
+        """x.__getitem__(y) <==> x[y]."""
+        if isinstance(idx, (int, np.integer)):
+            size = len(self)
+            if not (-size <= idx < size):
+                raise IndexError(f"index {idx} is out of bounds")
+            idx = idx % size
+            start, stop = self.offsets[idx], self.offsets[idx + 1]
+            return self.values[start:stop]
+
+        if isinstance(idx, slice) and idx.step in (None, 1):
+            start, stop, _ = idx.indices(len(self))
+            stop = max(start, stop)
+            offsets = self.offsets[start : stop + 1]  # noqa
+            return type(self)(self.values, offsets)
+
+        rows = np.arange(len(self))[idx]
+        return type(self).from_sequences(
+            [self[row] for row in rows], dtype=self.values.dtype
+        )
+
+    def __iter__(self):
+        """x.__iter__() <==> iter(x)."""
+        return (self[idx] for idx in range(len(self)))
+
+    def __repr__(self):
+        """x.__repr__() <==> repr(x)."""
+        return f"<{type(self).__name__} - {len(self)} rows>"
+
+    @property
+    def nbytes(self):
+        """Total bytes consumed by the elements of the ragged array."""
+        return self.values.nbytes + self.offsets.nbytes
+
+
+@attr.s(eq=False, order=False, frozen=True, slots=True, repr=False)
+class ResultView(_ResultReprMixin):
+    """Lightweight single row of a ``pycf3.ResultSet``.
+
+    It has the same attributes of ``pycf3.Result`` but without the original
+    response of the calculator; all the arrays are views over the columns
+    of the set.
+
+    """
+
+    calculator = attr.ib()
+    url = attr.ib()
+    coordinate = attr.ib()
+    calculated_by = attr.ib()
+    alpha = attr.ib()
+    delta = attr.ib()
+    distance = attr.ib()
+    velocity = attr.ib()
+
+    observed_distance_ = attr.ib()
+    observed_velocity_ = attr.ib()
+    adjusted_distance_ = attr.ib()
+    adjusted_velocity_ = attr.ib()
+
+    calculated_at_ = attr.ib()
+
+    error_ = attr.ib(default=RowError.NONE)
+    quantized_ = attr.ib(default=None)
+    stale_ = attr.ib(default=False)
+
+
+@attr.s(eq=False, order=False, frozen=True, repr=False)
+class ResultSet:
+    r"""Columnar results of a batch of queries against the same calculator.
+
+    All the rows share the calculator, coordinate system and the parameter
+    used to calculate them, and every other attribute is stored as a column
+    (struct-of-arrays). Indexing with an integer creates a
+    ``pycf3.ResultView`` on demand, and slicing creates a new ``ResultSet``
+    whose columns are views over the original ones.
+
+    Parameters
+    ----------
+    calculator : ``str``
+        The used calculator.
+    url : ``str``
+        The url of the calculator.
+    coordinate : ``Coordinate``
+        Coordinate system used to create this results.
+    calculated_by : ``Parameter``
+        Parameter used to calculate the results.
+    alpha : ``numpy.ndarray``
+        :math:`\alpha` values for the coordinate system.
+    delta : ``numpy.ndarray``
+        :math:`\delta` values for the coordinate system.
+    distance : ``numpy.ndarray`` or ``None``
+        Distances used to calculate the velocities in Mpc.
+    velocity : ``numpy.ndarray`` or ``None``
+        Velocities used to calculate the distances in Km/s.
+    observed_distance_: ``pycf3.RaggedArray``
+        Observed distances of every row.
+    observed_velocity_: ``numpy.ndarray``
+        Observed velocities.
+    adjusted_distance_: ``pycf3.RaggedArray``
+        Cosmologically adjusted distances of every row (empty if the
+        calculator don't provide it).
+    adjusted_velocity_: ``numpy.ndarray``
+        Cosmologically adjusted velocities, :math:`V^c_{ls}` (``NaN`` if the
+        calculator don't provide it).
+    calculated_at_: ``pycf3.CalculatedAt``
+        Coordinates in all the three supported systems, every one as an
+        array.
+    errors_: ``numpy.ndarray``
+        ``pycf3.RowError`` flags of every row. The rows with errors were
+        never sent to the calculator and all their results are ``NaN``.
+    duplicated_: ``numpy.ndarray``
+        Boolean mask of the rows that have the same cache key of a
+        previous row of the batch, and reuse its result instead of
+        being calculated again.
+    quantized_: ``pycf3.QuantizedPoint`` or ``None``
+        Arrays with the points of the grid that were sent to the calculator
+        (``None`` if the client has no quantization).
+    stale_: ``numpy.ndarray``
+        Boolean mask of the rows served from expired cache entries inside
+        the ``stale_grace`` window of the client.
+
+    """
+
+    calculator = attr.ib()
+    url = attr.ib(repr=False)
+    coordinate = attr.ib()
+    calculated_by = attr.ib()
+
+    alpha = attr.ib(repr=False)
+    delta = attr.ib(repr=False)
+    distance = attr.ib(repr=False)
+    velocity = attr.ib(repr=False)
+
+    observed_distance_ = attr.ib(repr=False)
+    observed_velocity_ = attr.ib(repr=False)
+    adjusted_distance_ = attr.ib(repr=False)
+    adjusted_velocity_ = attr.ib(repr=False)
+
+    calculated_at_ = attr.ib(repr=False)
+
+    errors_ = attr.ib(repr=False)
+    duplicated_ = attr.ib(repr=False)
+    quantized_ = attr.ib(default=None, repr=False)
+    stale_ = attr.ib(repr=False)
+
+    @errors_.default
+    def _errors_default(self):
+        return np.zeros(len(self.alpha), dtype=np.uint8)
+
+    @duplicated_.default
+    def _duplicated_default(self):
+        return np.zeros(len(self.alpha), dtype=bool)
+
+    @stale_.default
+    def _stale_default(self):
+        return np.zeros(len(self.alpha), dtype=bool)
+
+    @classmethod
+    def from_json(
+        cls,
+        *,
+        calculator,
+        url,
+        coordinate,
+        calculated_by,
+        alpha,
+        delta,
+        value,
+        jsons,
+        errors=None,
+        duplicated=None,
+        quantized=None,
+        stale=None,
+    ):
+        r"""Create a new result set parsing the JSON returned by a calculator.
+
+        Parameters
+        ----------
+        calculator : ``str``
+            The used calculator.
+        url : ``str``
+            The url of the calculator.
+        coordinate : ``Coordinate``
+            Coordinate system used to create this results.
+        calculated_by : ``Parameter``
+            Parameter used to calculate the results.
+        alpha : ``numpy.ndarray``
+            :math:`\alpha` values for the coordinate system.
+        delta : ``numpy.ndarray``
+            :math:`\delta` values for the coordinate system.
+        value : ``numpy.ndarray``
+            Distances or velocities used to calculate the results.
+        jsons : iterable of ``dict`` or ``None``
+            The decoded JSON of every row. ``None`` marks a row that was
+            not calculated.
+        errors : ``numpy.ndarray`` or ``None`` (default: ``None``)
+            ``pycf3.RowError`` flags of every row. ``None`` means that all
+            the rows are valid.
+        duplicated : ``numpy.ndarray`` or ``None`` (default: ``None``)
+            Boolean mask of the rows that reuse the result of a previous
+            row. ``None`` means that there are no duplicated rows.
+        quantized : ``pycf3.QuantizedPoint`` or ``None`` (default: ``None``)
+            Arrays with the points of the grid sent to the calculator.
+        stale : ``numpy.ndarray`` or ``None`` (default: ``None``)
+            Boolean mask of the rows served from expired cache entries.
+            ``None`` means that there are no stale rows.
+
+        Returns
+        -------
+        pycf3.ResultSet :
+            New result set.
+
+        """
+        size = len(value)
+
+        observed_velocity = np.full(size, np.nan, dtype=float)
+        adjusted_velocity = np.full(size, np.nan, dtype=float)
+        calculated_at = np.full((6, size), np.nan, dtype=float)
+        observed_distance, adjusted_distance = [], []
+
+        for idx, data in enumerate(jsons):
+            if data is None:
+                observed_distance.append(())
+                adjusted_distance.append(())
+                continue
+
+            observed = data.get("observed", data)
+            observed_velocity[idx] = observed["velocity"]
+            observed_distance.append(observed["distance"])
+
+            adjusted = data.get("adjusted")
+            if adjusted is None:
+                adjusted_distance.append(())
+            else:
+                adjusted_velocity[idx] = adjusted["velocity"]
+                adjusted_distance.append(adjusted["distance"])
+
+            calculated_at[:, idx] = (
+                data["RA"],
+                data["Dec"],
+                data["Glon"],
+                data["Glat"],
+                data["SGL"],
+                data["SGB"],
+            )
+
+        if errors is None:
+            errors = np.zeros(size, dtype=np.uint8)
+        if duplicated is None:
+            duplicated = np.zeros(size, dtype=bool)
+        if stale is None:
+            stale = np.zeros(size, dtype=bool)
+
+        is_distance = calculated_by == Parameter.distance
+        return cls(
+            calculator=calculator,
+            url=url,
+            coordinate=coordinate,
+            calculated_by=calculated_by,
+            alpha=np.asarray(alpha, dtype=float),
+            delta=np.asarray(delta, dtype=float),
+            distance=np.asarray(value, dtype=float) if is_distance else None,
+            velocity=None if is_distance else np.asarray(value, dtype=float),
+            observed_distance_=RaggedArray.from_sequences(observed_distance),
+            observed_velocity_=observed_velocity,
+            adjusted_distance_=RaggedArray.from_sequences(adjusted_distance),
+            adjusted_velocity_=adjusted_velocity,
+            calculated_at_=CalculatedAt(*calculated_at),
+            errors_=np.asarray(errors, dtype=np.uint8),
+            duplicated_=np.asarray(duplicated, dtype=bool),
+            quantized_=quantized,
+            stale_=np.asarray(stale, dtype=bool),
+        )
+
+    @classmethod
+    def concatenate(cls, result_sets):
+        """Join a sequence of result sets into a new one.
+
+        All the result sets must share the calculator, the coordinate system
+        and the parameter used to calculate them.
+
+        Parameters
+        ----------
+        result_sets : iterable of ``pycf3.ResultSet``
+            The result sets to join, in order.
+
+        Returns
+        -------
+        pycf3.ResultSet :
+            New result set with all the rows.
+
+        """
+        result_sets = list(result_sets)
+        if not result_sets:
+            raise ValueError("need at least one result set to concatenate")
+
+        first = result_sets[0]
+        for rset in result_sets[1:]:
+            if (rset.calculator, rset.coordinate, rset.calculated_by) != (
+                first.calculator,
+                first.coordinate,
+                first.calculated_by,
+            ):
+                raise ValueError(
+                    "all the result sets must have the same calculator, "
+                    "coordinate and calculated_by"
+                )
+
+        def join(name):
+            columns = [getattr(rset, name) for rset in result_sets]
+            return None if columns[0] is None else np.concatenate(columns)
+
+        def join_fields(name, fields_cls):
+            values = [getattr(rset, name) for rset in result_sets]
+            if values[0] is None:
+                return None
+            return fields_cls(*(np.concatenate(c) for c in zip(*values)))
+
+        return cls(
+            calculator=first.calculator,
+            url=first.url,
+            coordinate=first.coordinate,
+            calculated_by=first.calculated_by,
+            alpha=join("alpha"),
+            delta=join("delta"),
+            distance=join("distance"),
+            velocity=join("velocity"),
+            observed_distance_=RaggedArray.concatenate(
+                rset.observed_distance_ for rset in result_sets
+            ),
+            observed_velocity_=join("observed_velocity_"),
+            adjusted_distance_=RaggedArray.concatenate(
+                rset.adjusted_distance_ for rset in result_sets
+            ),
+            adjusted_velocity_=join("adjusted_velocity_"),
+            calculated_at_=join_fields("calculated_at_", CalculatedAt),
+            errors_=join("errors_"),
+            duplicated_=join("duplicated_"),
+            quantized_=join_fields("quantized_", QuantizedPoint),
+            stale_=join("stale_"),
+        )
+
+    def __len__(self):
+        """x.__len__() <==> len(x)."""
+        return len(self.alpha)
+
+    def __getitem__(self, idx):
+        """x.__getitem__(y) <==> x[y]."""
+        if isinstance(idx, (int, np.integer)):
+            return self._get_row(idx)
+
+        def take(column):
+            return None if column is None else column[idx]
+
+        return type(self)(
+            calculator=self.calculator,
+            url=self.url,
+            coordinate=self.coordinate,
+            calculated_by=self.calculated_by,
+            alpha=self.alpha[idx],
+            delta=self.delta[idx],
+            distance=take(self.distance),
+            velocity=take(self.velocity),
+            observed_distance_=self.observed_distance_[idx],
+            observed_velocity_=self.observed_velocity_[idx],
+            adjusted_distance_=self.adjusted_distance_[idx],
+            adjusted_velocity_=self.adjusted_velocity_[idx],
+            calculated_at_=CalculatedAt(
+                *(c[idx] for c in self.calculated_at_)
+            ),
+            errors_=self.errors_[idx],
+            duplicated_=self.duplicated_[idx],
+            quantized_=(
+                None
+                if self.quantized_ is None
+                else QuantizedPoint(*(c[idx] for c in self.quantized_))
+            ),
+            stale_=self.stale_[idx],
+        )
+
+    def __iter__(self):
+        """x.__iter__() <==> iter(x)."""
+        return (self._get_row(idx) for idx in range(len(self)))
+
+    def __repr__(self):
+        """x.__repr__() <==> repr(x)."""
+        cls = type(self).__name__
+        return (
+            f"<{cls} {self.calculator}@{self.coordinate.value} "
+            f"calculated_by={self.calculated_by.value} - {len(self)} rows>"
+        )
+
+    def _get_row(self, idx):
+        size = len(self)
+        if not (-size <= idx < size):
+            raise IndexError(f"index {idx} is out of bounds")
+        idx = int(idx % size)
+
+        adjusted_velocity = self.adjusted_velocity_[idx]
+        has_adjusted = not np.isnan(adjusted_velocity)
+
+        return ResultView(
+            calculator=self.calculator,
+            url=self.url,
+            coordinate=self.coordinate,
+            calculated_by=self.calculated_by,
+            alpha=float(self.alpha[idx]),
+            delta=float(self.delta[idx]),
+            distance=(
+                None if self.distance is None else float(self.distance[idx])
+            ),
+            velocity=(
+                None if self.velocity is None else float(self.velocity[idx])
+            ),
+            observed_distance_=self.observed_distance_[idx],
+            observed_velocity_=float(self.observed_velocity_[idx]),
+            adjusted_distance_=(
+                self.adjusted_distance_[idx] if has_adjusted else None
+            ),
+            adjusted_velocity_=(
+                float(adjusted_velocity) if has_adjusted else None
+            ),
+            calculated_at_=CalculatedAt(
+                *(float(c[idx]) for c in self.calculated_at_)
+            ),
+            error_=RowError(int(self.errors_[idx])),
+            quantized_=(
+                None
+                if self.quantized_ is None
+                else QuantizedPoint(*(float(c[idx]) for c in self.quantized_))
+            ),
+            stale_=bool(self.stale_[idx]),
+        )
+
+    @property
+    def valid_(self):
+        """Boolean mask of the rows without errors."""
+        return self.errors_ == 0
+
+    @property
+    def duplicates_(self):
+        """Number of rows that reuse the result of a previous row."""
+        return int(np.count_nonzero(self.duplicated_))
+
+    @property
+    def nbytes(self):
+        """Total bytes consumed by the columns of the result set."""
+        columns = [
+            self.alpha,
+            self.delta,
+            self.distance,
+            self.velocity,
+            self.observed_distance_,
+            self.observed_velocity_,
+            self.adjusted_distance_,
+            self.adjusted_velocity_,
+        ]
+        columns.extend(self.calculated_at_)
+        columns.extend([self.errors_, self.duplicated_, self.stale_])
+        columns.extend(self.quantized_ or ())
+        return sum(c.nbytes for c in columns if c is not None)
+
+
+# =============================================================================
+# ABSTRACT CLIENT
+# =============================================================================
+
+_Batch = namedtuple(
+    "_Batch",
+    [
+        "coordinate_system",
+        "parameter",
+        "alpha",
+        "delta",
+        "value",
+        "errors",
+        "rows",
+        "inverse",
+        "duplicated",
+        "quantized",
+        "payloads",
+        "keys",
+    ],
+)
+
+WarmReport = namedtuple(
+    "WarmReport",
+    ["total", "resumed", "invalid", "cached", "fetched", "failed"],
+)
+
+CacheUsage = namedtuple("CacheUsage", ["entries", "nbytes"])
+
+CacheStats = namedtuple(
+    "CacheStats",
+    [
+        "hits",
+        "memory_hits",
+        "stale_hits",
+        "nearest_hits",
+        "negative_hits",
+        "misses",
+        "network_calls",
+        "network_errors",
+        "bytes_stored",
+        "lookup_time",
+        "fetch_time",
+        "store_time",
+    ],
+)
+
+
+class _CacheCounters:
+    """Thread safe counters of the cache usage, grouped by cache tag."""
+
+    #: The initial value of the counters of every tag.
+    ZERO = CacheStats(*([0] * 9), 0.0, 0.0, 0.0)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+
+    def add(self, tag, **increments):
+        """Add the increments to the counters of the tag."""
+        with self._lock:
+            counters = self._counters.get(tag)
+            if counters is None:
+                counters = self._counters[tag] = self.ZERO._asdict()
+            for name, increment in increments.items():
+                counters[name] += increment
+
+    def update(self, increments_by_tag):
+        """Add the increments of several tags at once."""
+        for tag, increments in increments_by_tag.items():
+            self.add(tag, **increments)
+
+    @contextlib.contextmanager
+    def network(self, tag):
+        """Count a network call of the tag, its latency and failure."""
+        start, errors = time.perf_counter(), 1
+        try:
+            yield
+            errors = 0
+        finally:
+            elapsed = time.perf_counter() - start
+            self.add(
+                tag, network_calls=1, network_errors=errors, fetch_time=elapsed
+            )
+
+    def snapshot(self, reset=False):
+        """Return the ``CacheStats`` of every tag."""
+        with self._lock:
+            stats = {
+                tag: CacheStats(**counters)
+                for tag, counters in self._counters.items()
+            }
+            if reset:
+                self._counters.clear()
+        return stats
+
+
+def sky_tiling(step):
+    """Approximately uniform tiling of the sphere.
+
+    The sphere is divided in rings of ``step`` degrees of latitude, and
+    every ring in cells of about ``step`` degrees of longitude.
+
+    Parameters
+    ----------
+    step : ``float``
+        Size of the cells in degrees.
+
+    Returns
+    -------
+    tuple of two ``numpy.ndarray`` :
+        The longitudes and latitudes of the centers of the cells.
+
+    """
+    if not 0 < step <= 180:
+        raise ValueError("step must be > 0 and <= 180")
+
+    longitudes, latitudes = [], []
+    for latitude in np.arange(-90 + step / 2, 90, step):
+        circle = 360 * np.cos(np.radians(latitude))
+        cells = max(1, int(round(circle / step)))
+        longitudes.append(np.arange(cells) * (360 / cells))
+        latitudes.append(np.full(cells, latitude))
+    return np.concatenate(longitudes), np.concatenate(latitudes)
+
+
+@attr.s(eq=False, order=False, frozen=True, repr=False)
+class AbstractClient(metaclass=DocInheritMeta(style="numpy")):
+    """Abstract base class for all clients.
+
+    Parameters
+    ----------
+    session : ``pycf3.Session`` (default: ``None``)
+        The session to use to send the requests. By default a
+        ``pyc3.RetrySession`` with 3 retry is created. More info:
+        https://2.python-requests.org,
+        https://urllib3.readthedocs.io/en/latest/reference/urllib3.util.html.
+    cache : ``diskcache.Cache``, ``diskcache.Fanout``,
+            ``pycf3.CacheBackend``, ``pycf3.NoCache`` or ``None``
+            (default: ``None``)
+        Any instance of ``diskcache.Cache``, ``diskcache.Fanout``,
+        ``pycf3.CacheBackend`` (like ``pycf3.TwoLevelCache`` to share the
+        cache between many nodes) or ``None`` (Default). If it's ``None`` a
+        ``diskcache.Cache`` istance is created with ``pycf3.default_cache()``
+        in the directory ``pycf3.DEFAULT_CACHE_DIR``.
+        More information: http://www.grantjenks.com/docs/diskcache
+    cache_size_limit : ``int``
+                       (default: ``pycf3.DEFAULT_CACHE_SIZE_LIMIT``)
+        Approximate maximum size in bytes of the default cache. Only used
+        if ``cache`` is ``None``.
+    cache_eviction_policy : ``str``
+                            (default: ``pycf3.DEFAULT_CACHE_EVICTION_POLICY``)
+        Eviction policy of the default cache (see
+        ``pycf3.default_cache()``). Only used if ``cache`` is ``None``.
+    cache_expire : ``float`` or None (default=``None``)
+        Seconds until item expires (default ``None``, no expiry)
+        More information: http://www.grantjenks.com/docs/diskcache
+    memory_cache : ``pycf3.MemoryCache`` or ``None`` (default: ``None``)
+        Optional in-memory tier checked before ``cache``. Every response
+        is stored in both tiers, and the disk hits are promoted to memory.
+    expire_policy : ``pycf3.ExpirePolicy`` (default: ``pycf3.AlwaysExpire``)
+        When the expired entries of ``cache`` are removed. Use
+        ``pycf3.CountExpire``, ``pycf3.TimerExpire`` or ``pycf3.LazyExpire``
+        to avoid scanning big caches before every lookup.
+    canonical_cache : ``bool`` (default: ``False``)
+        If it's ``True`` the cache keys of all the coordinate systems are
+        built with the supergalactic coordinates of the position (rounded
+        to :math:`10^{-4}` degrees, coarser than the usual precision of the
+        catalogs), so a position calculated in any system is a cache hit in
+        the other two.
+    quantization : ``pycf3.Quantization`` or ``None`` (default: ``None``)
+        If it's provided, every query is snapped to the grid before being
+        sent to the calculator and cached. The results keep the given values
+        and report the point of the grid in ``quantized_``.
+    nearest_match : ``pycf3.NearestMatch`` or ``None`` (default: ``None``)
+        If it's provided, the cache misses are answered with the nearest
+        cached result inside the tolerances (if any) found with the
+        ``pycf3.SpatialIndex`` of the cache, without any network call. The
+        index is loaded from the cache directory, or built on the first
+        miss, and it's updated with ``build_index()``.
+    stale_grace : ``float`` or ``None`` (default: ``None``)
+        Seconds that an entry is still served after ``cache_expire``
+        (stale-while-revalidate). The stale results are flagged with
+        ``stale_`` and the entry is refreshed in background, so the callers
+        only wait for the calculator after the grace window. Requires a
+        ``cache_expire``.
+    negative_cache_expire : ``float`` or ``None`` (default: ``None``)
+        If it's provided, the HTTP errors of the calculator (and the
+        requests that exhausted the retries of the session) are cached for
+        these seconds with the same key of the results, and every call with
+        the same query raises the stored error immediately, without any
+        network call or backoff.
+
+    """
+
+    session: requests.Session = attr.ib(repr=False)
+
+    # the settings of the default cache must be defined before the cache
+    cache_size_limit: int = attr.ib(
+        default=DEFAULT_CACHE_SIZE_LIMIT, repr=False, kw_only=True
+    )
+    cache_eviction_policy: str = attr.ib(
+        default=DEFAULT_CACHE_EVICTION_POLICY, repr=False, kw_only=True
+    )
+
+    cache: t.Union[dcache.Cache, dcache.FanoutCache, CacheBackend] = attr.ib()
+    cache_expire: float = attr.ib(default=None, repr=False)
+    memory_cache: MemoryCache = attr.ib(default=None, repr=False, kw_only=True)
+    expire_policy: ExpirePolicy = attr.ib(
+        factory=AlwaysExpire, repr=False, kw_only=True
+    )
+    canonical_cache: bool = attr.ib(default=False, repr=False, kw_only=True)
+    quantization: Quantization = attr.ib(
+        default=None, repr=False, kw_only=True
+    )
+    nearest_match: NearestMatch = attr.ib(
+        default=None, repr=False, kw_only=True
+    )
+    stale_grace: float = attr.ib(default=None, repr=False, kw_only=True)
+    negative_cache_expire: float = attr.ib(
+        default=None, repr=False, kw_only=True
+    )
+
+    _flights = attr.ib(factory=SingleFlight, init=False, repr=False)
+    _spatial_index = attr.ib(factory=dict, init=False, repr=False)
+    _refresher = attr.ib(factory=_BackgroundRefresh, init=False, repr=False)
+    _stats = attr.ib(factory=_CacheCounters, init=False, repr=False)
+
+    @stale_grace.validator
+    def _check_stale_grace(self, attribute, value):
+        if value is None:
+            return
+        if self.cache_expire is None:
+            raise ValueError("stale_grace requires a cache_expire")
+        if value < 0:
+            raise ValueError("stale_grace must be >= 0")
+
+    @negative_cache_expire.validator
+    def _check_negative_cache_expire(self, attribute, value):
+        if value is not None and value <= 0:
+            raise ValueError("negative_cache_expire must be > 0")
+
+    @session.default
+    def _session_default(self):
+        # the subclasses change the session with _make_session(), because
+        # redefining the attribute would change the positional arguments
+        return self._make_session()
+
+    def _make_session(self):
+        return RetrySession()
+
+    @cache.default
+    def _cache_default(self):
+        return default_cache(
+            size_limit=self.cache_size_limit,
+            eviction_policy=self.cache_eviction_policy,
+        )
+
+    def _determine_coordinate_system(self, ra, dec, glon, glat, sgl, sgb):
+
+        # first we put all the parameters in a single dictionary
+        params = {
+            "ra": ra,
+            "dec": dec,
+            "glon": glon,
+            "glat": glat,
+            "sgl": sgl,
+            "sgb": sgb,
+        }
+
+        # next we remove all keys with the default value `None`
+        params = {k: v for k, v in params.items() if v is not None}
+
+        # if we have 0 values no coordinate was given
+        if len(params) == 0:
+            raise ValueError(
+                "No coordinate was provided. "
+                "Please provide (ra, dec)', '(glon, glat)' or '(sgl, sgb)'."
+            )
+
+        # if we only have one we need to check wich one and inform about
+        # the mising companinon
+        if len(params) == 1:
+            pname = list(params.keys())[0]
+            coordinate_system, companion_dict = (
+                (ALPHA_TO_COORDINATE[pname], DELTA)
+                if pname in ALPHA_TO_COORDINATE
+                else (DELTA_TO_COORDINATE[pname], ALPHA)
+            )
+            companion = companion_dict[coordinate_system]
+            raise ValueError(f"No {companion} provided")
+
+        # if we have more than two parameter we have mixed coordinate system
+        if len(params) > 2:
+            raise MixedCoordinateSystemError(", ".join(params))
+
+        # now we need to detemine the coordinate system
+        coordinate_system_candidates = {
+            ALPHA_DELTA_TO_COORDINATE[p] for p in params.keys()
+        }
+
+        # if we have more than 1 candidate we mix coordinates again
+        if len(coordinate_system_candidates) > 1:
+            raise MixedCoordinateSystemError(", ".join(params))
+
+        # we have one coordinate system and we need to dermermine which
+        # is alpha and wich is delta
+        coordinate_system = coordinate_system_candidates.pop()
+        alpha_coordinate_name = ALPHA[coordinate_system]
+        delta_coordinate_name = DELTA[coordinate_system]
+
+        alpha = params[alpha_coordinate_name]
+        delta = params[delta_coordinate_name]
+
+        return coordinate_system, alpha, delta
+
+    def _validate(self, coordinate_system, alpha, delta, distance, velocity):
+        if coordinate_system not in CoordinateSystem:
+            raise TypeError(
+                "coordinate_system must be a member of "
+                "pycf3.core.CoordinateSystem enum"
+            )
+
+        if not isinstance(alpha, (int, float)):
+            raise TypeError(f"{ALPHA[coordinate_system]} must be int or float")
+
+        if not isinstance(delta, (int, float)):
+            raise TypeError(f"{DELTA[coordinate_system]} must be int or float")
+        elif not (-90 <= delta <= 90):
+            raise ValueError(
+                f"{DELTA[coordinate_system]} must be >= -90 and <= 90"
+            )
+
+        if (distance, velocity) == (None, None):
+            raise ValueError(
+                "You must provide the distance or the velocity value"
+            )
+        elif distance is not None and velocity is not None:
+            raise ValueError(
+                "You cant provide velocity and distance at the same time"
+            )
+
+        if distance is not None:
+            if not isinstance(distance, (int, float)):
+                raise TypeError("'distance' must be int or float")
+            elif not (0 < distance <= self.MAX_DISTANCE):
+                raise ValueError(
+                    f"'distance' must be > 0 and <= {self.MAX_DISTANCE}"
+                )
+            parameter, value = Parameter.distance, distance
+
+        elif velocity is not None:
+            if not isinstance(velocity, (int, float)):
+                raise TypeError("'velocity' must be int or float")
+            elif not (0 < velocity <= self.MAX_VELOCITY):
+                raise ValueError(
+                    f"'velocity' must be > 0 and <= {self.MAX_VELOCITY}"
+                )
+
+            parameter, value = Parameter.velocity, velocity
+
+        return parameter, value
+
+    def _validate_many(
+        self, coordinate_system, alpha, delta, parameter, value
+    ):
+        if coordinate_system not in CoordinateSystem:
+            raise TypeError(
+                "coordinate_system must be a member of "
+                "pycf3.core.CoordinateSystem enum"
+            )
+
+        # all the columns are converted to float arrays at once
+        names = (
+            ALPHA[coordinate_system],
+            DELTA[coordinate_system],
+            f"'{parameter.value}'",
+        )
+        columns = []
+        for name, column in zip(names, (alpha, delta, value)):
+            column = np.asarray(column)
+            if column.dtype.kind not in "iuf":
+                raise TypeError(f"{name} must be int or float")
+            columns.append(column.astype(float, copy=False))
+
+        try:
+            alpha, delta, value = np.broadcast_arrays(*np.atleast_1d(*columns))
+        except ValueError:
+            raise ValueError(
+                f"{', '.join(names)} must have the same length"
+            ) from None
+
+        if alpha.ndim != 1:
+            raise ValueError(f"{', '.join(names)} must be 1D arrays")
+
+        max_value = (
+            self.MAX_DISTANCE
+            if parameter == Parameter.distance
+            else self.MAX_VELOCITY
+        )
+
+        # every check is a vectorized comparison over the entire column
+        errors = np.zeros(alpha.shape, dtype=np.uint8)
+        checks = (
+            (RowError.ALPHA_NAN, ~np.isfinite(alpha)),
+            (RowError.DELTA_NAN, np.isnan(delta)),
+            (RowError.DELTA_OUT_OF_RANGE, (delta < -90) | (delta > 90)),
+            (RowError.VALUE_NAN, np.isnan(value)),
+            (RowError.VALUE_NOT_POSITIVE, value <= 0),
+            (RowError.VALUE_OUT_OF_RANGE, value > max_value),
+        )
+        for flag, invalid in checks:
+            errors[invalid] |= np.uint8(flag)
+
+        return alpha, delta, value, errors
+
+    def _raise_for_row_errors(self, coordinate_system, parameter, errors):
+        found = RowError(int(np.bitwise_or.reduce(errors, initial=0)))
+
+        if found & RowError.ALPHA_NAN:
+            raise ValueError(f"{ALPHA[coordinate_system]} must be finite")
+
+        if found & (RowError.DELTA_NAN | RowError.DELTA_OUT_OF_RANGE):
+            raise ValueError(
+                f"{DELTA[coordinate_system]} must be >= -90 and <= 90"
+            )
+
+        if found:
+            max_value = (
+                self.MAX_DISTANCE
+                if parameter == Parameter.distance
+                else self.MAX_VELOCITY
+            )
+            raise ValueError(
+                f"'{parameter.value}' must be > 0 and <= {max_value}"
+            )
+
+    def _build_payload(
+        self, coordinate_system, parameter, alpha, delta, value
+    ):
+        payload = {
+            "coordinate": [float(alpha), float(delta)],
+            "system": coordinate_system.value,
+            "parameter": parameter.value,
+            "value": float(value),
+        }
+        return payload
+
+    def _canonical_coordinates(self, coordinate_system, alpha, delta):
+        # the supergalactic position of the canonical keys (scalars or
+        # arrays), snapped to the grid if the client has a quantization
+        sgl, sgb = _to_supergalactic_many(
+            coordinate_system, alpha, delta, decimals=_CANONICAL_DECIMALS
+        )
+        if self.quantization is not None:
+            sgl, sgb = self.quantization.quantize_coordinates(sgl, sgb)
+        if np.ndim(alpha):
+            return sgl, sgb
+        return float(sgl[0]), float(sgb[0])
+
+    def _cache_key(self, coordinate_system, payload, canonical=None):
+        # fixed width binary key, cheap to build, compare and index; the
+        # batches provide the precomputed canonical position
+        alpha, delta = payload["coordinate"]
+        if self.canonical_cache:
+            if canonical is None:
+                canonical = self._canonical_coordinates(
+                    coordinate_system, alpha, delta
+                )
+            alpha, delta = canonical
+            coordinate_system = CoordinateSystem.supergalactic
+
+        key = _CACHE_KEY.pack(
+            self._calculator_id(),
+            _COORDINATE_SYSTEM_ID[coordinate_system],
+            _PARAMETER_ID[Parameter(payload["parameter"])],
+            alpha,
+            delta,
+            payload["value"],
+        )
+        return key
+
+    def _calculator_id(self):
+        calculator = f"{self.CALCULATOR}@{self.URL}".encode("utf-8")
+        return zlib.crc32(calculator)
+
+    def _cache_tag(self, key):
+        coordinate_system = _ID_COORDINATE_SYSTEM[key[4]]
+        return f"{self.CALCULATOR}@{coordinate_system.value}"
+
+    def _cache_tags(self, coordinate_system):
+        # the tags of the calculator, for one or all the coordinate systems
+        systems = (
+            CoordinateSystem
+            if coordinate_system is None
+            else [CoordinateSystem(coordinate_system)]
+        )
+        return [f"{self.CALCULATOR}@{system.value}" for system in systems]
+
+    def _stored_tag(self, key):
+        # the tag of an entry of the calculator (binary or legacy key), or
+        # None if the entry belongs to another calculator
+        if isinstance(key, bytes) and len(key) == _CACHE_KEY.size:
+            if _CACHE_KEY.unpack(key)[0] != self._calculator_id():
+                return None
+            return self._cache_tag(key)
+        if isinstance(key, tuple) and key[:1] == (self.CALCULATOR,):
+            return "@".join(key[:2])
+        return None
+
+    def _fetch(self, payload, **get_kwargs):
+        response = self.session.get(self.URL, json=payload, **get_kwargs)
+        response.raise_for_status()
+        return response
+
+    def _fetch_response(self, key, payload, **get_kwargs):
+        # the failures go to the negative cache, and the responses are
+        # stored by the caller
+        try:
+            with self._stats.network(self._cache_tag(key)):
+                return self._fetch(payload, **get_kwargs)
+        except _FETCH_ERRORS as error:
+            self._cache_failure(key, error)
+            raise
+
+    def _fetch_and_store(self, key, payload, **get_kwargs):
+        response = self._fetch_response(key, payload, **get_kwargs)
+        self._cache_set_many({key: response})
+        return response
+
+    def _fetch_once(self, key, payload, **get_kwargs):
+        # concurrent calls with the same key share the same request
+        return self._flights.do(
+            key, self._fetch_and_store, key, payload, **get_kwargs
+        )
+
+    def _prepare_pool(self, workers):
+        # the connection pool must be big enough for all the threads
+        resize_pool = getattr(self.session, "resize_pool", None)
+        if resize_pool is not None and workers > self.session.pool_size_:
+            resize_pool(workers)
+
+    def _fetch_many(
+        self, keys, payloads, workers, failures="raise", **get_kwargs
+    ):
+        # the responses are returned in the same order of the payloads; with
+        # failures="mask" the errors of the calculator are returned as
+        # failure responses instead of being raised. All the responses are
+        # stored at the end (even if the batch fails), with one write per tag
+        fetched = {}
+
+        def fetch(key, payload):
+            try:
+                response = self._flights.do(
+                    key, self._fetch_response, key, payload, **get_kwargs
+                )
+            except _FETCH_ERRORS as error:
+                if failures == "raise":
+                    raise
+                return _failure_response(error, self.URL)
+            fetched[key] = response
+            return response
+
+        try:
+            if workers == 1 or len(payloads) <= 1:
+                return list(map(fetch, keys, payloads))
+
+            workers = min(workers, len(payloads))
+            self._prepare_pool(workers)
+
+            # the executor waits for all the requests in flight before the
+            # responses are stored, even if one of them failed
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                return list(executor.map(fetch, keys, payloads))
+        finally:
+            self._cache_set_many(fetched)
+
+    def _cache_get_many(self, keys):
+        # return the responses (None for every miss) and which ones are
+        # stale; the memory hits never touch the disk
+        memory = self.memory_cache
+        responses = [None] * len(keys)
+        stale = [False] * len(keys)
+
+        # the statistics are accumulated here and added once per call
+        counters = {}
+
+        def count(key, start, **increments):
+            counter = counters.setdefault(self._cache_tag(key), Counter())
+            counter.update(increments, lookup_time=time.perf_counter() - start)
+
+        try:
+            if memory is not None:
+                for pos, key in enumerate(keys):
+                    start = time.perf_counter()
+                    responses[pos] = memory.get(key)
+                    if responses[pos] is None:
+                        count(key, start)
+                    else:
+                        count(key, start, hits=1, memory_hits=1)
+
+            misses = [pos for pos, r in enumerate(responses) if r is None]
+            if not misses:
+                return responses, stale
+
+            now = time.time()
+            with self.cache as cache:
+                self.expire_policy.maybe_expire(cache)
+
+                # all the misses are read at once, and every key accounts
+                # the same share of the time
+                start = time.perf_counter()
+                records = _get_many(cache, [keys[pos] for pos in misses])
+                share = (time.perf_counter() - start) / len(misses)
+
+                for pos, record in zip(misses, records):
+                    key, start = keys[pos], time.perf_counter() - share
+                    nearest = False
+                    if record is None:
+                        response = stored_at = None
+                        if self.nearest_match is not None:
+                            response = self._cache_nearest(cache, key)
+                            nearest = response is not None
+                    else:
+                        response, stored_at = _unpack_response(
+                            record, self.URL
+                        )
+                        if _is_failure(response):
+                            count(key, start, negative_hits=1)
+                            responses[pos] = response
+                            continue
+
+                    # the memory copies only live what the entry has left,
+                    # and the entries past their life (like the copies
+                    # without expiry of a TwoLevelCache) are misses
+                    fresh_for = self._fresh_for(stored_at, now)
+                    expired = fresh_for is not None and fresh_for <= 0
+                    if expired and -fresh_for >= (self.stale_grace or 0):
+                        response = None
+                    if response is None:
+                        count(key, start, misses=1)
+                    elif expired and self.stale_grace is not None:
+                        stale[pos] = True
+                        count(key, start, hits=1, stale_hits=1)
+                    else:
+                        if memory is not None and not nearest and not expired:
+                            memory.set(key, response, expire=fresh_for)
+                        count(key, start, hits=1, nearest_hits=int(nearest))
+                    responses[pos] = response
+        finally:
+            self._stats.update(counters)
+        return responses, stale
+
+    def _fresh_for(self, stored_at, now):
+        # seconds until the entry becomes stale (None means never)
+        if self.cache_expire is None:
+            return None
+        if stored_at is None:
+            return self.cache_expire
+        return self.cache_expire - (now - stored_at)
+
+    def _revalidate_many(self, keys, payloads, stale, **get_kwargs):
+        # the stale entries are refreshed in background, only once per key
+        for key, payload, is_stale in zip(keys, payloads, stale):
+            if is_stale:
+                self._refresher.submit(
+                    key, self._fetch_and_store, key, payload, **get_kwargs
+                )
+
+    def _index_path(self):
+        directory = getattr(self.cache, "directory", None)
+        if directory is None:
+            return None
+        return os.path.join(directory, SpatialIndex.FILENAME)
+
+    def _get_spatial_index(self, cache):
+        index = self._spatial_index.get("index")
+        if index is None:
+            path = self._index_path()
+            if path is not None and os.path.exists(path):
+                index = SpatialIndex.load(path)
+            else:
+                index = self._build_spatial_index(cache)
+            self._spatial_index["index"] = index
+        return index
+
+    def _build_spatial_index(self, cache):
+        index = SpatialIndex.from_cache(cache)
+        path = self._index_path()
+        if path is not None:
+            index.save(path)
+        return index
+
+    def _cache_nearest(self, cache, key):
+        # answer a miss with the closest entry of the spatial index
+        index = self._get_spatial_index(cache)
+        parameter = _ID_PARAMETER[key[5]]
+        neighbor = index.nearest(
+            key,
+            radius=self.nearest_match.radius,
+            tolerance=self.nearest_match.tolerance(parameter),
+        )
+        if neighbor is None:
+            return None
+
+        record = cache.get(neighbor, default=None, retry=True)
+        if record is None:
+            return None
+
+        response, _ = _unpack_response(record, self.URL)
+        return None if _is_failure(response) else response
+
+    def _cache_failure(self, key, error):
+        # the failures are only stored with the negative cache enabled, and
+        # never replace a stored result (e.g. a stale one being refreshed)
+        if self.negative_cache_expire is None:
+            return
+        with self.cache as cache:
+            if key in cache:
+                return
+            self._cache_store(
+                cache,
+                self._cache_tag(key),
+                {key: _pack_failure(error, self.URL)},
+                self.negative_cache_expire,
+            )
+
+    def _cache_set_many(self, responses):
+        # the responses of a mapping {key: response} are stored with a
+        # single write per tag
+        if not responses:
+            return
+        if self.memory_cache is not None:
+            for key, response in responses.items():
+                self.memory_cache.set(key, response, expire=self.cache_expire)
+
+        # the stale entries are kept until the end of the grace window
+        expire = self.cache_expire
+        if expire is not None and self.stale_grace is not None:
+            expire += self.stale_grace
+
+        records = {}
+        for key, response in responses.items():
+            tag = self._cache_tag(key)
+            records.setdefault(tag, {})[key] = _pack_response(response)
+        with self.cache as cache:
+            for tag, tag_records in records.items():
+                self._cache_store(cache, tag, tag_records, expire)
+
+    def _cache_store(self, cache, tag, records, expire):
+        # only the records really stored (e.g. not in a read-only cache)
+        # are accounted in the bytes_stored
+        start = time.perf_counter()
+        stored = _set_many(cache, records, expire=expire, tag=tag)
+        self._stats.add(
+            tag,
+            bytes_stored=sum(
+                len(record)
+                for record, is_stored in zip(records.values(), stored)
+                if is_stored
+            ),
+            store_time=time.perf_counter() - start,
+        )
+
+    def _extract_table_columns(self, data, value, coordinates):
+        # the names of the table are matched without case sensitivity
+        names = self._table_column_names(data)
+        lower_names = {str(name).lower(): name for name in names}
+
+        def column(name):
+            real_name = lower_names.get(str(name).lower())
+            if real_name is None:
+                raise KeyError(f"Column {name!r} not found in data")
+            column = data[real_name]
+            to_numpy = getattr(column, "to_numpy", None)
+            return np.asarray(column if to_numpy is None else to_numpy())
+
+        value = column(value) if isinstance(value, str) else value
+        coordinates = {
+            cname: column(cvalue) if isinstance(cvalue, str) else cvalue
+            for cname, cvalue in coordinates.items()
+        }
+
+        # if no coordinate is given, we detect the coordinate system from the
+        # the column names of the table
+        if all(cvalue is None for cvalue in coordinates.values()):
+            found = [
+                cname
+                for cname in ALPHA_DELTA_TO_COORDINATE
+                if cname in lower_names
+            ]
+            pairs = [
+                coordinate_system
+                for coordinate_system in CoordinateSystem
+                if ALPHA[coordinate_system] in found
+                and DELTA[coordinate_system] in found
+            ]
+            if len(pairs) > 1:
+                raise MixedCoordinateSystemError(
+                    f"{', '.join(found)}. "
+                    "Select the columns explicitly, e.g. ra='ra', dec='dec'"
+                )
+            coordinates.update({cname: column(cname) for cname in found})
+
+        return value, coordinates
+
+    def _table_column_names(self, data):
+        dtype_names = getattr(getattr(data, "dtype", None), "names", None)
+        if dtype_names is not None:  # numpy structured or record array
+            return tuple(dtype_names)
+        elif hasattr(data, "columns"):  # pandas.DataFrame
+            return tuple(data.columns)
+        elif isinstance(data, Mapping):
+            return tuple(data.keys())
+        raise TypeError(
+            "data must be a pandas.DataFrame, a numpy structured array "
+            "or a mapping of arrays"
+        )
+
+    def _calculate_row(self, row, **get_kwargs):
+        coordinates = dict.fromkeys(ALPHA_DELTA_TO_COORDINATE)
+        coordinates.update(row)
+        distance = coordinates.pop("distance", None)
+        velocity = coordinates.pop("velocity", None)
+
+        coordinate_system, alpha, delta = self._determine_coordinate_system(
+            **coordinates
+        )
+        return self._search(
+            coordinate_system=coordinate_system,
+            alpha=alpha,
+            delta=delta,
+            distance=distance,
+            velocity=velocity,
+            **get_kwargs,
+        )
+
+    def _make_result(
+        self,
+        coordinate_system,
+        parameter,
+        alpha,
+        delta,
+        distance,
+        velocity,
+        response,
+        quantized=None,
+        stale=False,
+    ):
+        result = Result(
+            calculator=self.CALCULATOR,
+            url=self.URL,
+            coordinate=coordinate_system,
+            calculated_by=parameter,
+            alpha=alpha,
+            delta=delta,
+            distance=distance,
+            velocity=velocity,
+            response_=response,
+            quantized_=quantized,
+            stale_=stale,
+        )
+        return result
+
+    def _quantize(self, parameter, alpha, delta, value):
+        # None if the client has no quantization
+        if self.quantization is None:
+            return None
+        maximum = (
+            self.MAX_DISTANCE
+            if parameter == Parameter.distance
+            else self.MAX_VELOCITY
+        )
+        return self.quantization.quantize(
+            parameter, alpha, delta, value, maximum=maximum
+        )
+
+    def _search(
+        self,
+        coordinate_system,
+        alpha,
+        delta,
+        distance,
+        velocity,
+        **get_kwargs,
+    ):
+
+        # The validations
+        parameter, value = self._validate(
+            coordinate_system, alpha, delta, distance, velocity
+        )
+
+        quantized = self._quantize(parameter, alpha, delta, value)
+        payload = self._build_payload(
+            coordinate_system,
+            parameter,
+            *((alpha, delta, value) if quantized is None else quantized),
+        )
+
+        # start the cache orchestration
+        key = self._cache_key(coordinate_system, payload)
+
+        (response,), stale = self._cache_get_many([key])
+        if _is_failure(response):
+            _raise_failure(response)
+        if response is None:
+            response = self._fetch_once(key, payload, **get_kwargs)
+        self._revalidate_many([key], [payload], stale, **get_kwargs)
+
+        return self._make_result(
+            coordinate_system,
+            parameter,
+            alpha,
+            delta,
+            distance,
+            velocity,
+            response,
+            quantized,
+            stale[0],
+        )
+
+    def _prepare_many(
+        self, coordinate_system, alpha, delta, parameter, value, errors
+    ):
+        if errors not in ("raise", "mask"):
+            raise ValueError("errors must be 'raise' or 'mask'")
+
+        # The validations are executed only once for all the batch
+        alpha, delta, value, row_errors = self._validate_many(
+            coordinate_system, alpha, delta, parameter, value
+        )
+        if errors == "raise":
+            self._raise_for_row_errors(
+                coordinate_system, parameter, row_errors
+            )
+
+        # the entire batch is snapped to the grid at once
+        quantized = self._quantize(parameter, alpha, delta, value)
+        point = (alpha, delta, value) if quantized is None else quantized
+
+        # only the valid rows are sent to the cache and the calculator, and
+        # the rows that produce the same cache key are calculated only once
+        rows = np.flatnonzero(row_errors == 0).tolist()
+        payloads, keys, inverse, uniques = [], [], [], {}
+        duplicated = np.zeros(len(value), dtype=bool)
+
+        # the canonical positions of the whole batch are rotated at once
+        sgl = sgb = None
+        if self.canonical_cache:
+            sgl, sgb = self._canonical_coordinates(
+                coordinate_system,
+                np.asarray(point[0], dtype=float),
+                np.asarray(point[1], dtype=float),
+            )
+
+        for idx in rows:
+            payload = self._build_payload(
+                coordinate_system,
+                parameter,
+                point[0][idx],
+                point[1][idx],
+                point[2][idx],
+            )
+            key = self._cache_key(
+                coordinate_system,
+                payload,
+                None if sgl is None else (sgl[idx], sgb[idx]),
+            )
+            pos = uniques.setdefault(key, len(keys))
+            if pos == len(keys):
+                payloads.append(payload)
+                keys.append(key)
+            else:
+                duplicated[idx] = True
+            inverse.append(pos)
+
+        return _Batch(
+            coordinate_system=coordinate_system,
+            parameter=parameter,
+            alpha=alpha,
+            delta=delta,
+            value=value,
+            errors=row_errors,
+            rows=rows,
+            inverse=inverse,
+            duplicated=duplicated,
+            quantized=quantized,
+            payloads=payloads,
+            keys=keys,
+        )
+
+    def _raise_for_failures(self, responses, errors):
+        # the failures of the negative cache are only masked on request
+        if errors == "raise":
+            for response in responses:
+                if _is_failure(response):
+                    _raise_failure(response)
+
+    def _make_result_set(self, batch, responses, stale):
+        # every unique response is decoded once and shared by its
+        # duplicates, and the failures of the calculator are masked
+        unique_jsons = [
+            None if _is_failure(response) else response.json()
+            for response in responses
+        ]
+        jsons = [None] * len(batch.value)
+        row_errors = batch.errors.copy()
+        for idx, pos in zip(batch.rows, batch.inverse):
+            jsons[idx] = unique_jsons[pos]
+            if jsons[idx] is None:
+                row_errors[idx] |= RowError.CALCULATOR_ERROR
+
+        stale_rows = np.zeros(len(batch.value), dtype=bool)
+        stale_rows[batch.rows] = np.asarray(stale, dtype=bool)[batch.inverse]
+
+        return ResultSet.from_json(
+            calculator=self.CALCULATOR,
+            url=self.URL,
+            coordinate=batch.coordinate_system,
+            calculated_by=batch.parameter,
+            alpha=batch.alpha,
+            delta=batch.delta,
+            value=batch.value,
+            jsons=jsons,
+            errors=row_errors,
+            duplicated=batch.duplicated,
+            quantized=batch.quantized,
+            stale=stale_rows,
+        )
+
+    def _search_many(
+        self,
+        coordinate_system,
+        alpha,
+        delta,
+        parameter,
+        value,
+        errors="raise",
+        workers=1,
+        **get_kwargs,
+    ):
+        if workers < 1:
+            raise ValueError("workers must be >= 1")
+
+        batch = self._prepare_many(
+            coordinate_system, alpha, delta, parameter, value, errors
+        )
+
+        # first all the cache lookups, and then only the misses go to
+        # the network
+        responses, stale = self._cache_get_many(batch.keys)
+        self._raise_for_failures(responses, errors)
+        self._revalidate_many(batch.keys, batch.payloads, stale, **get_kwargs)
+        misses = [pos for pos, resp in enumerate(responses) if resp is None]
+        fetched = self._fetch_many(
+            [batch.keys[pos] for pos in misses],
+            [batch.payloads[pos] for pos in misses],
+            workers,
+            failures=errors,
+            **get_kwargs,
+        )
+        for pos, response in zip(misses, fetched):
+            responses[pos] = response
+
+        return self._make_result_set(batch, responses, stale)
+
+    def _calculate_many(
+        self, parameter, value, coordinates, data, **search_kwargs
+    ):
+        if data is not None:
+            value, coordinates = self._extract_table_columns(
+                data, value, coordinates
+            )
+
+        coordinate_system, alpha, delta = self._determine_coordinate_system(
+            **coordinates
+        )
+        response = self._search_many(
+            coordinate_system=coordinate_system,
+            alpha=alpha,
+            delta=delta,
+            parameter=parameter,
+            value=value,
+            **search_kwargs,
+        )
+        return response
+
+    # =========================================================================
+    # INTERNALS
+    # =========================================================================
+
+    def __repr__(self):
+        """x.__repr__() <==> repr(x)."""
+        cls = type(self).__name__
+        calculator = f"calculator='{self.CALCULATOR}'"
+        cachedir = f"cache_dir='{getattr(self.cache, 'directory', '')}'"
+        expire = f"cache_expire={self.cache_expire}"
+        return f"{cls}({calculator}, {cachedir}, {expire})"
+
+    # =========================================================================
+    # API
+    # =========================================================================
+
+    def calculate_distance(
+        self,
+        velocity,
+        *,
+        ra=None,
+        dec=None,
+        glon=None,
+        glat=None,
+        sgl=None,
+        sgb=None,
+        **get_kwargs,
+    ):
+        """Calculate a distance based on the given velocity and location.
+
+        The mandatory parameters are ``velocity`` and a position
+        expressed in two components depending on the chosen coordinate system:
+
+         - ``ra`` and ``dec`` for an equatorial system.
+         - ``glon`` and ``glat`` for a galactic system.
+         - ``sgl`` and ``sgb`` for a supergalactic system.
+
+        Coordinates cannot be mixed between systems, and must be expressed in
+        J2000 as 360° decimal.
+
+        The returned distance(s) are expressed in Mpc, and potentially can
+        be more than one value.
+
+        Parameters
+        ----------
+        velocity : ``int`` or ``float``
+            Model velocity in km/s.
+        ra : ``int`` or ``float`` (optional)
+            Right ascension. If you provide ``ra`` you need to provide also
+            ``dec``.
+        dec : ``int`` or ``float`` (optional)
+            Declination. ``dec`` must be >= -90 and <= 90. If you provide
+            ``dec`` you need to provide also ``ra``.
+        glon : ``int`` or ``float`` (optional)
+            Galactic longitude. If you provide ``glon`` you need to provide
+            also ``glat``.
+        glat: ``int`` or ``float`` (optional)
+            Galactic latitude. ``glat`` must be >= -90 and <= 90. If you
+            provide ``glat`` you need to provide also ``glon``.
+        sgl : ``int`` or ``float`` (optional)
+            Super-galactic longitude. If you provide ``sgl`` you need to
+            provide also ``sgb``.
+        sgb: ``int`` or ``float`` (optional)
+            Super-galactic latitude. ``sgb`` must be >= -90 and <= 90.
+            If you  provide ``sgb`` you need to provide also ``sgl``.
+        get_kwargs:
+            Optional arguments that ``request.get`` takes.
+
+        Returns
+        -------
+        pycf3.Result :
+            Result object that automatically parses the entire model
+            returned by the remote calculator.
+
+        """
+        coordinate_system, alpha, delta = self._determine_coordinate_system(
+            ra=ra, dec=dec, glon=glon, glat=glat, sgl=sgl, sgb=sgb
+        )
+        response = self._search(
+            coordinate_system=coordinate_system,
+            alpha=alpha,
+            delta=delta,
+            distance=None,
+            velocity=velocity,
+            **get_kwargs,
+        )
+        return response
+
+    def calculate_velocity(
+        self,
+        distance,
+        *,
+        ra=None,
+        dec=None,
+        glon=None,
+        glat=None,
+        sgl=None,
+        sgb=None,
+        **get_kwargs,
+    ):
+        """Calculate a velocity based on the given distance and location.
+
+        The mandatory parameters are ``distance`` and a position
+        expressed in two components depending on the chosen coordinate system:
+
+         - ``ra`` and ``dec`` for an equatorial system.
+         - ``glon`` and ``glat`` for a galactic system.
+         - ``sgl`` and ``sgb`` for a supergalactic system.
+
+        Coordinates cannot be mixed between systems, and must be expressed in
+        J2000 as 360° decimal.
+
+        The returned velocity are expressed in Km/s.
+
+        Parameters
+        ----------
+        distance : ``int`` or ``float``
+            Distance(s) in Mpc.
+        ra : ``int`` or ``float`` (optional)
+            Right ascension. If you provide ``ra`` you need to provide also
+            ``dec``.
+        dec : ``int`` or ``float`` (optional)
+            Declination. ``dec`` must be >= -90 and <= 90. If you provide
+            ``dec`` you need to provide also ``ra``.
+        glon : ``int`` or ``float`` (optional)
+            Galactic longitude. If you provide ``glon`` you need to provide
+            also ``glat``.
+        glat: ``int`` or ``float`` (optional)
+            Galactic latitude. ``glat`` must be >= -90 and <= 90. If you
+            provide ``glat`` you need to provide also ``glon``.
+        sgl : ``int`` or ``float`` (optional)
+            Super-galactic longitude. If you provide ``sgl`` you need to
+            provide also ``sgb``.
+        sgb: ``int`` or ``float`` (optional)
+            Super-galactic latitude. ``sgb`` must be >= -90 and <= 90.
+            If you  provide ``sgb`` you need to provide also ``sgl``.
+        get_kwargs:
+            Optional arguments that ``request.get`` takes.
+
+        Returns
+        -------
+        pycf3.Result :
+            Result object that automatically parses the entire model
+            returned by the remote calculator.
+
+        """
+        coordinate_system, alpha, delta = self._determine_coordinate_system(
+            ra=ra, dec=dec, glon=glon, glat=glat, sgl=sgl, sgb=sgb
+        )
+        response = self._search(
+            coordinate_system=coordinate_system,
+            alpha=alpha,
+            delta=delta,
+            distance=distance,
+            velocity=None,
+            **get_kwargs,
+        )
+        return response
+
+    def calculate_distance_many(
+        self,
+        velocity,
+        *,
+        ra=None,
+        dec=None,
+        glon=None,
+        glat=None,
+        sgl=None,
+        sgb=None,
+        data=None,
+        errors="raise",
+        workers=1,
+        **get_kwargs,
+    ):
+        """Calculate many distances based on velocities and locations.
+
+        This is the batch version of ``calculate_distance``: all the
+        parameters may be arrays (or any sequence) of the same length, or
+        scalars that are broadcasted to the length of the other columns.
+        The inputs are validated only once, the cache is inspected for all
+        the rows, and only the misses are sent to the remote calculator.
+
+        Coordinates cannot be mixed between systems, and must be expressed in
+        J2000 as 360° decimal.
+
+        Parameters
+        ----------
+        velocity : array-like of ``int`` or ``float``, or ``str``
+            Model velocities in km/s, or the name of the column in ``data``.
+        ra : array-like of ``int`` or ``float`` (optional)
+            Right ascensions. If you provide ``ra`` you need to provide also
+            ``dec``.
+        dec : array-like of ``int`` or ``float`` (optional)
+            Declinations. ``dec`` must be >= -90 and <= 90. If you provide
+            ``dec`` you need to provide also ``ra``.
+        glon : array-like of ``int`` or ``float`` (optional)
+            Galactic longitudes. If you provide ``glon`` you need to provide
+            also ``glat``.
+        glat: array-like of ``int`` or ``float`` (optional)
+            Galactic latitudes. ``glat`` must be >= -90 and <= 90. If you
+            provide ``glat`` you need to provide also ``glon``.
+        sgl : array-like of ``int`` or ``float`` (optional)
+            Super-galactic longitudes. If you provide ``sgl`` you need to
+            provide also ``sgb``.
+        sgb: array-like of ``int`` or ``float`` (optional)
+            Super-galactic latitudes. ``sgb`` must be >= -90 and <= 90.
+            If you  provide ``sgb`` you need to provide also ``sgl``.
+        data : table or ``None`` (default: ``None``)
+            A ``pandas.DataFrame``, a numpy structured (or record) array or
+            a mapping of arrays. If it's provided, any parameter given as a
+            ``str`` is the name of a column of ``data``, and if no
+            coordinate is given the coordinate system is detected from
+            the column names (``ra``/``dec``, ``glon``/``glat`` or
+            ``sgl``/``sgb``). The columns are used without copying them
+            when their type is already ``float``.
+        errors : ``"raise"`` or ``"mask"`` (default: ``"raise"``)
+            How to handle the invalid rows. ``"raise"`` raises a
+            ``ValueError`` if any row is invalid; ``"mask"`` skips the
+            invalid rows and reports them in the ``errors_`` column of the
+            result set. With ``"mask"`` the rows that the calculator fails
+            to calculate (now or in the negative cache) are also reported
+            with ``RowError.CALCULATOR_ERROR`` instead of raising.
+        workers : ``int`` (default: ``1``)
+            Number of threads used to send the cache misses to the remote
+            calculator. If the session is a ``pycf3.RetrySession`` its
+            connection pool is resized to the number of workers.
+        get_kwargs:
+            Optional arguments that ``request.get`` takes.
+
+        Returns
+        -------
+        pycf3.ResultSet :
+            All the results of the batch in the same order of the input.
+
+        """
+        coordinates = dict(
+            ra=ra, dec=dec, glon=glon, glat=glat, sgl=sgl, sgb=sgb
+        )
+        return self._calculate_many(
+            Parameter.velocity,
+            velocity,
+            coordinates,
+            data,
+            errors=errors,
+            workers=workers,
+            **get_kwargs,
+        )
+
+    def calculate_velocity_many(
+        self,
+        distance,
+        *,
+        ra=None,
+        dec=None,
+        glon=None,
+        glat=None,
+        sgl=None,
+        sgb=None,
+        data=None,
+        errors="raise",
+        workers=1,
+        **get_kwargs,
+    ):
+        """Calculate many velocities based on distances and locations.
+
+        This is the batch version of ``calculate_velocity``: all the
+        parameters may be arrays (or any sequence) of the same length, or
+        scalars that are broadcasted to the length of the other columns.
+        The inputs are validated only once, the cache is inspected for all
+        the rows, and only the misses are sent to the remote calculator.
+
+        Coordinates cannot be mixed between systems, and must be expressed in
+        J2000 as 360° decimal.
+
+        Parameters
+        ----------
+        distance : array-like of ``int`` or ``float``, or ``str``
+            Distances in Mpc, or the name of the column in ``data``.
+        ra : array-like of ``int`` or ``float`` (optional)
+            Right ascensions. If you provide ``ra`` you need to provide also
+            ``dec``.
+        dec : array-like of ``int`` or ``float`` (optional)
+            Declinations. ``dec`` must be >= -90 and <= 90. If you provide
+            ``dec`` you need to provide also ``ra``.
+        glon : array-like of ``int`` or ``float`` (optional)
+            Galactic longitudes. If you provide ``glon`` you need to provide
+            also ``glat``.
+        glat: array-like of ``int`` or ``float`` (optional)
+            Galactic latitudes. ``glat`` must be >= -90 and <= 90. If you
+            provide ``glat`` you need to provide also ``glon``.
+        sgl : array-like of ``int`` or ``float`` (optional)
+            Super-galactic longitudes. If you provide ``sgl`` you need to
+            provide also ``sgb``.
+        sgb: array-like of ``int`` or ``float`` (optional)
+            Super-galactic latitudes. ``sgb`` must be >= -90 and <= 90.
+            If you  provide ``sgb`` you need to provide also ``sgl``.
+        data : table or ``None`` (default: ``None``)
+            A ``pandas.DataFrame``, a numpy structured (or record) array or
+            a mapping of arrays. If it's provided, any parameter given as a
+            ``str`` is the name of a column of ``data``, and if no
+            coordinate is given the coordinate system is detected from
+            the column names (``ra``/``dec``, ``glon``/``glat`` or
+            ``sgl``/``sgb``). The columns are used without copying them
+            when their type is already ``float``.
+        errors : ``"raise"`` or ``"mask"`` (default: ``"raise"``)
+            How to handle the invalid rows. ``"raise"`` raises a
+            ``ValueError`` if any row is invalid; ``"mask"`` skips the
+            invalid rows and reports them in the ``errors_`` column of the
+            result set. With ``"mask"`` the rows that the calculator fails
+            to calculate (now or in the negative cache) are also reported
+            with ``RowError.CALCULATOR_ERROR`` instead of raising.
+        workers : ``int`` (default: ``1``)
+            Number of threads used to send the cache misses to the remote
+            calculator. If the session is a ``pycf3.RetrySession`` its
+            connection pool is resized to the number of workers.
+        get_kwargs:
+            Optional arguments that ``request.get`` takes.
+
+        Returns
+        -------
+        pycf3.ResultSet :
+            All the results of the batch in the same order of the input.
+
+        """
+        coordinates = dict(
+            ra=ra, dec=dec, glon=glon, glat=glat, sgl=sgl, sgb=sgb
+        )
+        return self._calculate_many(
+            Parameter.distance,
+            distance,
+            coordinates,
+            data,
+            errors=errors,
+            workers=workers,
+            **get_kwargs,
+        )
+
+    def iter_calculate(
+        self, rows, *, ordered=True, workers=1, window=None, **get_kwargs
+    ):
+        """Lazily calculate every row of an iterable.
+
+        Every row is a mapping with the ``distance`` or the ``velocity`` and
+        the coordinates in one of the supported systems (for example
+        ``{"distance": 10, "ra": 187.78917, "dec": 13.33386}``). The rows
+        are consumed on demand, so ``rows`` can be a generator over a file
+        bigger than the memory, and only a bounded window of rows is in
+        flight at any time.
+
+        Parameters
+        ----------
+        rows : iterable of mappings
+            The queries to calculate.
+        ordered : ``bool`` (default: ``True``)
+            If it's ``True`` the results are yielded in the order of the
+            rows; otherwise they are yielded as soon as they are completed,
+            which gives more throughput when ``workers > 1``.
+        workers : ``int`` (default: ``1``)
+            Number of threads used to calculate the rows. If the session is
+            a ``pycf3.RetrySession`` its connection pool is resized to the
+            number of workers.
+        window : ``int`` or ``None`` (default: ``None``)
+            Maximum number of rows in flight. By default is two times the
+            number of workers.
+        get_kwargs:
+            Optional arguments that ``request.get`` takes.
+
+        Yields
+        ------
+        pycf3.Result :
+            The result of every row.
+
+        """
+        if workers < 1:
+            raise ValueError("workers must be >= 1")
+        window = 2 * workers if window is None else window
+        if window < 1:
+            raise ValueError("window must be >= 1")
+
+        def calculate(row):
+            return self._calculate_row(row, **get_kwargs)
+
+        if workers == 1:
+            yield from map(calculate, rows)
+            return
+
+        self._prepare_pool(workers)
+
+        pending = deque() if ordered else set()
+        executor = ThreadPoolExecutor(max_workers=workers)
+        try:
+            for row in rows:
+                future = executor.submit(calculate, row)
+                if ordered:
+                    pending.append(future)
+                else:
+                    pending.add(future)
+
+                while len(pending) >= window:
+                    if ordered:
+                        yield pending.popleft().result()
+                    else:
+                        done, pending = futures_wait(
+                            pending, return_when=FIRST_COMPLETED
+                        )
+                        yield from (future.result() for future in done)
+
+            if ordered:
+                while pending:
+                    yield pending.popleft().result()
+            else:
+                yield from (f.result() for f in as_completed(pending))
+                pending.clear()
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+    def stats(self, reset=False):
+        """Usage statistics of the cache, by calculator and coordinate system.
+
+        The statistics are grouped with the same ``"CALCULATOR@system"`` tags
+        of the cache entries. The ``hits`` include the memory, stale and
+        nearest hits, the ``negative_hits`` are the failures raised from the
+        negative cache and the ``misses`` are the lookups that went to the
+        network. The times are the cumulative seconds spent on the cache
+        lookups, the network calls and the cache writes.
+
+        Parameters
+        ----------
+        reset : ``bool`` (default: ``False``)
+            If it's ``True`` all the counters are set to zero after the read.
+
+        Returns
+        -------
+        dict :
+            A ``pycf3.CacheStats`` for every tag used by the client.
+
+        """
+        return self._stats.snapshot(reset=reset)
+
+    def migrate_legacy_cache(self):
+        """Move the entries stored by the old pycf3 versions to binary keys.
+
+        The old versions stored the pickled responses with tuple keys, and
+        the lookups don't check them. This one-time pass rewrites the
+        entries of the calculator (and URL) as compact records with binary
+        keys, keeping their expiration, and removes the old entries. Only
+        the ``diskcache`` caches can have legacy entries: the local cache of
+        a ``pycf3.TwoLevelCache`` is migrated into both levels, and the
+        other backends have nothing to migrate.
+
+        Returns
+        -------
+        int :
+            Number of migrated entries.
+
+        """
+        # the legacy entries are read from the diskcache of the cache
+        source = self.cache
+        while isinstance(source, TwoLevelCache):
+            source = source.local
+        if isinstance(source, CacheBackend):
+            return 0
+
+        migrated = 0
+        with self.cache as cache:
+            # only the keys of the cache itself are sent back to the cache
+            legacy_keys = [key for key in source if isinstance(key, tuple)]
+            for legacy_key in legacy_keys:
+                parsed = _parse_legacy_key(legacy_key)
+                if parsed is None or parsed[:2] != (self.CALCULATOR, self.URL):
+                    continue
+
+                record, expire_time = source.get(
+                    legacy_key, default=None, expire_time=True, retry=True
+                )
+                response, stored_at = _unpack_response(record, self.URL)
+                expire = (
+                    None if expire_time is None else expire_time - time.time()
+                )
+                if response is not None and (expire is None or expire > 0):
+                    payload = parsed[2]
+                    key = self._cache_key(
+                        CoordinateSystem(payload["system"]), payload
+                    )
+                    cache.set(
+                        key,
+                        _pack_response(response, stored_at=stored_at),
+                        expire=expire,
+                        tag=self._cache_tag(key),
+                        retry=True,
+                    )
+                    migrated += 1
+                source.delete(legacy_key, retry=True)
+        return migrated
+
+    def evict(self, coordinate_system=None):
+        """Remove the cached results of the calculator.
+
+        The entries are removed by their ``"CALCULATOR@system"`` tag (from
+        all the URLs of the calculator), including the entries of the old
+        pycf3 versions and the negative ones. The memory tier (if any) is
+        cleared.
+
+        Parameters
+        ----------
+        coordinate_system : ``pycf3.CoordinateSystem``, ``str`` or ``None``
+            (default: ``None``)
+            Only remove the results of this coordinate system. ``None``
+            removes the results of all the coordinate systems. With a
+            ``canonical_cache`` all the results are stored as
+            ``"supergalactic"``.
+
+        Returns
+        -------
+        int :
+            Number of entries removed from the cache.
+
+        """
+        tags = self._cache_tags(coordinate_system)
+        with self.cache as cache:
+            removed = sum(cache.evict(tag, retry=True) for tag in tags)
+        if self.memory_cache is not None:
+            self.memory_cache.clear()
+        self._spatial_index.pop("index", None)
+        return removed
+
+    def cache_usage(self, coordinate_system=None):
+        """Report the entries and bytes of the calculator in the cache.
+
+        All the entries of the cache are read, so it takes time on big
+        caches. Only the stored records are accounted (not the overhead of
+        the cache).
+
+        Parameters
+        ----------
+        coordinate_system : ``pycf3.CoordinateSystem``, ``str`` or ``None``
+            (default: ``None``)
+            Only report the results of this coordinate system. ``None``
+            reports all the coordinate systems.
+
+        Returns
+        -------
+        dict :
+            A ``pycf3.CacheUsage`` for every ``"CALCULATOR@system"`` tag
+            with entries in the cache.
+
+        """
+        tags = set(self._cache_tags(coordinate_system))
+        usage = {}
+        with self.cache as cache:
+            for key in cache:
+                tag = self._stored_tag(key)
+                if tag not in tags:
+                    continue
+                record = cache.get(key, default=None, retry=True)
+                if record is None:
+                    continue
+                if isinstance(record, requests.Response):
+                    nbytes = len(record.content)
+                else:
+                    nbytes = len(record)
+                entries, total = usage.get(tag, (0, 0))
+                usage[tag] = CacheUsage(entries + 1, total + nbytes)
+        return usage
+
+    def build_index(self):
+        """Build the spatial index of all the entries of the cache.
+
+        The index is stored in the cache directory (if the cache has one)
+        and used to answer the cache misses when the client has a
+        ``nearest_match``. The entries stored after the build are not
+        indexed until the next call.
+
+        Returns
+        -------
+        pycf3.SpatialIndex :
+            The new index.
+
+        """
+        with self.cache as cache:
+            index = self._build_spatial_index(cache)
+        self._spatial_index["index"] = index
+        return index
+
+    def warm(
+        self,
+        *,
+        distance=None,
+        velocity=None,
+        ra=None,
+        dec=None,
+        glon=None,
+        glat=None,
+        sgl=None,
+        sgb=None,
+        workers=1,
+        chunksize=1000,
+        checkpoint=None,
+        **get_kwargs,
+    ):
+        """Pre-populate the cache with every position crossed with a grid.
+
+        All the combinations of the given positions (for example created
+        with ``pycf3.sky_tiling()``) and every value of the grid of
+        distances or velocities are calculated, in chunks of ``chunksize``
+        rows, skipping the ones already stored in the cache. The invalid
+        combinations are ignored.
+
+        Parameters
+        ----------
+        distance : array-like or ``None`` (default: ``None``)
+            The grid of distances (to warm the velocities).
+        velocity : array-like or ``None`` (default: ``None``)
+            The grid of velocities (to warm the distances).
+        ra, dec, glon, glat, sgl, sgb : array-like or ``None``
+            The positions in only one coordinate system.
+        workers : ``int`` (default: ``1``)
+            Maximum number of requests in flight.
+        chunksize : ``int`` (default: ``1000``)
+            Number of combinations of every chunk.
+        checkpoint : ``str`` or ``None`` (default: ``None``)
+            Path of a JSON file where the number of finished chunks is
+            stored after every chunk. If the file exists, the run resumes
+            after the last finished chunk.
+        get_kwargs :
+            Optional arguments that ``request`` takes.
+
+        Returns
+        -------
+        pycf3.WarmReport :
+            Number of combinations in total, skipped by the checkpoint,
+            invalid, already cached, fetched and failed. The combinations
+            that the calculator fails to calculate are counted as failed
+            and don't abort the run.
+
+        """
+        if workers < 1:
+            raise ValueError("workers must be >= 1")
+
+        # the failures of the calculator are counted and skipped
+        report = dict.fromkeys(WarmReport._fields, 0)
+        for keys, payloads in self._warm_chunks(
+            report,
+            distance=distance,
+            velocity=velocity,
+            ra=ra,
+            dec=dec,
+            glon=glon,
+            glat=glat,
+            sgl=sgl,
+            sgb=sgb,
+            chunksize=chunksize,
+            checkpoint=checkpoint,
+        ):
+            for response in self._fetch_many(
+                keys, payloads, workers, failures="mask", **get_kwargs
+            ):
+                report["failed" if _is_failure(response) else "fetched"] += 1
+
+        return WarmReport(**report)
+
+    def _warm_chunks(
+        self,
+        report,
+        *,
+        distance,
+        velocity,
+        ra,
+        dec,
+        glon,
+        glat,
+        sgl,
+        sgb,
+        chunksize,
+        checkpoint,
+    ):
+        # yields the keys and payloads missing in the cache of every chunk
+        # of the warm up, updating the counters of the report
+        if (distance is None) == (velocity is None):
+            raise ValueError("You must provide the 'distance' or 'velocity'")
+        if chunksize < 1:
+            raise ValueError("chunksize must be >= 1")
+
+        parameter, grid = (
+            (Parameter.distance, distance)
+            if velocity is None
+            else (Parameter.velocity, velocity)
+        )
+        grid = np.asarray(grid, dtype=float).ravel()
+        coordinate_system, alpha, delta = self._determine_coordinate_system(
+            ra=ra, dec=dec, glon=glon, glat=glat, sgl=sgl, sgb=sgb
+        )
+        alpha, delta = np.broadcast_arrays(
+            *np.atleast_1d(
+                np.asarray(alpha, dtype=float), np.asarray(delta, dtype=float)
+            )
+        )
+
+        # the checkpoint only can resume exactly the same run
+        fingerprint = hashlib.sha1(
+            b"".join(
+                [
+                    f"{self.CALCULATOR}@{self.URL}".encode("utf-8"),
+                    f"{coordinate_system.value}:{parameter.value}".encode(),
+                    f"{chunksize}".encode(),
+                    alpha.tobytes(),
+                    delta.tobytes(),
+                    grid.tobytes(),
+                ]
+            )
+        ).hexdigest()
+        done = 0
+        if checkpoint is not None and os.path.exists(checkpoint):
+            with open(checkpoint) as fp:
+                state = json.load(fp)
+            if state["fingerprint"] != fingerprint:
+                raise ValueError(
+                    f"The checkpoint {checkpoint!r} belongs to another run"
+                )
+            done = state["done"]
+
+        total = len(alpha) * len(grid)
+        report["total"] = total
+        report["resumed"] = min(done * chunksize, total)
+        for chunk, start in enumerate(range(0, total, chunksize)):
+            if chunk < done:
+                continue
+
+            # the rows are the positions crossed with the grid
+            rows = np.arange(start, min(start + chunksize, total))
+            batch = self._prepare_many(
+                coordinate_system,
+                alpha[rows // len(grid)],
+                delta[rows // len(grid)],
+                parameter,
+                grid[rows % len(grid)],
+                errors="mask",
+            )
+            with self.cache as cache:
+                misses = [
+                    pos
+                    for pos, key in enumerate(batch.keys)
+                    if key not in cache
+                ]
+            report["invalid"] += len(rows) - len(batch.rows)
+            report["cached"] += len(batch.rows) - len(misses)
+            yield (
+                [batch.keys[pos] for pos in misses],
+                [batch.payloads[pos] for pos in misses],
+            )
+
+            # the consumer asks for the next chunk after fetching this one
+            if checkpoint is not None:
+                state = {"fingerprint": fingerprint, "done": chunk + 1}
+                with open(f"{checkpoint}.tmp", "w") as fp:
+                    json.dump(state, fp)
+                os.replace(f"{checkpoint}.tmp", checkpoint)
+
+    def validate_many(
+        self,
+        *,
+        distance=None,
+        velocity=None,
+        ra=None,
+        dec=None,
+        glon=None,
+        glat=None,
+        sgl=None,
+        sgb=None,
+    ):
+        """Validate a batch of queries without calling the calculator.
+
+        All the rows are checked with vectorized operations, and every
+        problem found is reported as a ``pycf3.RowError`` flag instead of
+        raising an exception.
+
+        Parameters
+        ----------
+        distance : array-like of ``int`` or ``float`` (optional)
+            Distances in Mpc. You must provide ``distance`` or ``velocity``.
+        velocity : array-like of ``int`` or ``float`` (optional)
+            Velocities in km/s. You must provide ``distance`` or
+            ``velocity``.
+        ra, dec, glon, glat, sgl, sgb : array-like (optional)
+            The coordinates, with the same rules of
+            ``calculate_velocity_many`` and ``calculate_distance_many``.
+
+        Returns
+        -------
+        valid : ``numpy.ndarray``
+            Boolean mask with ``True`` in every valid row.
+        errors : ``numpy.ndarray``
+            ``pycf3.RowError`` flags of every row as ``uint8``.
+
+        """
+        if (distance is None) == (velocity is None):
+            raise ValueError(
+                "You must provide the distance or the velocity value"
+            )
+        parameter, value = (
+            (Parameter.distance, distance)
+            if velocity is None
+            else (Parameter.velocity, velocity)
+        )
+
+        coordinate_system, alpha, delta = self._determine_coordinate_system(
+            ra=ra, dec=dec, glon=glon, glat=glat, sgl=sgl, sgb=sgb
+        )
+        *_, errors = self._validate_many(
+            coordinate_system, alpha, delta, parameter, value
+        )
+        return errors == 0, errors
+
+    # =========================================================================
+    # OLD API
+    # =========================================================================
+
+    @deprecated(
+        category=CFDeprecationWarning,
+        action="once",
+        reason="Use `calculate_velocity` or `calculate_distance` instead",
+        version="2020.12",
+    )
+    def equatorial_search(
+        self,
+        ra=187.78917,
+        dec=13.33386,
+        distance=None,
+        velocity=None,
+        **get_kwargs,
+    ):
+        """Search by equatorial coordinates.
+
+        The coordinates are expressed in J2000 as 360° decimal.
+
+        .. deprecated:: 2020.12
+            "Use `calculate_velocity` or `calculate_distance` instead"
+
+        Parameters
+        ----------
+        ra : ``int`` or ``float`` (default: ``187.78917``)
+            Right ascension.
+        dec : ``int`` or ``float`` (default: ``13.33386``)
+            Declination. dec must be >= -90 and <= 90
+        distance : ``int``, ``float`` or ``None`` (default: ``None``)
+            Distance(s) in Mpc.
+        velocity : ``int``, ``float`` or ``None`` (default: ``None``)
+            Velocity in km/s. The returned distance potentially can be more
+            than ine value.
+        get_kwargs:
+            Optional arguments that ``request.get`` takes.
+
+        Returns
+        -------
+        pycf3.Result :
+            Result object that automatically parses the entire model
+            returned by the remote calculator.
+
+        """
+        response = self._search(
+            CoordinateSystem.equatorial,
+            alpha=ra,
+            delta=dec,
+            distance=distance,
+            velocity=velocity,
+            **get_kwargs,
+        )
+        return response
+
+    @deprecated(
+        category=CFDeprecationWarning,
+        action="once",
+        reason="Use `calculate_velocity` or `calculate_distance` instead",
+        version="2020.12",
+    )
+    def galactic_search(
+        self,
+        glon=282.96547,
+        glat=75.41360,
+        distance=None,
+        velocity=None,
+        **get_kwargs,
+    ):
+        """Search by galactic coordinates.
+
+        The coordinates are expressed in J2000 as 360° decimal.
+
+        .. deprecated:: 2020.12
+            "Use `calculate_velocity` or `calculate_distance` instead"
+
+        Parameters
+        ----------
+        glon : ``int`` or ``float`` (default: ``282.96547``)
+            Galactic longitude.
+        glat: ``int`` or ``float`` (default: ``75.41360``)
+            Galactic latitude. dec must be >= -90 and <= 90
+        distance : ``int``, ``float`` or ``None`` (default: ``None``)
+            Distance(s) in Mpc.
+        velocity : ``int``, ``float`` or ``None`` (default: ``None``)
+            Velocity in km/s. The returned distance potentially can be more
+            than ine value.
+        get_kwargs:
+            Optional arguments that ``request.get`` takes.
+
+        Returns
+        -------
+        pycf3.Result :
+            Result object that automatically parses the entire model
+            returned by the remote calculator.
 
         """
-        return self.calculated_at_
+        response = self._search(
+            CoordinateSystem.galactic,
+            alpha=glon,
+            delta=glat,
+            distance=distance,
+            velocity=velocity,
+            **get_kwargs,
+        )
+        return response
+
+    @deprecated(
+        category=CFDeprecationWarning,
+        action="once",
+        reason="Use `calculate_velocity` or `calculate_distance` instead",
+        version="2020.12",
+    )
+    def supergalactic_search(
+        self,
+        sgl=102.0,
+        sgb=-2.0,
+        distance=None,
+        velocity=None,
+        **get_kwargs,
+    ):
+        """Search super-galactic coordinates.
+
+        The coordinates are expressed in J2000 as 360° decimal.
+
+        .. deprecated:: 2020.12
+            "Use `calculate_velocity` or `calculate_distance` instead"
+
+        Parameters
+        ----------
+        sgl : ``int`` or ``float`` (default: ``102``)
+            Super-galactic longitude.
+        sgb: ``int`` or ``float`` (default: ``-2``)
+            Super-galactic latitude. dec must be >= -90 and <= 90
+        distance : ``int``, ``float`` or ``None`` (default: ``None``)
+            Distance(s) in Mpc.
+        velocity : ``int``, ``float`` or ``None`` (default: ``None``)
+            Velocity in km/s. The returned distance potentially can be more
+            than ine value.
+        get_kwargs:
+            Optional arguments that ``request.get`` takes.
+
+        Returns
+        -------
+        pycf3.Result :
+            Result object that automatically parses the entire model
+            returned by the remote calculator.
+
+        """
+        response = self._search(
+            CoordinateSystem.supergalactic,
+            alpha=sgl,
+            delta=sgb,
+            distance=distance,
+            velocity=velocity,
+            **get_kwargs,
+        )
+        return response
 
 
 # =============================================================================
-# ABSTRACT CLIENT
+# NAM CLIENT
 # =============================================================================
 
 
-@attr.s(eq=False, order=False, frozen=True, repr=False)
-class AbstractClient(metaclass=DocInheritMeta(style="numpy")):
-    """Abstract base class for all clients.
+class NAM(AbstractClient):
+    """Client for the *NAM Distance-Velocity Calculator* [1]_.
 
-    Parameters
+    Compute expectation distances or velocities based on smoothed velocity
+    field from the Numerical Action Methods model of Shaya et al. 2017. [2]_.
+
+    More information: http://edd.ifa.hawaii.edu/NAMcalculator.
+
+    References
     ----------
-    session : ``pycf3.Session`` (default: ``None``)
-        The session to use to send the requests. By default a
-        ``pyc3.RetrySession`` with 3 retry is created. More info:
-        https://2.python-requests.org,
-        https://urllib3.readthedocs.io/en/latest/reference/urllib3.util.html.
-    cache : ``diskcache.Cache``, ``diskcache.Fanout``,
-            ``pycf3.NoCache`` or ``None`` (default: ``None``)
-        Any instance of ``diskcache.Cache``, ``diskcache.Fanout`` or
-        ``None`` (Default). If it's ``None`` a ``diskcache.Cache`` istance
-        is created with the parameter ``directory = pycf3.DEFAULT_CACHE_DIR``.
-        More information: http://www.grantjenks.com/docs/diskcache
-    cache_expire : ``float`` or None (default=``None``)
-        Seconds until item expires (default ``None``, no expiry)
-        More information: http://www.grantjenks.com/docs/diskcache
+    .. [1] Kourkchi, E., Courtois, H. M., Graziani, R., Hoffman, Y.,
+       Pomarede, D., Shaya, E. J., & Tully, R. B. (2020).
+       Cosmicflows-3: Two Distance-Velocity Calculators.
+       The Astronomical Journal, 159(2), 67.
+
+    .. [2] Shaya, E. J., Tully, R. B., Hoffman, Y., & Pomarède, D. (2017).
+       Action dynamics of the local supercluster.
+       The Astrophysical Journal, 850(2), 207.
 
     """
 
-    session: requests.Session = attr.ib(factory=RetrySession, repr=False)
-    cache: t.Union[dcache.Cache, dcache.FanoutCache] = attr.ib()
-    cache_expire: float = attr.ib(default=None, repr=False)
+    CALCULATOR = "NAM"
+    URL = "http://edd.ifa.hawaii.edu/NAMcalculator/api.php"
 
-    @cache.default
-    def _cache_default(self):
-        return dcache.Cache(directory=DEFAULT_CACHE_DIR)
+    #: Maximum distance to adjust the velocity.
+    MAX_DISTANCE = 38
 
-    def _determine_coordinate_system(self, ra, dec, glon, glat, sgl, sgb):
+    #: Maximum velocity to adjust the distance.
+    MAX_VELOCITY = 2400
 
-        # first we put all the parameters in a single dictionary
-        params = {
-            "ra": ra,
-            "dec": dec,
-            "glon": glon,
-            "glat": glat,
-            "sgl": sgl,
-            "sgb": sgb,
-        }
 
-        # next we remove all keys with the default value `None`
-        params = {k: v for k, v in params.items() if v is not None}
+# =============================================================================
+# CF3 CLIENT
+# =============================================================================
 
-        # if we have 0 values no coordinate was given
-        if len(params) == 0:
-            raise ValueError(
-                "No coordinate was provided. "
-                "Please provide (ra, dec)', '(glon, glat)' or '(sgl, sgb)'."
-            )
 
-        # if we only have one we need to check wich one and inform about
-        # the mising companinon
-        if len(params) == 1:
-            pname = list(params.keys())[0]
-            coordinate_system, companion_dict = (
-                (ALPHA_TO_COORDINATE[pname], DELTA)
-                if pname in ALPHA_TO_COORDINATE
-                else (DELTA_TO_COORDINATE[pname], ALPHA)
-            )
-            companion = companion_dict[coordinate_system]
-            raise ValueError(f"No {companion} provided")
+class CF3(AbstractClient):
+    """Client for the *Cosmicflows-3 Distance-Velocity Calculator* [3]_.
 
-        # if we have more than two parameter we have mixed coordinate system
-        if len(params) > 2:
-            raise MixedCoordinateSystemError(", ".join(params))
+    It computes expectation distances or velocities based on smoothed
+    velocity field from the Wiener filter model of Graziani et al. 2019 [4]_.
 
-        # now we need to detemine the coordinate system
-        coordinate_system_candidates = {
-            ALPHA_DELTA_TO_COORDINATE[p] for p in params.keys()
-        }
+    More information: http://edd.ifa.hawaii.edu/CF3calculator/ .
 
-        # if we have more than 1 candidate we mix coordinates again
-        if len(coordinate_system_candidates) > 1:
-            raise MixedCoordinateSystemError(", ".join(params))
+    References
+    ----------
+    .. [3] Kourkchi, E., Courtois, H. M., Graziani, R., Hoffman, Y.,
+       Pomarede, D., Shaya, E. J., & Tully, R. B. (2020).
+       Cosmicflows-3: Two Distance-Velocity Calculators.
+       The Astronomical Journal, 159(2), 67.
+
+    .. [4] Graziani, R., Courtois, H. M., Lavaux, G., Hoffman, Y.,
+       Tully, R. B., Copin, Y., & Pomarède, D. (2019).
+       The peculiar velocity field up to z∼ 0.05 by forward-modelling
+       Cosmicflows-3 data. Monthly Notices of the Royal Astronomical Society,
+       488(4), 5438-5451.
+
+    """
+
+    CALCULATOR = "CF3"
+    URL = "http://edd.ifa.hawaii.edu/CF3calculator/api.php"
+
+    #: Maximum distance to adjust the velocity.
+    MAX_DISTANCE = 200
+
+    #: Maximum velocity to adjust the distance.
+    MAX_VELOCITY = 15_000
+
+
+# =============================================================================
+# ASYNC CLIENTS
+# =============================================================================
+
+
+@attr.s(eq=False, order=False, frozen=True, repr=False)
+class AsyncAbstractClient(AbstractClient):
+    """Abstract base class for all the asyncio clients.
+
+    The validations, the coordinate system detection and the cache keys are
+    the same of the synchronous clients, but the requests are sent with a
+    non-blocking HTTP transport (``httpx``). All the calculation methods are
+    coroutines.
+
+    Parameters
+    ----------
+    session : ``httpx.AsyncClient`` (default: ``None``)
+        The asynchronous session to use to send the requests. By default a
+        new ``httpx.AsyncClient`` is created. More info:
+        https://www.python-httpx.org/async/
+    max_concurrency : ``int`` (default: ``16``)
+        Maximum number of requests in flight at the same time for this
+        client.
+    expire_policy : ``pycf3.ExpirePolicy`` (default: ``pycf3.LazyExpire``)
+        When the expired entries of ``cache`` are removed. The cache is
+        read and written in the default executor of the event loop, so it
+        never blocks the loop, but an expiration of every lookup would
+        still occupy the executor.
+
+    """
+
+    max_concurrency: int = attr.ib(default=16, repr=False, kw_only=True)
+    expire_policy: ExpirePolicy = attr.ib(
+        factory=LazyExpire, repr=False, kw_only=True
+    )
+
+    _semaphores = attr.ib(
+        factory=weakref.WeakKeyDictionary, init=False, repr=False
+    )
+    _refreshing = attr.ib(factory=dict, init=False, repr=False)
+
+    def _make_session(self):
+        import httpx  # noqa
+
+        return httpx.AsyncClient()
+
+    # =========================================================================
+    # INTERNALS
+    # =========================================================================
+
+    async def _offload(self, func, *args):
+        # the blocking cache I/O runs in the default executor of the loop
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, func, *args)
+
+    def _get_semaphore(self):
+        # one semaphore for every event loop that uses the client
+        loop = asyncio.get_event_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphores[loop] = semaphore
+        return semaphore
+
+    async def _fetch(self, payload, **get_kwargs):
+        async with self._get_semaphore():
+            aresponse = await self.session.request(
+                "GET", self.URL, json=payload, **get_kwargs
+            )
+        response = _build_response(
+            url=str(aresponse.url),
+            status_code=aresponse.status_code,
+            content=aresponse.content,
+            headers=aresponse.headers,
+            reason=getattr(aresponse, "reason_phrase", None),
+        )
+        response.raise_for_status()
+        return response
+
+    async def _fetch_response(self, key, payload, **get_kwargs):
+        try:
+            with self._stats.network(self._cache_tag(key)):
+                return await self._fetch(payload, **get_kwargs)
+        except _FETCH_ERRORS as error:
+            await self._offload(self._cache_failure, key, error)
+            raise
+
+    async def _fetch_and_store(self, key, payload, **get_kwargs):
+        response = await self._fetch_response(key, payload, **get_kwargs)
+        await self._offload(self._cache_set_many, {key: response})
+        return response
 
-        # we have one coordinate system and we need to dermermine which
-        # is alpha and wich is delta
-        coordinate_system = coordinate_system_candidates.pop()
-        alpha_coordinate_name = ALPHA[coordinate_system]
-        delta_coordinate_name = DELTA[coordinate_system]
+    async def _fetch_many(
+        self, keys, payloads, workers, failures="raise", **get_kwargs
+    ):
+        # the concurrency is bounded by the client semaphore, and
+        # optionally by the workers of the batch
+        semaphore = asyncio.Semaphore(workers or len(payloads) or 1)
+        fetched = {}
+
+        async def fetch(key, payload):
+            async with semaphore:
+                try:
+                    response = await self._fetch_response(
+                        key, payload, **get_kwargs
+                    )
+                except _FETCH_ERRORS as error:
+                    if failures == "raise":
+                        raise
+                    return _failure_response(error, self.URL)
+            fetched[key] = response
+            return response
+
+        # all the requests finish before the responses are stored (a copy,
+        # since the executor thread iterates it), with one write per tag
+        try:
+            responses = await asyncio.gather(
+                *map(fetch, keys, payloads), return_exceptions=True
+            )
+        finally:
+            await self._offload(self._cache_set_many, dict(fetched))
+        for response in responses:
+            if isinstance(response, BaseException):
+                raise response
+        return responses
+
+    def _revalidate_many(self, keys, payloads, stale, **get_kwargs):
+        # the stale entries are refreshed in background tasks of the running
+        # loop; the references are kept until the task is done
+        for key, payload, is_stale in zip(keys, payloads, stale):
+            if not is_stale or key in self._refreshing:
+                continue
+            task = asyncio.ensure_future(
+                self._fetch_and_store(key, payload, **get_kwargs)
+            )
+            self._refreshing[key] = task
+            task.add_done_callback(self._revalidate_done(key))
 
-        alpha = params[alpha_coordinate_name]
-        delta = params[delta_coordinate_name]
+    def _revalidate_done(self, key):
+        def done(task):
+            self._refreshing.pop(key, None)
+            if not task.cancelled():
+                task.exception()  # the next stale hit tries again
 
-        return coordinate_system, alpha, delta
+        return done
 
-    def _search(
+    async def _search(
         self,
         coordinate_system,
         alpha,
@@ -660,115 +5327,90 @@ class AbstractClient(metaclass=DocInheritMeta(style="numpy")):
         velocity,
         **get_kwargs,
     ):
+        parameter, value = self._validate(
+            coordinate_system, alpha, delta, distance, velocity
+        )
 
-        # The validations
-        if coordinate_system not in CoordinateSystem:
-            raise TypeError(
-                "coordinate_system must be a member of "
-                "pycf3.core.CoordinateSystem enum"
-            )
-
-        if not isinstance(alpha, (int, float)):
-            raise TypeError(f"{ALPHA[coordinate_system]} must be int or float")
-
-        if not isinstance(delta, (int, float)):
-            raise TypeError(f"{DELTA[coordinate_system]} must be int or float")
-        elif not (-90 <= delta <= 90):
-            raise ValueError(
-                f"{DELTA[coordinate_system]} must be >= -90 and <= 90"
-            )
-
-        if (distance, velocity) == (None, None):
-            raise ValueError(
-                "You must provide the distance or the velocity value"
-            )
-        elif distance is not None and velocity is not None:
-            raise ValueError(
-                "You cant provide velocity and distance at the same time"
-            )
-
-        if distance is not None:
-            if not isinstance(distance, (int, float)):
-                raise TypeError("'distance' must be int or float")
-            elif not (0 < distance <= self.MAX_DISTANCE):
-                raise ValueError(
-                    f"'distance' must be > 0 and <= {self.MAX_DISTANCE}"
-                )
-            parameter, value = Parameter.distance, distance
-
-        elif velocity is not None:
-            if not isinstance(velocity, (int, float)):
-                raise TypeError("'velocity' must be int or float")
-            elif not (0 < velocity <= self.MAX_VELOCITY):
-                raise ValueError(
-                    f"'velocity' must be > 0 and <= {self.MAX_VELOCITY}"
-                )
-
-            parameter, value = Parameter.velocity, velocity
-
-        payload = {
-            "coordinate": [float(alpha), float(delta)],
-            "system": coordinate_system.value,
-            "parameter": parameter.value,
-            "value": float(value),
-        }
-
-        # start the cache orchestration
-        base = (
-            self.CALCULATOR,
-            coordinate_system.value,
+        quantized = self._quantize(parameter, alpha, delta, value)
+        payload = self._build_payload(
+            coordinate_system,
+            parameter,
+            *((alpha, delta, value) if quantized is None else quantized),
         )
-        key = dcache.core.args_to_key(
-            base=base, args=(self.URL,), kwargs=payload, typed=False, ignore=[]
+        key = self._cache_key(coordinate_system, payload)
+
+        (response,), stale = await self._offload(self._cache_get_many, [key])
+        if _is_failure(response):
+            _raise_failure(response)
+        if response is None:
+            response = await self._fetch_and_store(key, payload, **get_kwargs)
+        self._revalidate_many([key], [payload], stale, **get_kwargs)
+
+        return self._make_result(
+            coordinate_system,
+            parameter,
+            alpha,
+            delta,
+            distance,
+            velocity,
+            response,
+            quantized,
+            stale[0],
         )
 
-        with self.cache as cache:
-            cache.expire()
-            response = cache.get(key, default=dcache.core.ENOVAL, retry=True)
-            if response == dcache.core.ENOVAL:
-                response = self.session.get(
-                    self.URL, json=payload, **get_kwargs
-                )
-                response.raise_for_status()
-                cache.set(
-                    key,
-                    response,
-                    expire=self.cache_expire,
-                    tag="@".join(key[:2]),
-                    retry=True,
-                )
+    async def _search_many(
+        self,
+        coordinate_system,
+        alpha,
+        delta,
+        parameter,
+        value,
+        errors="raise",
+        workers=None,
+        **get_kwargs,
+    ):
+        if workers is not None and workers < 1:
+            raise ValueError("workers must be >= 1")
 
-        result = Result(
-            calculator=self.CALCULATOR,
-            url=self.URL,
-            coordinate=coordinate_system,
-            calculated_by=parameter,
-            alpha=alpha,
-            delta=delta,
-            distance=distance,
-            velocity=velocity,
-            response_=response,
+        batch = self._prepare_many(
+            coordinate_system, alpha, delta, parameter, value, errors
         )
 
-        return result
+        responses, stale = await self._offload(
+            self._cache_get_many, batch.keys
+        )
+        self._raise_for_failures(responses, errors)
+        self._revalidate_many(batch.keys, batch.payloads, stale, **get_kwargs)
+        misses = [pos for pos, resp in enumerate(responses) if resp is None]
+        fetched = await self._fetch_many(
+            [batch.keys[pos] for pos in misses],
+            [batch.payloads[pos] for pos in misses],
+            workers,
+            failures=errors,
+            **get_kwargs,
+        )
+        for pos, response in zip(misses, fetched):
+            responses[pos] = response
 
-    # =========================================================================
-    # INTERNALS
-    # =========================================================================
+        return self._make_result_set(batch, responses, stale)
 
-    def __repr__(self):
-        """x.__repr__() <==> repr(x)."""
-        cls = type(self).__name__
-        calculator = f"calculator='{self.CALCULATOR}'"
-        cachedir = f"cache_dir='{getattr(self.cache, 'directory', '')}'"
-        expire = f"cache_expire={self.cache_expire}"
-        return f"{cls}({calculator}, {cachedir}, {expire})"
+    async def __aenter__(self):
+        """Enter the asynchronous context of the client."""
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        """Close the session when the asynchronous context is exited."""
+        await self.aclose()
 
     # =========================================================================
     # API
     # =========================================================================
 
-    def calculate_distance(
+    async def aclose(self):
+        """Close the asynchronous session of the client."""
+        await self.session.aclose()
+
+    async def calculate_distance(
         self,
         velocity,
         *,
@@ -780,67 +5422,88 @@ class AbstractClient(metaclass=DocInheritMeta(style="numpy")):
         sgb=None,
         **get_kwargs,
     ):
-        """Calculate a distance based on the given velocity and location.
+        """Coroutine that calculates a distance based on velocity and location.
 
-        The mandatory parameters are ``velocity`` and a position
-        expressed in two components depending on the chosen coordinate system:
+        The ``get_kwargs`` are passed to the ``request`` method of the
+        ``httpx.AsyncClient``.
 
-         - ``ra`` and ``dec`` for an equatorial system.
-         - ``glon`` and ``glat`` for a galactic system.
-         - ``sgl`` and ``sgb`` for a supergalactic system.
+        """
+        return await super().calculate_distance(
+            velocity,
+            ra=ra,
+            dec=dec,
+            glon=glon,
+            glat=glat,
+            sgl=sgl,
+            sgb=sgb,
+            **get_kwargs,
+        )
 
-        Coordinates cannot be mixed between systems, and must be expressed in
-        J2000 as 360° decimal.
+    async def calculate_velocity(
+        self,
+        distance,
+        *,
+        ra=None,
+        dec=None,
+        glon=None,
+        glat=None,
+        sgl=None,
+        sgb=None,
+        **get_kwargs,
+    ):
+        """Coroutine that calculates a velocity based on distance and location.
 
-        The returned distance(s) are expressed in Mpc, and potentially can
-        be more than one value.
+        The ``get_kwargs`` are passed to the ``request`` method of the
+        ``httpx.AsyncClient``.
 
-        Parameters
-        ----------
-        velocity : ``int`` or ``float``
-            Model velocity in km/s.
-        ra : ``int`` or ``float`` (optional)
-            Right ascension. If you provide ``ra`` you need to provide also
-            ``dec``.
-        dec : ``int`` or ``float`` (optional)
-            Declination. ``dec`` must be >= -90 and <= 90. If you provide
-            ``dec`` you need to provide also ``ra``.
-        glon : ``int`` or ``float`` (optional)
-            Galactic longitude. If you provide ``glon`` you need to provide
-            also ``glat``.
-        glat: ``int`` or ``float`` (optional)
-            Galactic latitude. ``glat`` must be >= -90 and <= 90. If you
-            provide ``glat`` you need to provide also ``glon``.
-        sgl : ``int`` or ``float`` (optional)
-            Super-galactic longitude. If you provide ``sgl`` you need to
-            provide also ``sgb``.
-        sgb: ``int`` or ``float`` (optional)
-            Super-galactic latitude. ``sgb`` must be >= -90 and <= 90.
-            If you  provide ``sgb`` you need to provide also ``sgl``.
-        get_kwargs:
-            Optional arguments that ``request.get`` takes.
+        """
+        return await super().calculate_velocity(
+            distance,
+            ra=ra,
+            dec=dec,
+            glon=glon,
+            glat=glat,
+            sgl=sgl,
+            sgb=sgb,
+            **get_kwargs,
+        )
 
-        Returns
-        -------
-        pycf3.Result :
-            Result object that automatically parses the entire model
-            returned by the remote calculator.
+    async def calculate_distance_many(
+        self,
+        velocity,
+        *,
+        ra=None,
+        dec=None,
+        glon=None,
+        glat=None,
+        sgl=None,
+        sgb=None,
+        data=None,
+        errors="raise",
+        workers=None,
+        **get_kwargs,
+    ):
+        """Coroutine that calculates many distances.
+
+        All the cache misses are requested concurrently. The concurrency is
+        bounded by the ``max_concurrency`` of the client and, if it's not
+        ``None``, by the ``workers`` of the batch.
 
         """
-        coordinate_system, alpha, delta = self._determine_coordinate_system(
+        coordinates = dict(
             ra=ra, dec=dec, glon=glon, glat=glat, sgl=sgl, sgb=sgb
         )
-        response = self._search(
-            coordinate_system=coordinate_system,
-            alpha=alpha,
-            delta=delta,
-            distance=None,
-            velocity=velocity,
+        return await self._calculate_many(
+            Parameter.velocity,
+            velocity,
+            coordinates,
+            data,
+            errors=errors,
+            workers=workers,
             **get_kwargs,
         )
-        return response
 
-    def calculate_velocity(
+    async def calculate_velocity_many(
         self,
         distance,
         *,
@@ -850,297 +5513,553 @@ class AbstractClient(metaclass=DocInheritMeta(style="numpy")):
         glat=None,
         sgl=None,
         sgb=None,
+        data=None,
+        errors="raise",
+        workers=None,
         **get_kwargs,
     ):
-        """Calculate a velocity based on the given distance and location.
+        """Coroutine that calculates many velocities.
 
-        The mandatory parameters are ``distance`` and a position
-        expressed in two components depending on the chosen coordinate system:
+        All the cache misses are requested concurrently. The concurrency is
+        bounded by the ``max_concurrency`` of the client and, if it's not
+        ``None``, by the ``workers`` of the batch.
 
-         - ``ra`` and ``dec`` for an equatorial system.
-         - ``glon`` and ``glat`` for a galactic system.
-         - ``sgl`` and ``sgb`` for a supergalactic system.
+        """
+        coordinates = dict(
+            ra=ra, dec=dec, glon=glon, glat=glat, sgl=sgl, sgb=sgb
+        )
+        return await self._calculate_many(
+            Parameter.distance,
+            distance,
+            coordinates,
+            data,
+            errors=errors,
+            workers=workers,
+            **get_kwargs,
+        )
 
-        Coordinates cannot be mixed between systems, and must be expressed in
-        J2000 as 360° decimal.
+    async def iter_calculate(
+        self, rows, *, ordered=True, window=None, **get_kwargs
+    ):
+        """Asynchronous generator that lazily calculates every row.
 
-        The returned velocity are expressed in Km/s.
+        ``rows`` can be a regular or an asynchronous iterable. The number
+        of rows in flight is bounded by ``window`` (by default two times
+        the ``max_concurrency`` of the client).
 
-        Parameters
-        ----------
-        distance : ``int`` or ``float``
-            Distance(s) in Mpc.
-        ra : ``int`` or ``float`` (optional)
-            Right ascension. If you provide ``ra`` you need to provide also
-            ``dec``.
-        dec : ``int`` or ``float`` (optional)
-            Declination. ``dec`` must be >= -90 and <= 90. If you provide
-            ``dec`` you need to provide also ``ra``.
-        glon : ``int`` or ``float`` (optional)
-            Galactic longitude. If you provide ``glon`` you need to provide
-            also ``glat``.
-        glat: ``int`` or ``float`` (optional)
-            Galactic latitude. ``glat`` must be >= -90 and <= 90. If you
-            provide ``glat`` you need to provide also ``glon``.
-        sgl : ``int`` or ``float`` (optional)
-            Super-galactic longitude. If you provide ``sgl`` you need to
-            provide also ``sgb``.
-        sgb: ``int`` or ``float`` (optional)
-            Super-galactic latitude. ``sgb`` must be >= -90 and <= 90.
-            If you  provide ``sgb`` you need to provide also ``sgl``.
-        get_kwargs:
-            Optional arguments that ``request.get`` takes.
+        """
+        window = 2 * self.max_concurrency if window is None else window
+        if window < 1:
+            raise ValueError("window must be >= 1")
+
+        async def calculate(row):
+            return await self._calculate_row(row, **get_kwargs)
+
+        async def aiter_rows():
+            if hasattr(rows, "__aiter__"):
+                async for row in rows:
+                    yield row
+            else:
+                for row in rows:
+                    yield row
+
+        pending = deque() if ordered else set()
+        try:
+            async for row in aiter_rows():
+                task = asyncio.ensure_future(calculate(row))
+                if ordered:
+                    pending.append(task)
+                else:
+                    pending.add(task)
+
+                while len(pending) >= window:
+                    if ordered:
+                        yield await pending.popleft()
+                    else:
+                        done, pending = await asyncio.wait(
+                            pending, return_when=asyncio.FIRST_COMPLETED
+                        )
+                        for task in done:
+                            yield task.result()
+
+            while pending:
+                if ordered:
+                    yield await pending.popleft()
+                else:
+                    done, pending = await asyncio.wait(
+                        pending, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    for task in done:
+                        yield task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def warm(
+        self,
+        *,
+        distance=None,
+        velocity=None,
+        ra=None,
+        dec=None,
+        glon=None,
+        glat=None,
+        sgl=None,
+        sgb=None,
+        workers=1,
+        chunksize=1000,
+        checkpoint=None,
+        **get_kwargs,
+    ):
+        """Coroutine that pre-populates the cache.
 
-        Returns
-        -------
-        pycf3.Result :
-            Result object that automatically parses the entire model
-            returned by the remote calculator.
+        The ``get_kwargs`` are passed to the ``request`` method of the
+        ``httpx.AsyncClient``.
 
         """
-        coordinate_system, alpha, delta = self._determine_coordinate_system(
-            ra=ra, dec=dec, glon=glon, glat=glat, sgl=sgl, sgb=sgb
+        if workers < 1:
+            raise ValueError("workers must be >= 1")
+
+        report = dict.fromkeys(WarmReport._fields, 0)
+        chunks = self._warm_chunks(
+            report,
+            distance=distance,
+            velocity=velocity,
+            ra=ra,
+            dec=dec,
+            glon=glon,
+            glat=glat,
+            sgl=sgl,
+            sgb=sgb,
+            chunksize=chunksize,
+            checkpoint=checkpoint,
         )
-        response = self._search(
+
+        # every chunk reads the cache (and writes the checkpoint) in the
+        # executor
+        while True:
+            chunk = await self._offload(next, chunks, None)
+            if chunk is None:
+                break
+            keys, payloads = chunk
+            responses = await self._fetch_many(
+                keys, payloads, workers, failures="mask", **get_kwargs
+            )
+            for response in responses:
+                report["failed" if _is_failure(response) else "fetched"] += 1
+
+        return WarmReport(**report)
+
+
+class AsyncNAM(AsyncAbstractClient, NAM):
+    """Asyncio client for the *NAM Distance-Velocity Calculator*."""
+
+
+class AsyncCF3(AsyncAbstractClient, CF3):
+    """Asyncio client for the *Cosmicflows-3 Distance-Velocity Calculator*."""
+
+
+# =============================================================================
+# CATALOG RUNNER
+# =============================================================================
+
+
+def _run_catalog_chunk(
+    runner,
+    chunk,
+    coordinate_system,
+    parameter,
+    alpha,
+    delta,
+    value,
+    errors,
+    kwargs,
+):
+    # this runs inside the worker process, so the client, the session and the
+    # cache are created here and never cross the process boundary; the rows
+    # are already validated, so errors only decides the calculator failures
+    cache = runner._open_cache(chunk)
+    client = runner.client_class(
+        cache=cache, cache_expire=runner.cache_expire, **runner.client_kwargs
+    )
+    with cache:
+        return client._search_many(
             coordinate_system=coordinate_system,
             alpha=alpha,
             delta=delta,
-            distance=distance,
-            velocity=None,
-            **get_kwargs,
+            parameter=parameter,
+            value=value,
+            errors=errors,
+            workers=runner.workers,
+            **kwargs,
         )
-        return response
 
-    # =========================================================================
-    # OLD API
-    # =========================================================================
 
-    @deprecated(
-        category=CFDeprecationWarning,
-        action="once",
-        reason="Use `calculate_velocity` or `calculate_distance` instead",
-        version="2020.12",
-    )
-    def equatorial_search(
-        self,
-        ra=187.78917,
-        dec=13.33386,
-        distance=None,
-        velocity=None,
-        **get_kwargs,
-    ):
-        """Search by equatorial coordinates.
+@attr.s(frozen=True)
+class CatalogRunner:
+    """Calculate big catalogs splitting them between a pool of processes.
 
-        The coordinates are expressed in J2000 as 360° decimal.
+    The catalog is partitioned in chunks of ``chunksize`` rows, and every
+    chunk is calculated by a new client of ``client_class`` created inside
+    the worker process. The results of all the chunks are merged, in order,
+    in a single ``pycf3.ResultSet``.
 
-        .. deprecated:: 2020.12
-            "Use `calculate_velocity` or `calculate_distance` instead"
+    Parameters
+    ----------
+    client_class : subclass of ``pycf3.AbstractClient``
+        The client to use (``pycf3.CF3``, ``pycf3.NAM`` or any other
+        synchronous client importable by the worker processes).
+    processes : ``int`` or ``None`` (default: ``None``)
+        Size of the process pool. If it's ``None`` the number of CPUs of
+        the machine is used.
+    chunksize : ``int`` (default: ``10000``)
+        Number of rows calculated by each task of the pool.
+    cache_dir : ``str`` or ``None`` (default: ``None``)
+        Directory of the cache. If it's ``None`` the results are not
+        cached.
+    shared_cache : ``bool`` (default: ``True``)
+        If it's ``True`` all the workers share a ``diskcache.FanoutCache``
+        with one shard for every process. Otherwise the chunk ``n`` is stored
+        in the private ``diskcache.Cache`` ``cache_dir/shard-<n % processes>``
+        (a rerun with the same ``chunksize`` reuses the same shard).
+    cache_expire : ``float`` or None (default=``None``)
+        Seconds until item expires (default ``None``, no expiry).
+    workers : ``int`` (default: ``1``)
+        Number of threads used to fetch the cache misses inside every
+        worker process.
+    client_kwargs : ``dict`` or ``None`` (default: ``None``)
+        Extra parameters to create every client.
+    mp_context : ``multiprocessing.context.BaseContext`` or ``None``
+        Context used to start the worker processes (default: ``None``, the
+        default of ``concurrent.futures.ProcessPoolExecutor``).
 
-        Parameters
-        ----------
-        ra : ``int`` or ``float`` (default: ``187.78917``)
-            Right ascension.
-        dec : ``int`` or ``float`` (default: ``13.33386``)
-            Declination. dec must be >= -90 and <= 90
-        distance : ``int``, ``float`` or ``None`` (default: ``None``)
-            Distance(s) in Mpc.
-        velocity : ``int``, ``float`` or ``None`` (default: ``None``)
-            Velocity in km/s. The returned distance potentially can be more
-            than ine value.
-        get_kwargs:
-            Optional arguments that ``request.get`` takes.
+    """
 
-        Returns
-        -------
-        pycf3.Result :
-            Result object that automatically parses the entire model
-            returned by the remote calculator.
+    client_class: t.Type[AbstractClient] = attr.ib()
+    processes: int = attr.ib()
+    chunksize: int = attr.ib(default=10_000)
+    cache_dir: str = attr.ib(default=None)
+    shared_cache: bool = attr.ib(default=True)
+    cache_expire: float = attr.ib(default=None)
+    workers: int = attr.ib(default=1)
+    client_kwargs: dict = attr.ib(
+        default=None, converter=attr.converters.default_if_none(factory=dict)
+    )
+    mp_context = attr.ib(default=None, repr=False)
+
+    @client_class.validator
+    def _check_client_class(self, attribute, value):
+        if not (
+            isinstance(value, type)
+            and issubclass(value, AbstractClient)
+            and not issubclass(value, AsyncAbstractClient)
+        ):
+            raise TypeError(
+                "client_class must be a subclass of pycf3.AbstractClient "
+                "and can't be asynchronous"
+            )
 
-        """
-        response = self._search(
-            CoordinateSystem.equatorial,
-            alpha=ra,
-            delta=dec,
-            distance=distance,
-            velocity=velocity,
-            **get_kwargs,
+    @processes.default
+    def _processes_default(self):
+        return os.cpu_count() or 1
+
+    @processes.validator
+    @chunksize.validator
+    @workers.validator
+    def _check_positive(self, attribute, value):
+        if value < 1:
+            raise ValueError(f"{attribute.name} must be >= 1")
+
+    def _open_cache(self, chunk):
+        if self.cache_dir is None:
+            return NoCache()
+        if self.shared_cache:
+            return dcache.FanoutCache(
+                directory=self.cache_dir, shards=self.processes
+            )
+        directory = os.path.join(
+            self.cache_dir, f"shard-{chunk % self.processes:03d}"
         )
-        return response
+        return dcache.Cache(directory=directory)
 
-    @deprecated(
-        category=CFDeprecationWarning,
-        action="once",
-        reason="Use `calculate_velocity` or `calculate_distance` instead",
-        version="2020.12",
-    )
-    def galactic_search(
-        self,
-        glon=282.96547,
-        glat=75.41360,
-        distance=None,
-        velocity=None,
-        **get_kwargs,
+    def _calculate_many(
+        self, parameter, value, coordinates, data, errors, get_kwargs
     ):
-        """Search by galactic coordinates.
+        if errors not in ("raise", "mask"):
+            raise ValueError("errors must be 'raise' or 'mask'")
+
+        # the main process only resolve and validate the columns, so the bad
+        # catalogs fail before starting the pool
+        client = self.client_class(cache=NoCache(), **self.client_kwargs)
+        if data is not None:
+            value, coordinates = client._extract_table_columns(
+                data, value, coordinates
+            )
+        coordinate_system, alpha, delta = client._determine_coordinate_system(
+            **coordinates
+        )
+        alpha, delta, value, row_errors = client._validate_many(
+            coordinate_system, alpha, delta, parameter, value
+        )
+        if errors == "raise":
+            client._raise_for_row_errors(
+                coordinate_system, parameter, row_errors
+            )
 
-        The coordinates are expressed in J2000 as 360° decimal.
+        starts = range(0, max(len(value), 1), self.chunksize)
+        max_workers = min(self.processes, len(starts))
+        with ProcessPoolExecutor(
+            max_workers=max_workers, mp_context=self.mp_context
+        ) as executor:
+            futures = [
+                executor.submit(
+                    _run_catalog_chunk,
+                    self,
+                    chunk,
+                    coordinate_system,
+                    parameter,
+                    alpha[start : start + self.chunksize],  # noqa
+                    delta[start : start + self.chunksize],  # noqa
+                    value[start : start + self.chunksize],  # noqa
+                    errors,
+                    get_kwargs,
+                )
+                for chunk, start in enumerate(starts)
+            ]
+            return ResultSet.concatenate(f.result() for f in futures)
 
-        .. deprecated:: 2020.12
-            "Use `calculate_velocity` or `calculate_distance` instead"
+    def calculate_distance_many(
+        self,
+        velocity,
+        *,
+        ra=None,
+        dec=None,
+        glon=None,
+        glat=None,
+        sgl=None,
+        sgb=None,
+        data=None,
+        errors="raise",
+        **get_kwargs,
+    ):
+        """Calculate the distances of an entire catalog in parallel.
 
-        Parameters
-        ----------
-        glon : ``int`` or ``float`` (default: ``282.96547``)
-            Galactic longitude.
-        glat: ``int`` or ``float`` (default: ``75.41360``)
-            Galactic latitude. dec must be >= -90 and <= 90
-        distance : ``int``, ``float`` or ``None`` (default: ``None``)
-            Distance(s) in Mpc.
-        velocity : ``int``, ``float`` or ``None`` (default: ``None``)
-            Velocity in km/s. The returned distance potentially can be more
-            than ine value.
-        get_kwargs:
-            Optional arguments that ``request.get`` takes.
+        The parameters are the same of
+        ``pycf3.AbstractClient.calculate_distance_many``.
 
         Returns
         -------
-        pycf3.Result :
-            Result object that automatically parses the entire model
-            returned by the remote calculator.
+        pycf3.ResultSet :
+            The merged results of all the chunks, in the catalog order.
 
         """
-        response = self._search(
-            CoordinateSystem.galactic,
-            alpha=glon,
-            delta=glat,
-            distance=distance,
-            velocity=velocity,
-            **get_kwargs,
+        coordinates = dict(
+            ra=ra, dec=dec, glon=glon, glat=glat, sgl=sgl, sgb=sgb
+        )
+        return self._calculate_many(
+            Parameter.velocity, velocity, coordinates, data, errors, get_kwargs
         )
-        return response
 
-    @deprecated(
-        category=CFDeprecationWarning,
-        action="once",
-        reason="Use `calculate_velocity` or `calculate_distance` instead",
-        version="2020.12",
-    )
-    def supergalactic_search(
+    def calculate_velocity_many(
         self,
-        sgl=102.0,
-        sgb=-2.0,
-        distance=None,
-        velocity=None,
+        distance,
+        *,
+        ra=None,
+        dec=None,
+        glon=None,
+        glat=None,
+        sgl=None,
+        sgb=None,
+        data=None,
+        errors="raise",
         **get_kwargs,
     ):
-        """Search super-galactic coordinates.
+        """Calculate the velocities of an entire catalog in parallel.
 
-        The coordinates are expressed in J2000 as 360° decimal.
-
-        .. deprecated:: 2020.12
-            "Use `calculate_velocity` or `calculate_distance` instead"
-
-        Parameters
-        ----------
-        sgl : ``int`` or ``float`` (default: ``102``)
-            Super-galactic longitude.
-        sgb: ``int`` or ``float`` (default: ``-2``)
-            Super-galactic latitude. dec must be >= -90 and <= 90
-        distance : ``int``, ``float`` or ``None`` (default: ``None``)
-            Distance(s) in Mpc.
-        velocity : ``int``, ``float`` or ``None`` (default: ``None``)
-            Velocity in km/s. The returned distance potentially can be more
-            than ine value.
-        get_kwargs:
-            Optional arguments that ``request.get`` takes.
+        The parameters are the same of
+        ``pycf3.AbstractClient.calculate_velocity_many``.
 
         Returns
         -------
-        pycf3.Result :
-            Result object that automatically parses the entire model
-            returned by the remote calculator.
+        pycf3.ResultSet :
+            The merged results of all the chunks, in the catalog order.
 
         """
-        response = self._search(
-            CoordinateSystem.supergalactic,
-            alpha=sgl,
-            delta=sgb,
-            distance=distance,
-            velocity=velocity,
-            **get_kwargs,
+        coordinates = dict(
+            ra=ra, dec=dec, glon=glon, glat=glat, sgl=sgl, sgb=sgb
+        )
+        return self._calculate_many(
+            Parameter.distance, distance, coordinates, data, errors, get_kwargs
         )
-        return response
 
 
 # =============================================================================
-# NAM CLIENT
+# COMMAND LINE INTERFACE
 # =============================================================================
 
 
-class NAM(AbstractClient):
-    """Client for the *NAM Distance-Velocity Calculator* [1]_.
-
-    Compute expectation distances or velocities based on smoothed velocity
-    field from the Numerical Action Methods model of Shaya et al. 2017. [2]_.
-
-    More information: http://edd.ifa.hawaii.edu/NAMcalculator.
-
-    References
-    ----------
-    .. [1] Kourkchi, E., Courtois, H. M., Graziani, R., Hoffman, Y.,
-       Pomarede, D., Shaya, E. J., & Tully, R. B. (2020).
-       Cosmicflows-3: Two Distance-Velocity Calculators.
-       The Astronomical Journal, 159(2), 67.
-
-    .. [2] Shaya, E. J., Tully, R. B., Hoffman, Y., & Pomarède, D. (2017).
-       Action dynamics of the local supercluster.
-       The Astrophysical Journal, 850(2), 207.
-
-    """
-
-    CALCULATOR = "NAM"
-    URL = "http://edd.ifa.hawaii.edu/NAMcalculator/api.php"
-
-    #: Maximum distance to adjust the velocity.
-    MAX_DISTANCE = 38
+def _grid(text):
+    try:
+        start, stop, step = (float(part) for part in text.split(":"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"invalid grid {text!r}, use START:STOP:STEP"
+        )
+    if step <= 0 or stop < start:
+        raise argparse.ArgumentTypeError(
+            f"invalid grid {text!r}, STEP must be > 0 and STOP >= START"
+        )
+    return np.arange(start, stop + step / 2, step)
 
-    #: Maximum velocity to adjust the distance.
-    MAX_VELOCITY = 2400
 
+def _warm_command(args):
+    clients = {"cf3": CF3, "nam": NAM}
+    cache = default_cache(
+        directory=args.cache_dir,
+        size_limit=args.cache_size_limit,
+        eviction_policy=args.eviction_policy,
+    )
+    client = clients[args.calculator](
+        cache=cache, cache_expire=args.cache_expire
+    )
 
-# =============================================================================
-# CF3 CLIENT
-# =============================================================================
+    system = CoordinateSystem(args.system)
+    alpha, delta = sky_tiling(args.step)
+    coordinates = {ALPHA[system]: alpha, DELTA[system]: delta}
+
+    report = client.warm(
+        distance=args.distance,
+        velocity=args.velocity,
+        workers=args.workers,
+        chunksize=args.chunksize,
+        checkpoint=args.checkpoint,
+        **coordinates,
+    )
+    print(
+        f"{client.CALCULATOR} cache warmed at {args.cache_dir}: "
+        f"{report.total} total, {report.resumed} resumed, "
+        f"{report.invalid} invalid, {report.cached} already cached, "
+        f"{report.fetched} fetched, {report.failed} failed"
+    )
 
 
-class CF3(AbstractClient):
-    """Client for the *Cosmicflows-3 Distance-Velocity Calculator* [3]_.
+def _evict_command(args):
+    clients = {"cf3": CF3, "nam": NAM}
+    client = clients[args.calculator](cache=dcache.Cache(args.cache_dir))
+    removed = client.evict(args.system)
+    print(
+        f"{removed} {client.CALCULATOR} entries removed from {args.cache_dir}"
+    )
 
-    It computes expectation distances or velocities based on smoothed
-    velocity field from the Wiener filter model of Graziani et al. 2019 [4]_.
 
-    More information: http://edd.ifa.hawaii.edu/CF3calculator/ .
+def main(argv=None):
+    """Run the pycf3 command line interface.
 
-    References
+    Parameters
     ----------
-    .. [3] Kourkchi, E., Courtois, H. M., Graziani, R., Hoffman, Y.,
-       Pomarede, D., Shaya, E. J., & Tully, R. B. (2020).
-       Cosmicflows-3: Two Distance-Velocity Calculators.
-       The Astronomical Journal, 159(2), 67.
-
-    .. [4] Graziani, R., Courtois, H. M., Lavaux, G., Hoffman, Y.,
-       Tully, R. B., Copin, Y., & Pomarède, D. (2019).
-       The peculiar velocity field up to z∼ 0.05 by forward-modelling
-       Cosmicflows-3 data. Monthly Notices of the Royal Astronomical Society,
-       488(4), 5438-5451.
+    argv : list of ``str`` or ``None`` (default: ``None``)
+        The arguments. If it's ``None`` ``sys.argv`` is used.
 
     """
+    parser = argparse.ArgumentParser(
+        prog="pycf3", description="Cosmicflows calculators client"
+    )
+    parser.add_argument(
+        "--version", action="version", version=f"%(prog)s {__version__}"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
 
-    CALCULATOR = "CF3"
-    URL = "http://edd.ifa.hawaii.edu/CF3calculator/api.php"
+    warm = commands.add_parser(
+        "warm",
+        help="pre-populate the cache for a sky tiling crossed with a grid",
+    )
+    warm.add_argument("calculator", choices=["cf3", "nam"])
+    values = warm.add_mutually_exclusive_group(required=True)
+    values.add_argument(
+        "--distance",
+        type=_grid,
+        metavar="START:STOP:STEP",
+        help="grid of distances in Mpc (warm the velocities)",
+    )
+    values.add_argument(
+        "--velocity",
+        type=_grid,
+        metavar="START:STOP:STEP",
+        help="grid of velocities in Km/s (warm the distances)",
+    )
+    warm.add_argument(
+        "--system",
+        choices=[system.value for system in CoordinateSystem],
+        default=CoordinateSystem.equatorial.value,
+        help="coordinate system of the tiling (default: %(default)s)",
+    )
+    warm.add_argument(
+        "--step",
+        type=float,
+        default=1.0,
+        help="size of the cells of the tiling in degrees "
+        "(default: %(default)s)",
+    )
+    warm.add_argument(
+        "--workers",
+        type=int,
+        default=8,
+        help="maximum number of requests in flight (default: %(default)s)",
+    )
+    warm.add_argument(
+        "--chunksize",
+        type=int,
+        default=1000,
+        help="combinations between checkpoints (default: %(default)s)",
+    )
+    warm.add_argument(
+        "--checkpoint", help="JSON file to store the progress and resume"
+    )
+    warm.add_argument(
+        "--cache-dir",
+        default=DEFAULT_CACHE_DIR,
+        help="directory of the cache (default: %(default)s)",
+    )
+    warm.add_argument(
+        "--cache-expire",
+        type=float,
+        default=None,
+        help="seconds until the entries expire (default: never)",
+    )
+    warm.add_argument(
+        "--cache-size-limit",
+        type=int,
+        default=DEFAULT_CACHE_SIZE_LIMIT,
+        help="maximum size of the cache in bytes (default: %(default)s)",
+    )
+    warm.add_argument(
+        "--eviction-policy",
+        choices=list(dcache.EVICTION_POLICY),
+        default=DEFAULT_CACHE_EVICTION_POLICY,
+        help="eviction policy of the cache (default: %(default)s)",
+    )
+    warm.set_defaults(function=_warm_command)
 
-    #: Maximum distance to adjust the velocity.
-    MAX_DISTANCE = 200
+    evict = commands.add_parser(
+        "evict", help="remove the cached results of a calculator"
+    )
+    evict.add_argument("calculator", choices=["cf3", "nam"])
+    evict.add_argument(
+        "--system",
+        choices=[system.value for system in CoordinateSystem],
+        default=None,
+        help="only the results of this coordinate system (default: all)",
+    )
+    evict.add_argument(
+        "--cache-dir",
+        default=DEFAULT_CACHE_DIR,
+        help="directory of the cache (default: %(default)s)",
+    )
+    evict.set_defaults(function=_evict_command)
 
-    #: Maximum velocity to adjust the distance.
-    MAX_VELOCITY = 15_000
+    args = parser.parse_args(argv)
+    args.function(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -45,6 +45,12 @@ REQUIREMENTS = [
     "Deprecated",
 ]
 
+EXTRAS_REQUIRE = {
+    "async": ["httpx"],
+    "index": ["scipy"],
+    "redis": ["redis"],
+}
+
 with open(PATH / "README.md") as fp:
     LONG_DESCRIPTION = fp.read()
 
@@ -97,6 +103,8 @@ def do_setup():
         ),
         py_modules=["pycf3", "ez_setup"],
         install_requires=REQUIREMENTS,
+        extras_require=EXTRAS_REQUIRE,
+        entry_points={"console_scripts": ["pycf3=pycf3:main"]},
     )
 
 
@@ -19,6 +19,7 @@
 # IMPORTS
 # =============================================================================
 
+import json
 import os
 import pathlib
 
@@ -32,6 +33,8 @@ import pycf3
 
 import pytest
 
+import requests
+
 # =============================================================================
 # CONSTANTS
 # =============================================================================
@@ -64,6 +67,38 @@ def load_mresponse():
     return load
 
 
+@pytest.fixture(scope="session")
+def echo_get():
+    """Fake ``requests.Session.get`` that echoes the payload in the result.
+
+    The observed velocity and distance are the requested value, and the
+    ``RA``/``Dec`` are the requested coordinate.
+
+    """
+
+    def get(url, **kwargs):
+        payload = kwargs["json"]
+        alpha, delta = payload["coordinate"]
+        value = payload["value"]
+        data = {
+            "message": "Success",
+            "RA": alpha,
+            "Dec": delta,
+            "Glon": alpha,
+            "Glat": delta,
+            "SGL": alpha,
+            "SGB": delta,
+            "observed": {"velocity": value, "distance": [value]},
+        }
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        response._content = json.dumps(data).encode()
+        return response
+
+    return get
+
+
 @pytest.fixture
 def no_cache():
     return pycf3.NoCache()
@@ -0,0 +1,376 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2019, Juan B Cabral
+# License: BSD-3-Clause
+#   Full Text: https://github.com/quatrope/pycf3/blob/master/LICENSE
+
+
+# =============================================================================
+# DOCS
+# =============================================================================
+
+"""Test for the asyncio clients
+
+"""
+
+
+# =============================================================================
+# IMPORTS
+# =============================================================================
+
+import asyncio
+import inspect
+import threading
+from unittest import mock
+
+import numpy as np
+from numpy import testing as npt
+
+import pycf3
+
+import pytest
+
+import requests
+
+httpx = pytest.importorskip("httpx")
+
+
+# =============================================================================
+# FIXTURES
+# =============================================================================
+
+
+@pytest.fixture
+def async_echo_request(echo_get):
+    """Fake ``httpx.AsyncClient.request`` based on ``echo_get``."""
+    state = {"in_flight": 0, "max_in_flight": 0}
+
+    async def request(method, url, **kwargs):
+        state["in_flight"] += 1
+        in_flight = max(state["max_in_flight"], state["in_flight"])
+        state["max_in_flight"] = in_flight
+        await asyncio.sleep(0.001)
+        state["in_flight"] -= 1
+
+        response = echo_get(url, **kwargs)
+        return httpx.Response(
+            200,
+            content=response.content,
+            request=httpx.Request(method, url),
+        )
+
+    request.state = state
+    return request
+
+
+@pytest.fixture
+def async_fakeclient_class(fakeclient_class):
+    class AsyncFake(pycf3.AsyncAbstractClient, fakeclient_class):
+        pass
+
+    return AsyncFake
+
+
+# =============================================================================
+# TESTS
+# =============================================================================
+
+
+def test_async_clients_are_coroutines():
+    for cls in (pycf3.AsyncCF3, pycf3.AsyncNAM):
+        assert inspect.iscoroutinefunction(cls.calculate_velocity)
+        assert inspect.iscoroutinefunction(cls.calculate_distance)
+        assert inspect.iscoroutinefunction(cls.calculate_velocity_many)
+        assert inspect.iscoroutinefunction(cls.calculate_distance_many)
+    assert pycf3.AsyncCF3.CALCULATOR == pycf3.CF3.CALCULATOR
+    assert pycf3.AsyncNAM.MAX_DISTANCE == pycf3.NAM.MAX_DISTANCE
+    assert "Parameters" in pycf3.AsyncCF3.calculate_velocity.__doc__
+
+
+def test_async_positional_arguments(no_cache):
+    session = httpx.AsyncClient()
+    client = pycf3.AsyncCF3(session, no_cache, 60)
+
+    assert client.session is session
+    assert client.cache is no_cache
+    assert client.cache_expire == 60
+    default = pycf3.AsyncNAM(cache=no_cache).session
+    assert isinstance(default, httpx.AsyncClient)
+    asyncio.run(session.aclose())
+
+
+def test_async_calculate_velocity(no_cache, load_mresponse):
+    client = pycf3.AsyncCF3(cache=no_cache)
+    mresponse = load_mresponse("cf3", "tcEquatorial_distance_10.pkl")
+    aresponse = httpx.Response(
+        200,
+        content=mresponse.content,
+        request=httpx.Request("GET", pycf3.CF3.URL),
+    )
+
+    async def run():
+        async with client:
+            return await client.calculate_velocity(
+                ra=187.78917, dec=13.33386, distance=10
+            )
+
+    with mock.patch(
+        "httpx.AsyncClient.request", return_value=aresponse
+    ) as request:
+        result = asyncio.run(run())
+
+    request.assert_called_once_with(
+        "GET",
+        pycf3.CF3.URL,
+        json={
+            "coordinate": [187.78917, 13.33386],
+            "system": "equatorial",
+            "parameter": "distance",
+            "value": 10.0,
+        },
+    )
+    assert isinstance(result, pycf3.Result)
+    assert isinstance(result.response_, requests.Response)
+    assert result.json_ == mresponse.json()
+    npt.assert_almost_equal(
+        result.observed_velocity_, 730.4691399179898, decimal=4
+    )
+
+
+def test_async_calculate_distance_http_error(no_cache):
+    client = pycf3.AsyncNAM(cache=no_cache)
+    aresponse = httpx.Response(
+        500, content=b"", request=httpx.Request("GET", pycf3.NAM.URL)
+    )
+
+    with mock.patch("httpx.AsyncClient.request", return_value=aresponse):
+        with pytest.raises(requests.HTTPError):
+            asyncio.run(client.calculate_distance(velocity=10, ra=1, dec=1))
+
+
+def test_async_validation_is_shared(no_cache):
+    client = pycf3.AsyncCF3(cache=no_cache)
+    with pytest.raises(ValueError):
+        asyncio.run(client.calculate_distance(velocity=-1, ra=1, dec=1))
+    with pytest.raises(pycf3.MixedCoordinateSystemError):
+        asyncio.run(client.calculate_distance(velocity=1, ra=1, glat=1))
+
+
+def test_async_calculate_velocity_many(
+    async_fakeclient_class, tmp_cache, async_echo_request
+):
+    client = async_fakeclient_class(cache=tmp_cache, max_concurrency=4)
+    distances = np.arange(1, 31, dtype=float)
+
+    with mock.patch(
+        "httpx.AsyncClient.request", side_effect=async_echo_request
+    ) as request:
+        rset = asyncio.run(
+            client.calculate_velocity_many(distance=distances, ra=1, dec=1)
+        )
+        again = asyncio.run(client.calculate_velocity(distance=1, ra=1, dec=1))
+
+    assert request.call_count == 30
+    assert async_echo_request.state["max_in_flight"] == 4
+    assert len(tmp_cache) == 30
+    npt.assert_array_equal(rset.observed_velocity_, distances)
+    assert again.observed_velocity_ == 1
+
+
+def test_async_calculate_distance_many_workers(
+    async_fakeclient_class, no_cache, async_echo_request
+):
+    client = async_fakeclient_class(cache=no_cache)
+
+    with mock.patch(
+        "httpx.AsyncClient.request", side_effect=async_echo_request
+    ):
+        rset = asyncio.run(
+            client.calculate_distance_many(
+                velocity=[1, 2, 3, 4], ra=1, dec=1, workers=2
+            )
+        )
+
+    assert async_echo_request.state["max_in_flight"] == 2
+    npt.assert_array_equal(rset.observed_velocity_, [1, 2, 3, 4])
+
+
+@pytest.mark.parametrize("ordered", [True, False])
+def test_async_iter_calculate(
+    ordered, async_fakeclient_class, no_cache, async_echo_request
+):
+    client = async_fakeclient_class(cache=no_cache, max_concurrency=3)
+    rows = ({"distance": idx, "glon": 1, "glat": 1} for idx in range(1, 21))
+
+    async def arows():
+        for row in rows:
+            yield row
+
+    async def run():
+        return [
+            result.observed_velocity_
+            async for result in client.iter_calculate(
+                arows(), ordered=ordered, window=5
+            )
+        ]
+
+    with mock.patch(
+        "httpx.AsyncClient.request", side_effect=async_echo_request
+    ):
+        values = asyncio.run(run())
+
+    assert async_echo_request.state["max_in_flight"] <= 3
+    if ordered:
+        assert values == list(range(1, 21))
+    else:
+        assert sorted(values) == list(range(1, 21))
+
+
+def test_async_cache_io_off_the_loop(
+    async_fakeclient_class, tmp_cache, async_echo_request
+):
+    client = async_fakeclient_class(cache=tmp_cache)
+    assert isinstance(client.expire_policy, pycf3.LazyExpire)
+
+    threads = []
+    cache_get_many = client._cache_get_many
+
+    def spy(keys):
+        threads.append(threading.current_thread())
+        return cache_get_many(keys)
+
+    object.__setattr__(client, "_cache_get_many", spy)
+    with mock.patch(
+        "httpx.AsyncClient.request", side_effect=async_echo_request
+    ):
+        asyncio.run(client.calculate_velocity(ra=1, dec=1, distance=1))
+        asyncio.run(
+            client.calculate_velocity_many(distance=[1, 2], ra=1, dec=1)
+        )
+
+    assert len(threads) == 2
+    assert threading.main_thread() not in threads
+    assert len(tmp_cache) == 2
+
+
+def test_async_warm(async_fakeclient_class, tmp_cache, async_echo_request):
+    client = async_fakeclient_class(cache=tmp_cache)
+
+    async def request(method, url, **kwargs):
+        if kwargs["json"]["value"] == 2:
+            return httpx.Response(
+                500, content=b"", request=httpx.Request(method, url)
+            )
+        return await async_echo_request(method, url, **kwargs)
+
+    with mock.patch("httpx.AsyncClient.request", side_effect=request) as req:
+        report = asyncio.run(
+            client.warm(
+                distance=[1, 2, 3], ra=[10, 20], dec=[0, 95], workers=2
+            )
+        )
+        assert report == (6, 0, 3, 0, 2, 1)
+        assert req.call_count == 3
+
+        report = asyncio.run(client.warm(distance=[1, 3], ra=10, dec=0))
+
+    assert report == (2, 0, 0, 2, 0, 0)
+    assert req.call_count == 3
+    assert len(tmp_cache) == 2
+
+
+def test_async_stale_while_revalidate(
+    async_fakeclient_class, tmp_cache, async_echo_request
+):
+    client = async_fakeclient_class(
+        cache=tmp_cache, cache_expire=60, stale_grace=600
+    )
+
+    async def run():
+        await client.calculate_velocity(distance=1, ra=1, dec=1)
+        for key in list(tmp_cache):
+            response, stored_at = pycf3._unpack_response(tmp_cache[key], "")
+            tmp_cache[key] = pycf3._pack_response(response, stored_at - 120)
+
+        stale = await client.calculate_velocity(distance=1, ra=1, dec=1)
+        await asyncio.gather(*client._refreshing.values())
+        fresh = await client.calculate_velocity(distance=1, ra=1, dec=1)
+        return stale, fresh
+
+    with mock.patch(
+        "httpx.AsyncClient.request", side_effect=async_echo_request
+    ) as request:
+        stale, fresh = asyncio.run(run())
+
+    assert request.call_count == 2
+    assert stale.stale_ is True
+    assert fresh.stale_ is False
+
+
+def test_async_negative_cache(async_fakeclient_class, tmp_cache):
+    client = async_fakeclient_class(cache=tmp_cache, negative_cache_expire=60)
+    aresponse = httpx.Response(
+        500, content=b"", request=httpx.Request("GET", pycf3.NAM.URL)
+    )
+
+    with mock.patch(
+        "httpx.AsyncClient.request", return_value=aresponse
+    ) as request:
+        for _ in range(2):
+            with pytest.raises(requests.HTTPError, match="500 Server Error"):
+                asyncio.run(
+                    client.calculate_distance(velocity=10, ra=1, dec=1)
+                )
+
+    request.assert_called_once()
+
+
+def test_async_negative_cache_many_mask(
+    async_fakeclient_class, tmp_cache, async_echo_request
+):
+    client = async_fakeclient_class(cache=tmp_cache, negative_cache_expire=60)
+
+    async def request(method, url, **kwargs):
+        if kwargs["json"]["value"] == 2:
+            return httpx.Response(
+                500, content=b"", request=httpx.Request(method, url)
+            )
+        return await async_echo_request(method, url, **kwargs)
+
+    with mock.patch("httpx.AsyncClient.request", side_effect=request) as req:
+        for _ in range(2):
+            rset = asyncio.run(
+                client.calculate_velocity_many(
+                    distance=[1, 2], ra=1, dec=1, errors="mask"
+                )
+            )
+            npt.assert_array_equal(
+                rset.errors_,
+                [pycf3.RowError.NONE, pycf3.RowError.CALCULATOR_ERROR],
+            )
+
+    assert req.call_count == 2
+
+
+def test_async_fetch_many_stores_siblings(
+    async_fakeclient_class, tmp_cache, async_echo_request
+):
+    client = async_fakeclient_class(cache=tmp_cache)
+
+    async def request(method, url, **kwargs):
+        if kwargs["json"]["value"] == 2:
+            return httpx.Response(
+                500, content=b"", request=httpx.Request(method, url)
+            )
+        await asyncio.sleep(0.05)
+        return await async_echo_request(method, url, **kwargs)
+
+    with mock.patch("httpx.AsyncClient.request", side_effect=request):
+        with pytest.raises(requests.HTTPError):
+            asyncio.run(
+                client.calculate_velocity_many(distance=[1, 2, 3], ra=1, dec=1)
+            )
+
+    # the slower successful siblings are stored too
+    assert len(tmp_cache) == 2
@@ -0,0 +1,820 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2019, Juan B Cabral
+# License: BSD-3-Clause
+#   Full Text: https://github.com/quatrope/pycf3/blob/master/LICENSE
+
+
+# =============================================================================
+# DOCS
+# =============================================================================
+
+"""Test for the batch API of all the clients
+
+"""
+
+
+# =============================================================================
+# IMPORTS
+# =============================================================================
+
+import multiprocessing as mp
+import os
+import pickle
+import random
+import threading
+import time
+from unittest import mock
+
+import diskcache as dcache
+
+import numpy as np
+from numpy import testing as npt
+
+import pycf3
+
+import pytest
+
+import requests
+
+
+# =============================================================================
+# CALCULATE MANY
+# =============================================================================
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        {"ra": [187.78917, 187.78917], "dec": [13.33386, 13.33386]},
+        {"glon": [282.96547, 282.96547], "glat": [75.4136, 75.4136]},
+        {"sgl": np.array([102.0, 102.0]), "sgb": np.array([-2.0, -2.0])},
+    ],
+)
+def test_calculate_velocity_many(params, fakeclient_no_cache, load_mresponse):
+    client = fakeclient_no_cache
+
+    mresponse = load_mresponse("cf3", "tcEquatorial_distance_10.pkl")
+    with mock.patch("requests.Session.get", return_value=mresponse) as get:
+        rset = client.calculate_velocity_many(distance=[10, 10], **params)
+
+    assert get.call_count == 1
+    assert rset.duplicates_ == 1
+    assert isinstance(rset, pycf3.ResultSet)
+    assert len(rset) == 2
+    assert rset.calculator == "fake"
+    assert rset.calculated_by == pycf3.Parameter.distance
+
+    for result in rset:
+        assert result.distance == 10
+        assert result.velocity is None
+        npt.assert_almost_equal(
+            result.observed_velocity_, 730.4691399179898, decimal=4
+        )
+
+
+def test_calculate_distance_many(fakeclient_no_cache, load_mresponse):
+    client = fakeclient_no_cache
+
+    mresponse = load_mresponse("cf3", "tcEquatorial_velocity_10.pkl")
+    with mock.patch("requests.Session.get", return_value=mresponse) as get:
+        rset = client.calculate_distance_many(
+            velocity=10, ra=[187.78917, 187.78917], dec=13.33386
+        )
+
+    assert get.call_count == 1
+    assert len(rset) == 2
+    assert rset.calculated_by == pycf3.Parameter.velocity
+    assert rset.coordinate == pycf3.CoordinateSystem.equatorial
+    assert [r.velocity for r in rset] == [10.0, 10.0]
+    assert [r.alpha for r in rset] == [187.78917, 187.78917]
+    assert repr(rset)
+
+
+def test_calculate_velocity_many_only_fetch_misses(
+    fakeclient_temp_cache, load_mresponse
+):
+    client = fakeclient_temp_cache
+
+    mresponse = load_mresponse("cf3", "tcEquatorial_distance_10.pkl")
+    with mock.patch("requests.Session.get", return_value=mresponse) as get:
+        client.calculate_velocity(ra=187.78917, dec=13.33386, distance=10)
+        client.calculate_velocity_many(
+            ra=[187.78917, 10], dec=[13.33386, 10], distance=10
+        )
+
+    assert get.call_count == 2
+    assert len(client.cache) == 2
+
+
+def test_calculate_velocity_many_not_number(fakeclient_no_cache):
+    client = fakeclient_no_cache
+    with pytest.raises(TypeError):
+        client.calculate_velocity_many(distance=["invalid"], ra=1, dec=1)
+    with pytest.raises(TypeError):
+        client.calculate_velocity_many(distance=10, ra=["invalid"], dec=1)
+
+
+@pytest.mark.parametrize("dec", [[1, 91], [-91, 1], [1, np.nan]])
+def test_calculate_velocity_many_delta_out_of_range(dec, fakeclient_no_cache):
+    client = fakeclient_no_cache
+    with pytest.raises(ValueError, match="dec must be >= -90 and <= 90"):
+        client.calculate_velocity_many(distance=10, ra=1, dec=dec)
+
+
+@pytest.mark.parametrize("distance", [[1, 0], [-1, 1], [np.nan, 1]])
+def test_calculate_velocity_many_distance_out_of_range(
+    distance, fakeclient_no_cache
+):
+    client = fakeclient_no_cache
+    with pytest.raises(ValueError, match="'distance' must be > 0"):
+        client.calculate_velocity_many(distance=distance, ra=1, dec=1)
+
+
+def test_calculate_velocity_many_different_lengths(fakeclient_no_cache):
+    client = fakeclient_no_cache
+    with pytest.raises(ValueError, match="same length"):
+        client.calculate_velocity_many(distance=[1, 2, 3], ra=[1, 2], dec=1)
+
+
+def test_calculate_velocity_many_mix_coordinate_system(fakeclient_no_cache):
+    client = fakeclient_no_cache
+    with pytest.raises(pycf3.MixedCoordinateSystemError):
+        client.calculate_velocity_many(distance=[1], ra=[1], glat=[1])
+
+
+# =============================================================================
+# RESULT SET
+# =============================================================================
+
+
+def test_result_set_columns(fakeclient_no_cache, load_mresponse):
+    client = fakeclient_no_cache
+
+    mresponse = load_mresponse("cf3", "tcEquatorial_distance_10.pkl")
+    with mock.patch("requests.Session.get", return_value=mresponse):
+        rset = client.calculate_velocity_many(
+            distance=[10, 20, 30], ra=187.78917, dec=13.33386
+        )
+
+    npt.assert_array_equal(rset.distance, [10, 20, 30])
+    assert rset.velocity is None
+    npt.assert_array_equal(rset.alpha, [187.78917] * 3)
+    npt.assert_almost_equal(rset.observed_velocity_, [730.46913992] * 3)
+    npt.assert_almost_equal(rset.adjusted_velocity_, [731.89021822] * 3)
+    npt.assert_array_equal(rset.observed_distance_.values, [10.0] * 3)
+    npt.assert_array_equal(rset.observed_distance_.offsets, [0, 1, 2, 3])
+    npt.assert_almost_equal(rset.calculated_at_.sgl, [102.0] * 3, decimal=4)
+    assert rset.calculated_at_.ra.dtype == float
+    assert rset.nbytes < 200 * len(rset)
+
+
+def test_result_set_row_view(fakeclient_no_cache, load_mresponse):
+    client = fakeclient_no_cache
+
+    mresponse = load_mresponse("cf3", "tcEquatorial_distance_10.pkl")
+    with mock.patch("requests.Session.get", return_value=mresponse):
+        rset = client.calculate_velocity_many(
+            distance=[10, 20], ra=187.78917, dec=13.33386
+        )
+        expected = client.calculate_velocity(
+            distance=20, ra=187.78917, dec=13.33386
+        )
+
+    row = rset[-1]
+    assert isinstance(row, pycf3.ResultView)
+    assert row.distance == expected.distance
+    assert row.velocity is expected.velocity
+    assert row.alpha == expected.alpha
+    assert row.calculated_at_ == expected.calculated_at_
+    assert row.observed_velocity_ == expected.observed_velocity_
+    assert row.adjusted_velocity_ == expected.adjusted_velocity_
+    npt.assert_array_equal(row.observed_distance_, expected.observed_distance_)
+    npt.assert_array_equal(row.adjusted_distance_, expected.adjusted_distance_)
+    assert repr(row).splitlines()[1:] == repr(expected).splitlines()[1:]
+
+    with pytest.raises(IndexError):
+        rset[2]
+
+
+def test_result_set_without_adjusted(load_mresponse):
+    mresponse = load_mresponse("nam", "tcEquatorial_distance_10.pkl")
+    rset = pycf3.ResultSet.from_json(
+        calculator="NAM",
+        url=pycf3.NAM.URL,
+        coordinate=pycf3.CoordinateSystem.equatorial,
+        calculated_by=pycf3.Parameter.distance,
+        alpha=[187.78917],
+        delta=[13.33386],
+        value=[10],
+        jsons=[mresponse.json()],
+    )
+
+    assert np.isnan(rset.adjusted_velocity_[0])
+    assert len(rset.adjusted_distance_[0]) == 0
+    assert rset[0].adjusted_velocity_ is None
+    assert rset[0].adjusted_distance_ is None
+    npt.assert_almost_equal(rset[0].observed_velocity_, 1135.71914882)
+
+
+def test_result_set_slice_is_a_view(fakeclient_no_cache, load_mresponse):
+    client = fakeclient_no_cache
+
+    mresponse = load_mresponse("cf3", "tcEquatorial_distance_10.pkl")
+    with mock.patch("requests.Session.get", return_value=mresponse):
+        rset = client.calculate_velocity_many(
+            distance=[10, 20, 30, 40], ra=187.78917, dec=13.33386
+        )
+
+    sliced = rset[1:3]
+    assert isinstance(sliced, pycf3.ResultSet)
+    assert len(sliced) == 2
+    npt.assert_array_equal(sliced.distance, [20, 30])
+    assert np.shares_memory(sliced.distance, rset.distance)
+    assert np.shares_memory(sliced.calculated_at_.ra, rset.calculated_at_.ra)
+    assert (
+        sliced.observed_distance_.values is rset.observed_distance_.values
+    )
+    npt.assert_array_equal(sliced[0].observed_distance_, [10.0])
+
+    picked = rset[[3, 0]]
+    npt.assert_array_equal(picked.distance, [40, 10])
+    assert len(picked.observed_distance_) == 2
+
+
+def test_ragged_array():
+    ragged = pycf3.RaggedArray.from_sequences([[1, 2], [], [3]])
+
+    assert len(ragged) == 3
+    npt.assert_array_equal(ragged[0], [1, 2])
+    npt.assert_array_equal(ragged[1], [])
+    npt.assert_array_equal(ragged[-1], [3])
+    npt.assert_array_equal(ragged[1:].offsets, [2, 2, 3])
+    npt.assert_array_equal(ragged[::-1].values, [3, 1, 2])
+    assert [list(r) for r in ragged] == [[1, 2], [], [3]]
+    assert repr(ragged) == "<RaggedArray - 3 rows>"
+    with pytest.raises(IndexError):
+        ragged[3]
+
+
+# =============================================================================
+# VALIDATION
+# =============================================================================
+
+
+def test_validate_many(fakeclient_class, no_cache):
+    class Bounded(fakeclient_class):
+        MAX_DISTANCE = 200
+
+    client = Bounded(cache=no_cache)
+
+    valid, errors = client.validate_many(
+        distance=[10, 0, 300, np.nan, 10, 10, 10],
+        ra=[1, 1, 1, 1, np.nan, 1, np.inf],
+        dec=[1, 1, 1, 1, 1, 91, np.nan],
+    )
+
+    npt.assert_array_equal(valid, [True] + [False] * 6)
+    npt.assert_array_equal(
+        errors,
+        [
+            pycf3.RowError.NONE,
+            pycf3.RowError.VALUE_NOT_POSITIVE,
+            pycf3.RowError.VALUE_OUT_OF_RANGE,
+            pycf3.RowError.VALUE_NAN,
+            pycf3.RowError.ALPHA_NAN,
+            pycf3.RowError.DELTA_OUT_OF_RANGE,
+            pycf3.RowError.ALPHA_NAN | pycf3.RowError.DELTA_NAN,
+        ],
+    )
+
+
+def test_validate_many_without_value(fakeclient_no_cache):
+    client = fakeclient_no_cache
+    with pytest.raises(ValueError):
+        client.validate_many(ra=[1], dec=[1])
+    with pytest.raises(ValueError):
+        client.validate_many(distance=[1], velocity=[1], ra=[1], dec=[1])
+
+
+def test_calculate_velocity_many_mask_errors(
+    fakeclient_no_cache, load_mresponse
+):
+    client = fakeclient_no_cache
+
+    mresponse = load_mresponse("cf3", "tcEquatorial_distance_10.pkl")
+    with mock.patch("requests.Session.get", return_value=mresponse) as get:
+        rset = client.calculate_velocity_many(
+            distance=[10, -1, 10],
+            ra=187.78917,
+            dec=[13.33386, 13.33386, 95],
+            errors="mask",
+        )
+
+    assert get.call_count == 1
+    npt.assert_array_equal(rset.valid_, [True, False, False])
+    npt.assert_array_equal(
+        rset.errors_,
+        [
+            pycf3.RowError.NONE,
+            pycf3.RowError.VALUE_NOT_POSITIVE,
+            pycf3.RowError.DELTA_OUT_OF_RANGE,
+        ],
+    )
+    npt.assert_almost_equal(rset.observed_velocity_[0], 730.46913992)
+    assert np.isnan(rset.observed_velocity_[1:]).all()
+    assert np.isnan(rset.calculated_at_.ra[1:]).all()
+    assert len(rset.observed_distance_[1]) == 0
+    assert rset[1].error_ == pycf3.RowError.VALUE_NOT_POSITIVE
+    assert rset[0].error_ == pycf3.RowError.NONE
+    npt.assert_array_equal(rset[1:].valid_, [False, False])
+
+
+def test_calculate_velocity_many_invalid_errors_mode(fakeclient_no_cache):
+    client = fakeclient_no_cache
+    with pytest.raises(ValueError, match="errors must be"):
+        client.calculate_velocity_many(
+            distance=[10], ra=1, dec=1, errors="ignore"
+        )
+
+
+# =============================================================================
+# TABLES
+# =============================================================================
+
+
+def test_calculate_velocity_many_structured_array(
+    fakeclient_no_cache, load_mresponse
+):
+    client = fakeclient_no_cache
+    table = np.array(
+        [(187.78917, 13.33386, 10.0), (187.78917, 13.33386, 20.0)],
+        dtype=[("RA", float), ("Dec", float), ("dist", float)],
+    )
+
+    mresponse = load_mresponse("cf3", "tcEquatorial_distance_10.pkl")
+    with mock.patch("requests.Session.get", return_value=mresponse):
+        rset = client.calculate_velocity_many("dist", data=table)
+
+    assert rset.coordinate == pycf3.CoordinateSystem.equatorial
+    npt.assert_array_equal(rset.distance, [10, 20])
+    assert np.shares_memory(rset.alpha, table)
+    assert np.shares_memory(rset.distance, table)
+
+
+def test_calculate_distance_many_dict_of_arrays(
+    fakeclient_no_cache, load_mresponse
+):
+    client = fakeclient_no_cache
+    table = {
+        "sgl": np.array([102.0, 102.0]),
+        "sgb": np.array([-2.0, -2.0]),
+        "v": np.array([10.0, 10.0]),
+        "other": ["foo", "bar"],
+    }
+
+    mresponse = load_mresponse("cf3", "tcSuperGalactic_velocity_10.pkl")
+    with mock.patch("requests.Session.get", return_value=mresponse):
+        rset = client.calculate_distance_many("v", data=table)
+
+    assert rset.coordinate == pycf3.CoordinateSystem.supergalactic
+    assert np.shares_memory(rset.alpha, table["sgl"])
+    assert np.shares_memory(rset.velocity, table["v"])
+
+
+def test_calculate_velocity_many_dataframe(
+    fakeclient_no_cache, load_mresponse
+):
+    pd = pytest.importorskip("pandas")
+    client = fakeclient_no_cache
+    df = pd.DataFrame({"glon": [282.96547, 1.0], "glat": [75.4136, 1.0]})
+
+    mresponse = load_mresponse("cf3", "tcGalactic_distance_10.pkl")
+    with mock.patch("requests.Session.get", return_value=mresponse):
+        rset = client.calculate_velocity_many(10, data=df)
+
+    assert rset.coordinate == pycf3.CoordinateSystem.galactic
+    npt.assert_array_equal(rset.alpha, df.glon)
+    npt.assert_array_equal(rset.distance, [10, 10])
+
+
+def test_calculate_velocity_many_table_explicit_columns(
+    fakeclient_no_cache, load_mresponse
+):
+    client = fakeclient_no_cache
+    table = {
+        "ra": [187.78917],
+        "dec": [13.33386],
+        "l": [282.96547],
+        "b": [75.4136],
+        "distance": [10],
+    }
+
+    mresponse = load_mresponse("cf3", "tcGalactic_distance_10.pkl")
+    with mock.patch("requests.Session.get", return_value=mresponse):
+        rset = client.calculate_velocity_many(
+            "distance", glon="l", glat="b", data=table
+        )
+
+    assert rset.coordinate == pycf3.CoordinateSystem.galactic
+    npt.assert_array_equal(rset.alpha, [282.96547])
+
+
+def test_calculate_velocity_many_table_ambiguous(fakeclient_no_cache):
+    client = fakeclient_no_cache
+    table = {"ra": [1], "dec": [1], "glon": [1], "glat": [1]}
+    with pytest.raises(pycf3.MixedCoordinateSystemError):
+        client.calculate_velocity_many(10, data=table)
+
+
+def test_calculate_velocity_many_table_missing_column(fakeclient_no_cache):
+    client = fakeclient_no_cache
+    with pytest.raises(KeyError, match="'distance'"):
+        client.calculate_velocity_many("distance", data={"ra": [1]})
+    with pytest.raises(ValueError, match="No dec provided"):
+        client.calculate_velocity_many(10, data={"ra": [1]})
+    with pytest.raises(TypeError):
+        client.calculate_velocity_many(10, data=[1, 2, 3])
+
+
+# =============================================================================
+# WORKERS
+# =============================================================================
+
+
+def test_calculate_velocity_many_workers_keep_order(
+    fakeclient_no_cache, echo_get
+):
+    client = fakeclient_no_cache
+    distances = np.arange(1, 41, dtype=float)
+
+    def slow_get(url, **kwargs):
+        time.sleep(random.random() / 100)
+        return echo_get(url, **kwargs)
+
+    with mock.patch("requests.Session.get", side_effect=slow_get) as get:
+        rset = client.calculate_velocity_many(
+            distance=distances, ra=1, dec=1, workers=16
+        )
+
+    assert get.call_count == 40
+    npt.assert_array_equal(rset.observed_velocity_, distances)
+    assert client.session.pool_size_ == 16
+
+
+def test_calculate_velocity_many_workers_cache(
+    fakeclient_temp_cache, echo_get
+):
+    client = fakeclient_temp_cache
+
+    with mock.patch("requests.Session.get", side_effect=echo_get) as get:
+        client.calculate_velocity_many(distance=[1, 2], ra=1, dec=1)
+        rset = client.calculate_velocity_many(
+            distance=[1, 2, 3, 4], ra=1, dec=1, workers=4
+        )
+
+    assert get.call_count == 4
+    assert len(client.cache) == 4
+    npt.assert_array_equal(rset.observed_velocity_, [1, 2, 3, 4])
+
+
+def test_calculate_velocity_many_invalid_workers(fakeclient_no_cache):
+    client = fakeclient_no_cache
+    with pytest.raises(ValueError, match="workers must be >= 1"):
+        client.calculate_velocity_many(distance=[1], ra=1, dec=1, workers=0)
+
+
+def test_retry_session_resize_pool():
+    session = pycf3.RetrySession(pool_size=2)
+    adapter = session.adapter_
+    assert session.pool_size_ == 2
+
+    session.resize_pool(2)
+    assert session.adapter_ is adapter
+
+    session.resize_pool(16)
+    assert session.pool_size_ == 16
+    assert session.adapter_ is not adapter
+    assert session.adapter_._pool_maxsize == 16
+    assert session.get_adapter("https://foo") is session.adapter_
+    assert session.adapter_.max_retries is session.retry_
+
+
+# =============================================================================
+# DEDUPLICATION
+# =============================================================================
+
+
+def test_calculate_velocity_many_deduplicate(fakeclient_temp_cache, echo_get):
+    client = fakeclient_temp_cache
+
+    with mock.patch("requests.Session.get", side_effect=echo_get) as get:
+        rset = client.calculate_velocity_many(
+            distance=[1, 2, 1, 3, 2, 1, 50],
+            ra=[10, 10, 10, 10, 10, 10, 10],
+            dec=[5, 5, 5, 5, 5, 5, 95],
+            errors="mask",
+            workers=4,
+        )
+
+    assert get.call_count == 3
+    assert len(client.cache) == 3
+    assert rset.duplicates_ == 3
+    npt.assert_array_equal(
+        rset.duplicated_, [False, False, True, False, True, True, False]
+    )
+    npt.assert_array_equal(rset.observed_velocity_[:-1], [1, 2, 1, 3, 2, 1])
+    assert np.isnan(rset.observed_velocity_[-1])
+    assert rset[2:].duplicates_ == 3
+    assert rset[:2].duplicates_ == 0
+
+
+def test_calculate_velocity_many_same_value_other_position(
+    fakeclient_no_cache, echo_get
+):
+    client = fakeclient_no_cache
+
+    with mock.patch("requests.Session.get", side_effect=echo_get) as get:
+        rset = client.calculate_velocity_many(
+            distance=[1, 1], ra=[10, 11], dec=5
+        )
+
+    assert get.call_count == 2
+    assert rset.duplicates_ == 0
+    npt.assert_array_equal(rset.calculated_at_.ra, [10, 11])
+
+
+# =============================================================================
+# ITER CALCULATE
+# =============================================================================
+
+
+def make_rows(size, consumed):
+    for idx in range(1, size + 1):
+        consumed.append(idx)
+        if idx % 2:
+            yield {"distance": idx, "ra": 1, "dec": 1}
+        else:
+            yield {"velocity": idx, "sgl": 1, "sgb": 1}
+
+
+def test_iter_calculate_serial(fakeclient_no_cache, echo_get):
+    client = fakeclient_no_cache
+    consumed = []
+
+    with mock.patch("requests.Session.get", side_effect=echo_get):
+        results = client.iter_calculate(make_rows(5, consumed))
+        first = next(results)
+        assert consumed == [1]
+        results = [first] + list(results)
+
+    assert [r.observed_velocity_ for r in results] == [1, 2, 3, 4, 5]
+    assert results[0].calculated_by == pycf3.Parameter.distance
+    assert results[1].calculated_by == pycf3.Parameter.velocity
+    assert results[1].coordinate == pycf3.CoordinateSystem.supergalactic
+
+
+@pytest.mark.parametrize("ordered", [True, False])
+def test_iter_calculate_workers_bounded_window(
+    ordered, fakeclient_no_cache, echo_get
+):
+    client = fakeclient_no_cache
+    consumed = []
+    state = {"in_flight": 0, "max_in_flight": 0}
+    lock = threading.Lock()
+
+    def slow_get(url, **kwargs):
+        with lock:
+            state["in_flight"] += 1
+            state["max_in_flight"] = max(
+                state["max_in_flight"], state["in_flight"]
+            )
+        time.sleep(random.random() / 50)
+        with lock:
+            state["in_flight"] -= 1
+        return echo_get(url, **kwargs)
+
+    with mock.patch("requests.Session.get", side_effect=slow_get):
+        results = client.iter_calculate(
+            make_rows(40, consumed), ordered=ordered, workers=4, window=6
+        )
+        first = next(results)
+        assert len(consumed) <= 6
+        values = [first.observed_velocity_] + [
+            r.observed_velocity_ for r in results
+        ]
+
+    assert state["max_in_flight"] <= 4
+    if ordered:
+        assert values == list(range(1, 41))
+    else:
+        assert sorted(values) == list(range(1, 41))
+
+
+def test_iter_calculate_invalid_row(fakeclient_no_cache, echo_get):
+    client = fakeclient_no_cache
+    rows = [{"distance": 1, "ra": 1, "dec": 1}, {"distance": 1, "ra": 1}]
+
+    with mock.patch("requests.Session.get", side_effect=echo_get):
+        results = client.iter_calculate(rows, workers=2)
+        assert next(results).observed_velocity_ == 1
+        with pytest.raises(ValueError, match="No dec provided"):
+            next(results)
+
+    with pytest.raises(TypeError):
+        list(client.iter_calculate([{"distance": 1, "foo": 1}]))
+    with pytest.raises(ValueError):
+        list(client.iter_calculate([], window=0))
+
+
+# =============================================================================
+# CATALOG RUNNER
+# =============================================================================
+
+
+fork_only = pytest.mark.skipif(
+    "fork" not in mp.get_all_start_methods(),
+    reason="the mocked session is only inherited by forked workers",
+)
+
+
+def test_ragged_array_concatenate():
+    ragged = pycf3.RaggedArray.from_sequences([[1], [2, 3], [], [4, 5, 6]])
+
+    joined = pycf3.RaggedArray.concatenate([ragged[2:], ragged[:2]])
+
+    assert len(joined) == 4
+    assert [list(row) for row in joined] == [[], [4, 5, 6], [1], [2, 3]]
+    npt.assert_array_equal(joined.offsets, [0, 0, 3, 4, 6])
+    assert len(pycf3.RaggedArray.concatenate([])) == 0
+
+
+def test_result_set_concatenate(fakeclient_no_cache, echo_get):
+    client = fakeclient_no_cache
+    with mock.patch("requests.Session.get", side_effect=echo_get):
+        rset = client.calculate_velocity_many(
+            distance=[1, 2, 3, 4, 5], ra=1, dec=1
+        )
+        other = client.calculate_distance_many(velocity=[1], ra=1, dec=1)
+
+    joined = pycf3.ResultSet.concatenate([rset[3:], rset[:3]])
+
+    assert len(joined) == 5
+    assert joined.velocity is None
+    npt.assert_array_equal(joined.distance, [4, 5, 1, 2, 3])
+    npt.assert_array_equal(joined.observed_velocity_, [4, 5, 1, 2, 3])
+    npt.assert_array_equal(joined.calculated_at_.ra, [1] * 5)
+    assert list(joined[1].observed_distance_) == [5]
+
+    with pytest.raises(ValueError):
+        pycf3.ResultSet.concatenate([rset, other])
+    with pytest.raises(ValueError):
+        pycf3.ResultSet.concatenate([])
+
+
+@fork_only
+@pytest.mark.parametrize("shared_cache", [True, False])
+def test_catalog_runner(tmp_path, echo_get, shared_cache):
+    runner = pycf3.CatalogRunner(
+        pycf3.CF3,
+        processes=2,
+        chunksize=3,
+        cache_dir=str(tmp_path),
+        shared_cache=shared_cache,
+        workers=2,
+        mp_context=mp.get_context("fork"),
+    )
+    distances = np.arange(1, 11, dtype=float)
+
+    with mock.patch("requests.Session.get", side_effect=echo_get):
+        rset = runner.calculate_velocity_many(
+            distance=distances, ra=distances, dec=1
+        )
+
+    assert len(rset) == 10
+    assert rset.calculator == "CF3"
+    npt.assert_array_equal(rset.observed_velocity_, distances)
+    npt.assert_array_equal(rset.calculated_at_.ra, distances)
+
+    if shared_cache:
+        cache = dcache.FanoutCache(directory=str(tmp_path), shards=2)
+    else:
+        assert sorted(os.listdir(tmp_path)) == ["shard-000", "shard-001"]
+        cache = dcache.Cache(directory=str(tmp_path / "shard-001"))
+    with cache:
+        assert len(cache) == (10 if shared_cache else 4)
+
+
+@fork_only
+def test_catalog_runner_table_and_mask(echo_get):
+    runner = pycf3.CatalogRunner(
+        pycf3.NAM, processes=2, chunksize=2, mp_context=mp.get_context("fork")
+    )
+    data = {"Velocity": [100, -1, 200], "glon": [1, 2, 3], "glat": [4, 5, 6]}
+
+    with mock.patch("requests.Session.get", side_effect=echo_get):
+        rset = runner.calculate_distance_many(
+            "velocity", data=data, errors="mask"
+        )
+
+    assert rset.coordinate == pycf3.CoordinateSystem.galactic
+    npt.assert_array_equal(rset.valid_, [True, False, True])
+    npt.assert_array_equal(rset.observed_velocity_[rset.valid_], [100, 200])
+
+
+def test_catalog_runner_pickle(echo_get):
+    runner = pycf3.CatalogRunner(
+        pycf3.CF3,
+        processes=1,
+        client_kwargs={
+            "memory_cache": pycf3.MemoryCache(max_entries=10),
+            "expire_policy": pycf3.CountExpire(every=5),
+        },
+    )
+    timer = pycf3.TimerExpire(interval=30)
+    timer.maybe_expire(pycf3.NoCache())
+
+    clone = pickle.loads(pickle.dumps(runner))
+    clone_timer = pickle.loads(pickle.dumps(timer))
+    timer.stop()
+
+    assert clone.client_kwargs["memory_cache"].max_entries == 10
+    assert clone.client_kwargs["expire_policy"].every == 5
+    assert clone_timer.interval == 30
+    assert not clone_timer.running
+
+    with mock.patch("requests.Session.get", side_effect=echo_get):
+        rset = clone.calculate_velocity_many(distance=[1, 2], ra=1, dec=1)
+    npt.assert_array_equal(rset.observed_velocity_, [1, 2])
+
+
+@fork_only
+@pytest.mark.parametrize("errors", ["raise", "mask"])
+def test_catalog_runner_calculator_error(errors):
+    runner = pycf3.CatalogRunner(
+        pycf3.CF3, processes=2, chunksize=1, mp_context=mp.get_context("fork")
+    )
+    response = requests.Response()
+    response.status_code = 500
+    response.url = pycf3.CF3.URL
+
+    with mock.patch("requests.Session.get", return_value=response):
+        if errors == "raise":
+            with pytest.raises(requests.HTTPError):
+                runner.calculate_velocity_many(
+                    distance=[1, 2], ra=1, dec=1, errors=errors
+                )
+        else:
+            rset = runner.calculate_velocity_many(
+                distance=[1, 2], ra=1, dec=1, errors=errors
+            )
+            npt.assert_array_equal(
+                rset.errors_, [pycf3.RowError.CALCULATOR_ERROR] * 2
+            )
+
+
+def test_catalog_runner_invalid():
+    with pytest.raises(TypeError):
+        pycf3.CatalogRunner(dict)
+    with pytest.raises(ValueError, match="processes must be >= 1"):
+        pycf3.CatalogRunner(pycf3.CF3, processes=0)
+    with pytest.raises(ValueError, match="chunksize must be >= 1"):
+        pycf3.CatalogRunner(pycf3.CF3, chunksize=0)
+
+    runner = pycf3.CatalogRunner(pycf3.CF3, processes=1)
+    with mock.patch("requests.Session.get") as get:
+        with pytest.raises(ValueError, match="'distance' must be > 0"):
+            runner.calculate_velocity_many(distance=[1, -1], ra=1, dec=1)
+    get.assert_not_called()
+
+
+# =============================================================================
+# QUANTIZATION
+# =============================================================================
+
+
+def test_calculate_velocity_many_quantization(fakeclient_class, echo_get):
+    client = fakeclient_class(
+        cache=pycf3.NoCache(), quantization=pycf3.Quantization()
+    )
+
+    with mock.patch("requests.Session.get", side_effect=echo_get) as get:
+        rset = client.calculate_velocity_many(
+            distance=[10, 10.001, 12, -1],
+            ra=[187.78917, 187.789170000001, 1, 1],
+            dec=13.33386,
+            errors="mask",
+        )
+
+    assert get.call_count == 2
+    npt.assert_array_equal(rset.duplicated_, [False, True, False, False])
+    npt.assert_array_equal(rset.distance[:3], [10, 10.001, 12])
+    npt.assert_array_equal(rset.quantized_.value[:3], [10, 10, 12])
+    npt.assert_array_equal(rset.quantized_.alpha[:3], [187.7892, 187.7892, 1])
+
+    assert rset[1].alpha == 187.789170000001
+    assert rset[1].quantized_ == (187.7892, 13.3339, 10.0)
+    assert rset[1:].quantized_.value[0] == 10.0
+    joined = pycf3.ResultSet.concatenate([rset[:2], rset[2:]])
+    npt.assert_array_equal(joined.quantized_.value, rset.quantized_.value)
@@ -20,9 +20,23 @@ distances less than 400 Mpc (http://edd.ifa.hawaii.edu/CF3calculator/)
 # IMPORTS
 # =============================================================================
 
+import os
+import pickle
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from unittest import mock
 
+import diskcache as dcache
+
+import numpy as np
+
+import pycf3
+
+import pytest
+
+import requests
+
 
 # =============================================================================
 # CACHE TEST
@@ -81,3 +95,1570 @@ def test_cache_expire(fakeclient_class, tmp_cache, load_mresponse):
 
     assert get.call_count == 2
     assert len(cache) == 1
+
+
+# =============================================================================
+# SINGLE FLIGHT
+# =============================================================================
+
+
+def test_single_flight_coalesce_calls():
+    flight = pycf3.SingleFlight()
+    barrier = threading.Barrier(8)
+    calls = []
+
+    def function(value):
+        calls.append(value)
+        time.sleep(0.2)
+        return value * 2
+
+    def call():
+        barrier.wait()
+        return flight.do("key", function, 21)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda _: call(), range(8)))
+
+    assert calls == [21]
+    assert results == [42] * 8
+    assert len(flight) == 0
+
+
+def test_single_flight_share_exception():
+    flight = pycf3.SingleFlight()
+    barrier = threading.Barrier(4)
+
+    def function():
+        time.sleep(0.2)
+        raise ValueError("boom")
+
+    def call(_):
+        barrier.wait()
+        with pytest.raises(ValueError, match="boom"):
+            flight.do("key", function)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(call, range(4)))
+
+    assert len(flight) == 0
+
+
+def test_cache_concurrent_same_call(fakeclient_temp_cache, load_mresponse):
+    client = fakeclient_temp_cache
+    barrier = threading.Barrier(8)
+
+    mresponse = load_mresponse("cf3", "tcEquatorial_distance_10.pkl")
+
+    def slow_get(*args, **kwargs):
+        time.sleep(0.2)
+        return mresponse
+
+    def call(_):
+        barrier.wait()
+        return client.calculate_velocity(
+            ra=187.78917, dec=13.33386, distance=10
+        )
+
+    with mock.patch("requests.Session.get", side_effect=slow_get) as get:
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(call, range(8)))
+
+    get.assert_called_once()
+    assert len(client.cache) == 1
+    assert {r.observed_velocity_ for r in results} == {730.4691399179898}
+
+
+# =============================================================================
+# MEMORY CACHE
+# =============================================================================
+
+
+def test_memory_cache_lru_entries():
+    memory = pycf3.MemoryCache(max_entries=2)
+    memory.set("a", 1)
+    memory.set("b", 2)
+    assert memory.get("a") == 1
+
+    memory.set("c", 3)
+
+    assert len(memory) == 2
+    assert "b" not in memory
+    assert memory.get("a") == 1
+    assert memory.get("c") == 3
+    assert memory.get("b", default="missing") == "missing"
+
+
+def test_memory_cache_lru_bytes():
+    content = mock.Mock(content=b"x" * 10)
+    memory = pycf3.MemoryCache(max_entries=None, max_bytes=25)
+
+    memory.set("a", content)
+    memory.set("b", content)
+    assert memory.nbytes == 20
+
+    memory.set("c", content)
+    assert memory.nbytes == 20
+    assert "a" not in memory
+
+    assert memory.set("big", mock.Mock(content=b"x" * 26)) is False
+    assert "big" not in memory
+
+    memory.clear()
+    assert len(memory) == 0
+    assert memory.nbytes == 0
+
+
+def test_memory_cache_expire():
+    memory = pycf3.MemoryCache()
+    memory.set("a", 1, expire=0.1)
+    assert memory.get("a") == 1
+    time.sleep(0.2)
+    assert memory.get("a") is None
+    assert len(memory) == 0
+
+
+def test_memory_cache_invalid():
+    with pytest.raises(ValueError):
+        pycf3.MemoryCache(max_entries=None)
+    with pytest.raises(ValueError):
+        pycf3.MemoryCache(max_entries=0)
+    with pytest.raises(ValueError):
+        pycf3.MemoryCache(max_bytes=0)
+
+
+def test_memory_cache_client(fakeclient_class, tmp_cache, load_mresponse):
+    memory = pycf3.MemoryCache()
+    client = fakeclient_class(cache=tmp_cache, memory_cache=memory)
+
+    mresponse = load_mresponse("cf3", "tcEquatorial_distance_10.pkl")
+    with mock.patch("requests.Session.get", return_value=mresponse) as get:
+        client.calculate_velocity(ra=187.78917, dec=13.33386, distance=10)
+        assert len(memory) == 1
+        assert len(tmp_cache) == 1
+
+        # the second call is served from memory, without the disk
+        tmp_cache.clear()
+        result = client.calculate_velocity(
+            ra=187.78917, dec=13.33386, distance=10
+        )
+
+    get.assert_called_once()
+    assert result.observed_velocity_ == 730.4691399179898
+
+
+def test_memory_cache_promote_disk_hits(
+    fakeclient_class, tmp_cache, load_mresponse
+):
+    mresponse = load_mresponse("cf3", "tcEquatorial_distance_10.pkl")
+    with mock.patch("requests.Session.get", return_value=mresponse) as get:
+        fakeclient_class(cache=tmp_cache).calculate_velocity(
+            ra=187.78917, dec=13.33386, distance=10
+        )
+
+        memory = pycf3.MemoryCache()
+        client = fakeclient_class(cache=tmp_cache, memory_cache=memory)
+        client.calculate_velocity(ra=187.78917, dec=13.33386, distance=10)
+
+    get.assert_called_once()
+    assert len(memory) == 1
+
+
+def test_memory_cache_remaining_life(fakeclient_class, tmp_cache, echo_get):
+    with mock.patch("requests.Session.get", side_effect=echo_get) as get:
+        fakeclient_class(cache=tmp_cache, cache_expire=60).calculate_velocity(
+            ra=1, dec=1, distance=10
+        )
+        age_cache(tmp_cache, 50)
+
+        # the disk hit is copied to memory only for the 10 seconds left
+        memory = pycf3.MemoryCache()
+        client = fakeclient_class(
+            cache=tmp_cache, cache_expire=60, memory_cache=memory
+        )
+        client.calculate_velocity(ra=1, dec=1, distance=10)
+
+    get.assert_called_once()
+    ((_, _, expire_time),) = memory._data.values()
+    assert 9 < expire_time - time.time() <= 10
+
+
+# =============================================================================
+# EXPIRE POLICIES
+# =============================================================================
+
+
+def test_always_expire():
+    cache = mock.Mock()
+    policy = pycf3.AlwaysExpire()
+    for _ in range(3):
+        policy.maybe_expire(cache)
+    assert cache.expire.call_count == 3
+
+
+def test_lazy_expire():
+    cache = mock.Mock()
+    policy = pycf3.LazyExpire()
+    for _ in range(3):
+        policy.maybe_expire(cache)
+    cache.expire.assert_not_called()
+
+
+@pytest.mark.parametrize("every, expected", [(1, 7), (3, 3), (10, 1)])
+def test_count_expire(every, expected):
+    cache = mock.Mock()
+    policy = pycf3.CountExpire(every=every)
+    for _ in range(7):
+        policy.maybe_expire(cache)
+    assert cache.expire.call_count == expected
+
+
+def test_timer_expire():
+    cache = mock.MagicMock()
+    cache.__enter__.return_value = cache
+    policy = pycf3.TimerExpire(interval=0.05)
+
+    policy.maybe_expire(cache)
+    policy.maybe_expire(cache)
+    assert policy.running
+    time.sleep(0.3)
+    policy.stop()
+
+    assert not policy.running
+    assert cache.expire.call_count >= 3
+
+
+def test_expire_policy_invalid():
+    with pytest.raises(ValueError):
+        pycf3.CountExpire(every=0)
+    with pytest.raises(ValueError):
+        pycf3.TimerExpire(interval=0)
+    with pytest.raises(NotImplementedError):
+        pycf3.ExpirePolicy().maybe_expire(mock.Mock())
+
+
+def test_expire_policy_client(fakeclient_class, tmp_cache, load_mresponse):
+    client = fakeclient_class(
+        cache=tmp_cache, expire_policy=pycf3.CountExpire(every=2)
+    )
+
+    mresponse = load_mresponse("cf3", "tcEquatorial_distance_10.pkl")
+    with mock.patch(
+        "requests.Session.get", return_value=mresponse
+    ) as get, mock.patch.object(
+        type(tmp_cache), "expire", return_value=0
+    ) as expire:
+        for _ in range(5):
+            client.calculate_velocity(ra=187.78917, dec=13.33386, distance=10)
+
+    get.assert_called_once()
+    assert expire.call_count == 3
+
+
+# =============================================================================
+# CACHE RECORDS
+# =============================================================================
+
+
+def test_cache_compact_record(fakeclient_temp_cache, load_mresponse):
+    client = fakeclient_temp_cache
+
+    mresponse = load_mresponse("cf3", "tcEquatorial_distance_10.pkl")
+    with mock.patch("requests.Session.get", return_value=mresponse) as get:
+        fetched = client.calculate_velocity(
+            ra=187.78917, dec=13.33386, distance=10
+        )
+        cached = client.calculate_velocity(
+            ra=187.78917, dec=13.33386, distance=10
+        )
+
+    get.assert_called_once()
+    (key,) = list(client.cache)
+    record = client.cache[key]
+    assert isinstance(record, bytes)
+    assert record.startswith(b"PYCF3")
+    assert len(record) < len(pickle.dumps(mresponse)) / 5
+
+    assert cached.response_ is not fetched.response_
+    assert cached.response_.status_code == 200
+    assert cached.json_ == fetched.json_
+    assert cached.observed_velocity_ == fetched.observed_velocity_
+
+
+def test_cache_legacy_record(fakeclient_temp_cache, load_mresponse):
+    client = fakeclient_temp_cache
+
+    mresponse = load_mresponse("cf3", "tcEquatorial_distance_10.pkl")
+    with mock.patch("requests.Session.get", return_value=mresponse) as get:
+        client.calculate_velocity(ra=187.78917, dec=13.33386, distance=10)
+
+        # the entries of the old versions store the entire response
+        (key,) = list(client.cache)
+        client.cache[key] = mresponse
+        result = client.calculate_velocity(
+            ra=187.78917, dec=13.33386, distance=10
+        )
+
+    get.assert_called_once()
+    assert result.observed_velocity_ == 730.4691399179898
+
+
+def test_cache_unknown_record(fakeclient_temp_cache, load_mresponse):
+    client = fakeclient_temp_cache
+
+    mresponse = load_mresponse("cf3", "tcEquatorial_distance_10.pkl")
+    with mock.patch("requests.Session.get", return_value=mresponse) as get:
+        client.calculate_velocity(ra=187.78917, dec=13.33386, distance=10)
+
+        (key,) = list(client.cache)
+        client.cache[key] = b"PYCF3\xff" + client.cache[key][6:]
+        client.calculate_velocity(ra=187.78917, dec=13.33386, distance=10)
+
+    assert get.call_count == 2
+    assert client.cache[key].startswith(b"PYCF3\x01")
+
+
+# =============================================================================
+# CACHE KEYS
+# =============================================================================
+
+
+def test_cache_key(fakeclient_no_cache):
+    client = fakeclient_no_cache
+    system = pycf3.CoordinateSystem.equatorial
+    payload = client._build_payload(
+        system, pycf3.Parameter.distance, 187.78917, 13.33386, 10
+    )
+
+    key = client._cache_key(system, payload)
+
+    assert isinstance(key, bytes)
+    assert len(key) == 30
+    assert key == client._cache_key(system, dict(payload))
+    assert client._cache_tag(key) == "fake@equatorial"
+
+    other_payload = dict(payload, value=11.0)
+    assert key != client._cache_key(system, other_payload)
+    assert key != pycf3.CF3(cache=pycf3.NoCache())._cache_key(system, payload)
+
+
+def test_cache_key_tag(fakeclient_temp_cache, load_mresponse):
+    client = fakeclient_temp_cache
+
+    mresponse = load_mresponse("cf3", "tcEquatorial_distance_10.pkl")
+    with mock.patch("requests.Session.get", return_value=mresponse):
+        client.calculate_velocity(glon=10, glat=13.33386, distance=10)
+
+    (key,) = list(client.cache)
+    _, tag = client.cache.get(key, tag=True)
+    assert tag == "fake@galactic"
+
+
+def legacy_key(client, payload, coordinate_system):
+    # the keys used by the previous versions of pycf3
+    return dcache.core.args_to_key(
+        base=(client.CALCULATOR, coordinate_system.value),
+        args=(client.URL,),
+        kwargs=payload,
+        typed=False,
+        ignore=[],
+    )
+
+
+def test_cache_legacy_key_not_looked_up(fakeclient_class, tmp_cache, echo_get):
+    client = fakeclient_class(cache=tmp_cache)
+    with mock.patch("requests.Session.get", side_effect=echo_get) as get:
+        client.calculate_velocity(ra=1, dec=1, distance=10)
+        (key,) = list(tmp_cache)
+        payload = client._build_payload(
+            pycf3.CoordinateSystem.equatorial,
+            pycf3.Parameter.distance,
+            1,
+            1,
+            10,
+        )
+        tmp_cache[
+            legacy_key(client, payload, pycf3.CoordinateSystem.equatorial)
+        ] = tmp_cache.pop(key)
+
+        client.calculate_velocity(ra=1, dec=1, distance=10)
+
+    assert get.call_count == 2
+
+
+def test_migrate_legacy_cache(fakeclient_temp_cache, load_mresponse):
+    client = fakeclient_temp_cache
+    system = pycf3.CoordinateSystem.equatorial
+    payload = client._build_payload(
+        system, pycf3.Parameter.distance, 187.78917, 13.33386, 10
+    )
+    mresponse = load_mresponse("cf3", "tcEquatorial_distance_10.pkl")
+
+    # the old entries of the calculator and of another one
+    client.cache.set(legacy_key(client, payload, system), mresponse, expire=60)
+    other = legacy_key(client, payload, system)
+    other = ("other",) + other[1:]
+    client.cache[other] = mresponse
+
+    assert client.migrate_legacy_cache() == 1
+    assert client.migrate_legacy_cache() == 0
+
+    key = client._cache_key(system, payload)
+    assert sorted(client.cache, key=repr) == sorted([key, other], key=repr)
+    record, expire_time = client.cache.get(key, expire_time=True)
+    assert record.startswith(b"PYCF3")
+    assert 0 < expire_time - time.time() <= 60
+
+    with mock.patch("requests.Session.get") as get:
+        result = client.calculate_velocity(
+            ra=187.78917, dec=13.33386, distance=10
+        )
+
+    get.assert_not_called()
+    assert result.observed_velocity_ == 730.4691399179898
+
+
+# =============================================================================
+# CANONICAL CACHE
+# =============================================================================
+
+
+@pytest.mark.parametrize(
+    "fname, system, alpha, delta",
+    [
+        ("tcEquatorial_distance_10.pkl", "equatorial", "RA", "Dec"),
+        ("tcGalactic_distance_10.pkl", "galactic", "Glon", "Glat"),
+        ("tcSuperGalactic_distance_10.pkl", "supergalactic", "SGL", "SGB"),
+    ],
+)
+def test_to_supergalactic(load_mresponse, fname, system, alpha, delta):
+    data = load_mresponse("cf3", fname).json()
+
+    sgl, sgb = pycf3._to_supergalactic(
+        pycf3.CoordinateSystem(system), data[alpha], data[delta]
+    )
+
+    assert sgl == pytest.approx(data["SGL"], abs=1e-4)
+    assert sgb == pytest.approx(data["SGB"], abs=1e-4)
+
+
+def test_to_supergalactic_pole():
+    sgl, sgb = pycf3._to_supergalactic(
+        pycf3.CoordinateSystem.galactic, 47.37, 6.32
+    )
+    assert (sgl, sgb) == (0.0, 90.0)
+
+
+def from_supergalactic(coordinate_system, sgl, sgb):
+    sgl, sgb = np.radians(sgl), np.radians(sgb)
+    vector = np.cos(sgb) * np.cos(sgl), np.cos(sgb) * np.sin(sgl), np.sin(sgb)
+    x, y, z = pycf3._TO_SUPERGALACTIC[coordinate_system].T @ vector
+    alpha = np.degrees(np.arctan2(y, x)) % 360
+    return float(alpha), float(np.degrees(np.arcsin(z)))
+
+
+@pytest.mark.parametrize("canonical, calls", [(True, 1), (False, 3)])
+def test_canonical_cache(
+    fakeclient_class, tmp_cache, echo_get, canonical, calls
+):
+    client = fakeclient_class(cache=tmp_cache, canonical_cache=canonical)
+
+    sgl, sgb = 101.4, -2.7
+    glon, glat = from_supergalactic(pycf3.CoordinateSystem.galactic, sgl, sgb)
+    ra, dec = from_supergalactic(pycf3.CoordinateSystem.equatorial, sgl, sgb)
+
+    with mock.patch("requests.Session.get", side_effect=echo_get) as get:
+        by_sg = client.calculate_velocity(sgl=sgl, sgb=sgb, distance=10)
+        by_gal = client.calculate_velocity(glon=glon, glat=glat, distance=10)
+        by_eq = client.calculate_velocity(ra=ra, dec=dec, distance=10)
+
+    assert get.call_count == calls
+    assert len(tmp_cache) == calls
+    assert by_gal.coordinate == pycf3.CoordinateSystem.galactic
+    assert (by_eq.alpha, by_eq.delta) == (ra, dec)
+    assert by_eq.observed_velocity_ == by_sg.observed_velocity_
+
+
+def test_canonical_cache_catalog_coordinates(
+    fakeclient_class, tmp_cache, echo_get, load_mresponse
+):
+    # the coordinates of the same object reported by the calculator in the
+    # three systems, with their own rounding errors
+    client = fakeclient_class(cache=tmp_cache, canonical_cache=True)
+    fnames = [
+        "tcEquatorial_distance_10.pkl",
+        "tcGalactic_distance_10.pkl",
+        "tcSuperGalactic_distance_10.pkl",
+    ]
+
+    with mock.patch("requests.Session.get", side_effect=echo_get) as get:
+        client.calculate_velocity(ra=187.78917, dec=13.33386, distance=10)
+        client.calculate_velocity(glon=282.96547, glat=75.4136, distance=10)
+        client.calculate_velocity(sgl=102, sgb=-2, distance=10)
+        for fname in fnames:
+            data = load_mresponse("cf3", fname).json()
+            client.calculate_velocity(
+                ra=data["RA"], dec=data["Dec"], distance=10
+            )
+            client.calculate_velocity(
+                glon=data["Glon"], glat=data["Glat"], distance=10
+            )
+            client.calculate_velocity(
+                sgl=data["SGL"], sgb=data["SGB"], distance=10
+            )
+
+    get.assert_called_once()
+
+
+def test_canonical_cache_batch_keys(fakeclient_class, no_cache):
+    client = fakeclient_class(cache=no_cache, canonical_cache=True)
+    system = pycf3.CoordinateSystem.galactic
+    glon = np.array([0.0, 47.37, 137.37, 359.99])
+    glat = np.array([-90.0, 6.32, 0.0, 89.5])
+
+    batch = client._prepare_many(
+        system, glon, glat, pycf3.Parameter.distance, np.ones(4), "raise"
+    )
+
+    keys = [client._cache_key(system, payload) for payload in batch.payloads]
+    assert batch.keys == keys
+
+
+# =============================================================================
+# QUANTIZATION
+# =============================================================================
+
+
+def test_quantization():
+    quantization = pycf3.Quantization()
+
+    point = quantization.quantize(
+        pycf3.Parameter.distance, 187.789170000001, 13.33386, 10.004
+    )
+    assert point == (187.7892, 13.3339, 10.0)
+    assert isinstance(point.value, float)
+
+    point = quantization.quantize(
+        pycf3.Parameter.velocity, [1.00004, 2.00006], [3, 4], [0.3, 730.6]
+    )
+    np.testing.assert_array_equal(point.alpha, [1.0, 2.0001])
+    np.testing.assert_array_equal(point.value, [0.3, 731.0])
+
+
+def test_quantization_disabled_component():
+    quantization = pycf3.Quantization(coordinate=None, velocity=10)
+    point = quantization.quantize(
+        pycf3.Parameter.velocity, 187.789170000001, 13.33386, 734
+    )
+    assert point == (187.789170000001, 13.33386, 730.0)
+
+
+def test_quantization_valid_ranges():
+    quantization = pycf3.Quantization(coordinate=0.7, velocity=10)
+
+    point = quantization.quantize(
+        pycf3.Parameter.velocity, 359.99, 90, 2396, maximum=2396
+    )
+    assert point == (359.8, 90.0, 2396.0)
+
+    point = quantization.quantize(
+        pycf3.Parameter.velocity, [1, 2], [-90, -89.9], [2394, 2398]
+    )
+    np.testing.assert_array_equal(point.delta, [-90.0, -89.6])
+    np.testing.assert_array_equal(point.value, [2390.0, 2400.0])
+
+
+def test_quantization_signed_zero(fakeclient_class, tmp_cache, echo_get):
+    client = fakeclient_class(
+        cache=tmp_cache, quantization=pycf3.Quantization()
+    )
+
+    with mock.patch("requests.Session.get", side_effect=echo_get) as get:
+        client.calculate_velocity(ra=0.00003, dec=-0.00003, distance=10)
+        client.calculate_velocity(ra=359.99996, dec=0.00003, distance=10)
+
+    get.assert_called_once()
+    assert len(tmp_cache) == 1
+    alpha, delta = get.call_args[1]["json"]["coordinate"]
+    assert (str(alpha), str(delta)) == ("0.0", "0.0")
+
+
+def test_quantization_invalid():
+    with pytest.raises(ValueError):
+        pycf3.Quantization(coordinate=0)
+    with pytest.raises(ValueError):
+        pycf3.Quantization(distance=-1)
+
+
+def test_quantization_client(fakeclient_class, tmp_cache, echo_get):
+    client = fakeclient_class(
+        cache=tmp_cache, quantization=pycf3.Quantization()
+    )
+
+    with mock.patch("requests.Session.get", side_effect=echo_get) as get:
+        first = client.calculate_velocity(
+            ra=187.78917, dec=13.33386, distance=10
+        )
+        second = client.calculate_velocity(
+            ra=187.789170000001, dec=13.333859999, distance=10.001
+        )
+
+    get.assert_called_once()
+    assert get.call_args[1]["json"]["coordinate"] == [187.7892, 13.3339]
+    assert len(tmp_cache) == 1
+
+    assert (second.alpha, second.delta) == (187.789170000001, 13.333859999)
+    assert second.distance == 10.001
+    assert second.quantized_ == (187.7892, 13.3339, 10.0)
+    assert second.calculated_at_.ra == 187.7892
+    assert first.observed_velocity_ == second.observed_velocity_
+
+
+def test_quantization_canonical_cache(fakeclient_class, tmp_cache, echo_get):
+    client = fakeclient_class(
+        cache=tmp_cache,
+        canonical_cache=True,
+        quantization=pycf3.Quantization(coordinate=1e-3),
+    )
+    glon, glat = from_supergalactic(
+        pycf3.CoordinateSystem.galactic, 101.4, -2.7
+    )
+
+    with mock.patch("requests.Session.get", side_effect=echo_get) as get:
+        client.calculate_velocity(sgl=101.4, sgb=-2.7, distance=10)
+        client.calculate_velocity(glon=glon, glat=glat, distance=10)
+
+    get.assert_called_once()
+
+
+# =============================================================================
+# SPATIAL INDEX
+# =============================================================================
+
+
+def test_nearest_match_invalid():
+    with pytest.raises(ValueError):
+        pycf3.NearestMatch(radius=0)
+    with pytest.raises(ValueError):
+        pycf3.NearestMatch(radius=1, velocity=-1)
+
+
+def test_spatial_index(fakeclient_no_cache):
+    pytest.importorskip("scipy")
+    client = fakeclient_no_cache
+    galactic = pycf3.CoordinateSystem.galactic
+    supergalactic = pycf3.CoordinateSystem.supergalactic
+
+    def key(system, alpha, delta, value, parameter=pycf3.Parameter.distance):
+        payload = client._build_payload(system, parameter, alpha, delta, value)
+        return client._cache_key(system, payload)
+
+    glon, glat = from_supergalactic(galactic, 101.4, -2.7)
+    near = key(galactic, glon, glat, 10)
+    keys = [
+        near,
+        key(supergalactic, 101.4, -2.8, 10),
+        key(supergalactic, 101.4, -2.7, 10.5),
+        key(supergalactic, 101.4, -2.7, 10, pycf3.Parameter.velocity),
+        ("legacy", "key"),
+    ]
+    index = pycf3.SpatialIndex(keys)
+    assert len(index) == 4
+
+    query = key(supergalactic, 101.401, -2.7, 10.1)
+    assert index.nearest(query, radius=0.01, tolerance=0.2) == near
+    assert index.nearest(query, radius=0.01, tolerance=0.05) is None
+    assert index.nearest(query, radius=1e-4, tolerance=0.2) is None
+    assert index.nearest(
+        key(supergalactic, 101.4, -2.79, 10.1), radius=0.2, tolerance=0.2
+    ) == key(supergalactic, 101.4, -2.8, 10)
+
+    other = pycf3.CF3(cache=pycf3.NoCache())
+    payload = other._build_payload(
+        supergalactic, pycf3.Parameter.distance, 101.4, -2.7, 10
+    )
+    other_key = other._cache_key(supergalactic, payload)
+    assert index.nearest(other_key, radius=1, tolerance=1) is None
+
+
+def test_spatial_index_save_load(tmp_path, fakeclient_no_cache):
+    pytest.importorskip("scipy")
+    client = fakeclient_no_cache
+    system = pycf3.CoordinateSystem.equatorial
+    payload = client._build_payload(
+        system, pycf3.Parameter.velocity, 10, 20, 1000
+    )
+    key = client._cache_key(system, payload)
+
+    path = tmp_path / "index.npz"
+    pycf3.SpatialIndex([key]).save(path)
+    index = pycf3.SpatialIndex.load(path)
+
+    assert len(index) == 1
+    assert index.nearest(key, radius=1e-6, tolerance=0) == key
+
+
+def test_nearest_match_client(fakeclient_class, tmp_cache, echo_get):
+    pytest.importorskip("scipy")
+    client = fakeclient_class(
+        cache=tmp_cache,
+        nearest_match=pycf3.NearestMatch(radius=0.01, distance=0.1),
+    )
+
+    with mock.patch("requests.Session.get", side_effect=echo_get) as get:
+        client.calculate_velocity(ra=187.78917, dec=13.33386, distance=10)
+        client.build_index()
+
+        # near enough, served by the cached entry
+        near = client.calculate_velocity(
+            ra=187.7901, dec=13.33386, distance=10.05
+        )
+        # too far away, calculated
+        far = client.calculate_velocity(ra=187.9, dec=13.33386, distance=10)
+
+    assert get.call_count == 2
+    assert (near.alpha, near.distance) == (187.7901, 10.05)
+    assert near.calculated_at_.ra == 187.78917
+    assert near.observed_velocity_ == 10
+    assert far.calculated_at_.ra == 187.9
+    assert os.path.exists(tmp_cache.directory + "/pycf3-index.npz")
+
+    # a new client loads the index from the cache directory
+    client = fakeclient_class(
+        cache=tmp_cache, nearest_match=pycf3.NearestMatch(radius=0.01)
+    )
+    with mock.patch("requests.Session.get", side_effect=echo_get) as get:
+        client.calculate_velocity(ra=187.7901, dec=13.33386, distance=10)
+    get.assert_not_called()
+
+
+# =============================================================================
+# CACHE BUNDLES
+# =============================================================================
+
+
+def test_bundle_export_import(fakeclient_class, tmp_path, echo_get):
+    source = dcache.Cache(directory=str(tmp_path / "source"))
+    client = fakeclient_class(cache=source)
+    with mock.patch("requests.Session.get", side_effect=echo_get):
+        client.calculate_velocity_many(distance=[1, 2, 3], glon=10, glat=20)
+    source[("legacy", "key")] = b"ignored"
+
+    bundle = tmp_path / "bundle.npz"
+    assert pycf3.export_bundle(source, bundle) == 3
+
+    target = dcache.Cache(directory=str(tmp_path / "target"))
+    assert pycf3.import_bundle(target, bundle) == 3
+    assert pycf3.import_bundle(target, bundle) == 0
+    assert pycf3.import_bundle(target, bundle, overwrite=True) == 3
+
+    for key in target:
+        assert target.get(key, tag=True) == source.get(key, tag=True)
+
+    client = fakeclient_class(cache=target)
+    with mock.patch("requests.Session.get") as get:
+        result = client.calculate_velocity(glon=10, glat=20, distance=2)
+    get.assert_not_called()
+    assert result.observed_velocity_ == 2
+
+
+def test_bundle_export_fanout_legacy(
+    fakeclient_class, tmp_path, load_mresponse
+):
+    source = dcache.FanoutCache(directory=str(tmp_path / "source"))
+    client = fakeclient_class(cache=source)
+    system = pycf3.CoordinateSystem.equatorial
+    payload = client._build_payload(
+        system, pycf3.Parameter.distance, 187.78917, 13.33386, 10
+    )
+    source[legacy_key(client, payload, system)] = load_mresponse(
+        "cf3", "tcEquatorial_distance_10.pkl"
+    )
+
+    bundle = tmp_path / "bundle.npz"
+    assert pycf3.export_bundle(source, bundle) == 1
+
+    target = dcache.Cache(directory=str(tmp_path / "target"))
+    pycf3.import_bundle(target, bundle)
+    key = client._cache_key(system, payload)
+    assert list(target) == [key]
+    assert target.get(key, tag=True)[1] == "fake@equatorial"
+
+
+def test_bundle_import_expired(fakeclient_class, tmp_path, echo_get):
+    source = dcache.Cache(directory=str(tmp_path / "source"))
+    with mock.patch("requests.Session.get", side_effect=echo_get):
+        fakeclient_class(cache=source, cache_expire=0.2).calculate_velocity(
+            ra=1, dec=1, distance=1
+        )
+        fakeclient_class(cache=source).calculate_velocity(
+            ra=1, dec=1, distance=2
+        )
+
+    bundle = tmp_path / "bundle.npz"
+    assert pycf3.export_bundle(source, bundle) == 2
+    time.sleep(0.3)
+
+    target = dcache.Cache(directory=str(tmp_path / "target"))
+    assert pycf3.import_bundle(target, bundle) == 1
+
+
+def test_bundle_merge(fakeclient_class, tmp_path, echo_get):
+    bundles = []
+    for name, distances in [("a", [1, 2]), ("b", [2, 3]), ("c", [])]:
+        cache = dcache.Cache(directory=str(tmp_path / name))
+        with mock.patch("requests.Session.get", side_effect=echo_get):
+            for distance in distances:
+                fakeclient_class(cache=cache).calculate_velocity(
+                    ra=1, dec=1, distance=distance
+                )
+        bundles.append(tmp_path / f"{name}.npz")
+        pycf3.export_bundle(cache, bundles[-1])
+
+    merged = tmp_path / "merged.npz"
+    assert pycf3.merge_bundles(bundles, merged) == 3
+
+    # the key of distance=2 of the second bundle is the newest one
+    newest = {}
+    for path in bundles[:2]:
+        with np.load(path) as data:
+            for record, stored_at in zip(data["records"], data["stored_at"]):
+                newest[record.tobytes()] = stored_at
+    with np.load(merged) as data:
+        assert len(data["calculator_names"]) == 1
+        for record, stored_at in zip(data["records"], data["stored_at"]):
+            assert newest[record.tobytes()] == stored_at
+
+    target = dcache.Cache(directory=str(tmp_path / "target"))
+    assert pycf3.import_bundle(target, merged) == 3
+
+    empty = tmp_path / "empty.npz"
+    assert pycf3.merge_bundles(bundles[2:], empty) == 0
+
+
+# =============================================================================
+# MAPPED CACHE
+# =============================================================================
+
+
+def test_mapped_cache(fakeclient_class, tmp_cache, tmp_path, echo_get):
+    with mock.patch("requests.Session.get", side_effect=echo_get):
+        fakeclient_class(cache=tmp_cache).calculate_velocity_many(
+            distance=[3, 1, 2], ra=10, dec=20
+        )
+        fakeclient_class(cache=tmp_cache, cache_expire=0.2).calculate_velocity(
+            ra=10, dec=20, distance=4
+        )
+    tmp_cache[("legacy", "key")] = b"ignored"
+
+    mapped = pycf3.MappedCache.build(tmp_cache, tmp_path / "cache.map")
+    time.sleep(0.3)
+
+    assert len(mapped) == 4
+    keys = list(mapped)
+    assert keys == sorted(keys)
+    assert sum(key in mapped for key in keys) == 3
+    assert mapped[keys[0]] == tmp_cache[keys[0]]
+    assert mapped.get(b"x" * 30, default="missing") == "missing"
+    with pytest.raises(KeyError):
+        mapped[("legacy", "key")]
+
+    client = fakeclient_class(cache=mapped)
+    with mock.patch("requests.Session.get", side_effect=echo_get) as get:
+        hits = client.calculate_velocity_many(
+            distance=[1, 2, 3], ra=10, dec=20
+        )
+        miss = client.calculate_velocity(ra=10, dec=20, distance=4)
+
+    get.assert_called_once()
+    assert miss.observed_velocity_ == 4
+    assert list(hits.observed_velocity_) == [1, 2, 3]
+    assert len(mapped) == 4
+
+    # the read-only cache doesn't store the miss
+    assert client.stats()["fake@equatorial"].bytes_stored == 0
+
+    mapped.close()
+
+
+def test_mapped_cache_build_backend(tmp_path):
+    backend = pycf3.RedisCache(FakeRedis())
+    key = b"k" * pycf3._CACHE_KEY.size
+    backend.set(key, b"value", expire=60)
+    backend.set(b"legacy", b"value")
+
+    mapped = pycf3.MappedCache.build(backend, tmp_path / "cache.map")
+
+    assert list(mapped) == [key]
+    assert mapped[key] == b"value"
+    mapped.close()
+
+
+def test_mapped_cache_pickle(tmp_cache, tmp_path):
+    mapped = pycf3.MappedCache.build(tmp_cache, tmp_path / "cache.map")
+    assert len(mapped) == 0
+
+    clone = pickle.loads(pickle.dumps(mapped))
+
+    assert clone.path == mapped.path
+    assert clone is not mapped
+    assert list(clone) == []
+
+
+def test_mapped_cache_invalid_file(tmp_path):
+    path = tmp_path / "cache.map"
+    path.write_bytes(b"no a mapped cache file!!")
+    with pytest.raises(ValueError):
+        pycf3.MappedCache(path)
+
+
+# =============================================================================
+# STALE WHILE REVALIDATE
+# =============================================================================
+
+
+def age_cache(cache, seconds):
+    # rewrite every record as stored ``seconds`` ago
+    for key in list(cache):
+        response, stored_at = pycf3._unpack_response(cache[key], "")
+        cache.set(
+            key,
+            pycf3._pack_response(response, stored_at=stored_at - seconds),
+            expire=3600,
+        )
+
+
+def test_stale_grace_invalid(fakeclient_class, no_cache):
+    with pytest.raises(ValueError):
+        fakeclient_class(cache=no_cache, stale_grace=10)
+    with pytest.raises(ValueError):
+        fakeclient_class(cache=no_cache, cache_expire=10, stale_grace=-1)
+
+
+def test_stale_while_revalidate(fakeclient_class, tmp_cache, echo_get):
+    client = fakeclient_class(
+        cache=tmp_cache, cache_expire=60, stale_grace=600
+    )
+
+    # the refresh waits until both stale calls are served
+    served = threading.Event()
+
+    def slow_get(url, **kwargs):
+        if get.call_count > 1:
+            served.wait(timeout=5)
+        return echo_get(url, **kwargs)
+
+    with mock.patch("requests.Session.get", side_effect=slow_get) as get:
+        fresh = client.calculate_velocity(ra=1, dec=1, distance=10)
+        assert get.call_count == 1
+        assert fresh.stale_ is False
+
+        # the expired entry is served and refreshed only once
+        age_cache(tmp_cache, 120)
+        stale = client.calculate_velocity(ra=1, dec=1, distance=10)
+        again = client.calculate_velocity(ra=1, dec=1, distance=10)
+        served.set()
+        client._refresher.wait()
+        assert get.call_count == 2
+
+        refreshed = client.calculate_velocity(ra=1, dec=1, distance=10)
+
+    assert get.call_count == 2
+    assert stale.stale_ is True and again.stale_ is True
+    assert refreshed.stale_ is False
+    assert stale.observed_velocity_ == refreshed.observed_velocity_ == 10
+
+
+def test_stale_grace_expired(fakeclient_class, tmp_cache, echo_get):
+    client = fakeclient_class(cache=tmp_cache, cache_expire=60, stale_grace=1)
+
+    with mock.patch("requests.Session.get", side_effect=echo_get) as get:
+        client.calculate_velocity(ra=1, dec=1, distance=10)
+
+        # after the grace window the entry is gone and the caller waits
+        key = next(iter(tmp_cache))
+        assert tmp_cache.get(key, expire_time=True)[1] is not None
+        tmp_cache.clear()
+        result = client.calculate_velocity(ra=1, dec=1, distance=10)
+
+    assert get.call_count == 2
+    assert result.stale_ is False
+
+
+def test_stale_while_revalidate_many(fakeclient_class, tmp_cache, echo_get):
+    client = fakeclient_class(
+        cache=tmp_cache, cache_expire=60, stale_grace=600
+    )
+
+    with mock.patch("requests.Session.get", side_effect=echo_get) as get:
+        client.calculate_velocity_many(distance=[1, 2], ra=1, dec=1)
+        age_cache(tmp_cache, 120)
+        rset = client.calculate_velocity_many(
+            distance=[1, 2, 3, 1], ra=1, dec=1
+        )
+        client._refresher.wait()
+
+    assert get.call_count == 5
+    np.testing.assert_array_equal(rset.stale_, [True, True, False, True])
+    assert rset[0].stale_ is True
+    assert rset[2].stale_ is False
+    np.testing.assert_array_equal(rset[:2].stale_, [True, True])
+
+
+# =============================================================================
+# NEGATIVE CACHE
+# =============================================================================
+
+
+def error_get(status_code):
+    def get(url, **kwargs):
+        response = requests.Response()
+        response.status_code = status_code
+        response.url = url
+        response._content = b'{"message": "Error"}'
+        return response
+
+    return get
+
+
+def test_negative_cache_expire_invalid(fakeclient_class, no_cache):
+    with pytest.raises(ValueError):
+        fakeclient_class(cache=no_cache, negative_cache_expire=0)
+
+
+@pytest.mark.parametrize("negative_cache_expire, calls", [(None, 2), (60, 1)])
+def test_negative_cache_http_error(
+    fakeclient_class, tmp_cache, negative_cache_expire, calls
+):
+    client = fakeclient_class(
+        cache=tmp_cache, negative_cache_expire=negative_cache_expire
+    )
+
+    with mock.patch("requests.Session.get", side_effect=error_get(400)) as get:
+        for _ in range(2):
+            with pytest.raises(requests.HTTPError, match="400 Client Error"):
+                client.calculate_velocity(ra=1, dec=1, distance=10)
+
+    assert get.call_count == calls
+    assert len(tmp_cache) == 2 - calls
+
+
+def test_negative_cache_retry_error(fakeclient_class, tmp_cache):
+    client = fakeclient_class(cache=tmp_cache, negative_cache_expire=60)
+    error = requests.exceptions.RetryError("too many 500 error responses")
+
+    with mock.patch("requests.Session.get", side_effect=error) as get:
+        for _ in range(2):
+            with pytest.raises(requests.exceptions.RetryError, match="500"):
+                client.calculate_velocity(ra=1, dec=1, distance=10)
+
+    get.assert_called_once()
+    (key,) = list(tmp_cache)
+    _, expire_time = tmp_cache.get(key, expire_time=True)
+    assert 0 < expire_time - time.time() <= 60
+
+
+def test_negative_cache_many(fakeclient_class, tmp_cache, echo_get):
+    client = fakeclient_class(cache=tmp_cache, negative_cache_expire=60)
+
+    def get(url, **kwargs):
+        if kwargs["json"]["value"] == 2:
+            return error_get(500)(url, **kwargs)
+        return echo_get(url, **kwargs)
+
+    with mock.patch("requests.Session.get", side_effect=get) as get:
+        for _ in range(2):
+            with pytest.raises(requests.HTTPError):
+                client.calculate_velocity_many(distance=[1, 2], ra=1, dec=1)
+        result = client.calculate_velocity(ra=1, dec=1, distance=1)
+
+    assert get.call_count == 2
+    assert result.observed_velocity_ == 1
+
+
+def test_negative_cache_many_mask(fakeclient_class, tmp_cache, echo_get):
+    client = fakeclient_class(cache=tmp_cache, negative_cache_expire=60)
+
+    def get(url, **kwargs):
+        if kwargs["json"]["value"] == 2:
+            return error_get(500)(url, **kwargs)
+        return echo_get(url, **kwargs)
+
+    # the fresh failure and then the negative hit are masked per row
+    with mock.patch("requests.Session.get", side_effect=get) as get:
+        for _ in range(2):
+            rset = client.calculate_velocity_many(
+                distance=[1, 2, 3], ra=1, dec=1, errors="mask"
+            )
+            np.testing.assert_array_equal(
+                rset.errors_,
+                [
+                    pycf3.RowError.NONE,
+                    pycf3.RowError.CALCULATOR_ERROR,
+                    pycf3.RowError.NONE,
+                ],
+            )
+            np.testing.assert_array_equal(rset.valid_, [True, False, True])
+            np.testing.assert_array_equal(
+                rset.observed_velocity_[[0, 2]], [1, 3]
+            )
+
+    assert get.call_count == 3
+    assert client.stats()["fake@equatorial"].negative_hits == 1
+
+
+def test_negative_cache_keeps_stale(fakeclient_class, tmp_cache, echo_get):
+    client = fakeclient_class(
+        cache=tmp_cache,
+        cache_expire=60,
+        stale_grace=600,
+        negative_cache_expire=60,
+    )
+
+    with mock.patch("requests.Session.get", side_effect=echo_get):
+        client.calculate_velocity(ra=1, dec=1, distance=10)
+    age_cache(tmp_cache, 120)
+
+    # the failed refresh doesn't replace the stale result
+    with mock.patch("requests.Session.get", side_effect=error_get(500)):
+        client.calculate_velocity(ra=1, dec=1, distance=10)
+        client._refresher.wait()
+        result = client.calculate_velocity(ra=1, dec=1, distance=10)
+
+    assert result.stale_ is True
+    assert result.observed_velocity_ == 10
+
+
+# =============================================================================
+# CACHE STATISTICS
+# =============================================================================
+
+
+def test_stats(fakeclient_class, tmp_cache, echo_get):
+    client = fakeclient_class(cache=tmp_cache)
+    assert client.stats() == {}
+
+    with mock.patch("requests.Session.get", side_effect=echo_get):
+        client.calculate_velocity(ra=1, dec=1, distance=10)
+        client.calculate_velocity(ra=1, dec=1, distance=10)
+        client.calculate_velocity_many(distance=[10, 20], glon=1, glat=1)
+
+    stats = client.stats(reset=True)
+    assert set(stats) == {"fake@equatorial", "fake@galactic"}
+
+    equatorial = stats["fake@equatorial"]
+    assert isinstance(equatorial, pycf3.CacheStats)
+    assert (equatorial.hits, equatorial.misses) == (1, 1)
+    assert equatorial.network_calls == 1
+    assert equatorial.network_errors == 0
+    assert equatorial.bytes_stored > pycf3._RECORD_HEADER.size
+    assert equatorial.lookup_time > 0
+    assert equatorial.fetch_time > 0
+    assert equatorial.store_time > 0
+
+    galactic = stats["fake@galactic"]
+    assert (galactic.hits, galactic.misses) == (0, 2)
+    assert galactic.network_calls == 2
+    assert equatorial.bytes_stored + galactic.bytes_stored == sum(
+        len(tmp_cache[key]) for key in tmp_cache
+    )
+
+    assert client.stats() == {}
+
+
+def test_stats_hit_kinds(fakeclient_class, tmp_cache, echo_get):
+    client = fakeclient_class(
+        cache=tmp_cache,
+        cache_expire=60,
+        stale_grace=600,
+        negative_cache_expire=60,
+        memory_cache=pycf3.MemoryCache(),
+    )
+
+    with mock.patch("requests.Session.get", side_effect=echo_get):
+        client.calculate_velocity(ra=1, dec=1, distance=10)
+        client.calculate_velocity(ra=1, dec=1, distance=10)
+
+        client.memory_cache.clear()
+        age_cache(tmp_cache, 120)
+        client.calculate_velocity(ra=1, dec=1, distance=10)
+        client._refresher.wait()
+
+    with mock.patch("requests.Session.get", side_effect=error_get(400)):
+        for _ in range(2):
+            with pytest.raises(requests.HTTPError):
+                client.calculate_velocity(ra=1, dec=1, distance=20)
+
+    stats = client.stats()["fake@equatorial"]
+    assert stats.hits == 2
+    assert stats.memory_hits == 1
+    assert stats.stale_hits == 1
+    assert stats.negative_hits == 1
+    assert stats.misses == 2
+    assert stats.network_calls == 3
+    assert stats.network_errors == 1
+
+
+# =============================================================================
+# TAG EVICTION AND USAGE
+# =============================================================================
+
+
+def test_default_cache(tmp_path):
+    cache = pycf3.default_cache(
+        directory=str(tmp_path),
+        size_limit=2**20,
+        eviction_policy="least-frequently-used",
+    )
+    assert cache.size_limit == 2**20
+    assert cache.eviction_policy == "least-frequently-used"
+    assert cache.tag_index
+
+
+@pytest.mark.parametrize(
+    "kwargs", [{"eviction_policy": "lru"}, {"size_limit": 0}]
+)
+def test_default_cache_invalid(tmp_path, kwargs):
+    with pytest.raises(ValueError):
+        pycf3.default_cache(directory=str(tmp_path), **kwargs)
+
+
+def test_default_cache_client(fakeclient_class, tmp_path):
+    cache = pycf3.default_cache(directory=str(tmp_path))
+    with mock.patch("pycf3.default_cache", return_value=cache) as default:
+        client = fakeclient_class(
+            cache_size_limit=2**20,
+            cache_eviction_policy="least-recently-used",
+        )
+        fakeclient_class()
+
+    assert client.cache is cache
+    assert default.call_args_list == [
+        mock.call(size_limit=2**20, eviction_policy="least-recently-used"),
+        mock.call(
+            size_limit=pycf3.DEFAULT_CACHE_SIZE_LIMIT,
+            eviction_policy=pycf3.DEFAULT_CACHE_EVICTION_POLICY,
+        ),
+    ]
+
+
+def test_evict_and_usage(fakeclient_class, tmp_path, echo_get):
+    cache = pycf3.default_cache(directory=str(tmp_path))
+    memory = pycf3.MemoryCache()
+    client = fakeclient_class(cache=cache, memory_cache=memory)
+
+    class Other(fakeclient_class):
+        CALCULATOR = "other"
+
+    other = Other(cache=cache)
+
+    with mock.patch("requests.Session.get", side_effect=echo_get):
+        client.calculate_velocity_many(distance=[1, 2], ra=1, dec=1)
+        client.calculate_velocity(glon=1, glat=1, distance=1)
+        other.calculate_velocity(ra=1, dec=1, distance=1)
+
+    usage = client.cache_usage()
+    assert set(usage) == {"fake@equatorial", "fake@galactic"}
+    assert usage["fake@equatorial"].entries == 2
+    assert usage["fake@galactic"].entries == 1
+
+    (other_usage,) = other.cache_usage().values()
+    nbytes = sum(u.nbytes for u in usage.values()) + other_usage.nbytes
+    assert nbytes == sum(len(cache[key]) for key in cache)
+    assert set(client.cache_usage("galactic")) == {"fake@galactic"}
+
+    assert client.evict(pycf3.CoordinateSystem.equatorial) == 2
+    assert len(memory) == 0
+    assert set(client.cache_usage()) == {"fake@galactic"}
+    assert set(other.cache_usage()) == {"other@equatorial"}
+
+    assert client.evict() == 1
+    assert client.cache_usage() == {}
+    assert len(cache) == 1
+
+
+def test_evict_no_cache(fakeclient_no_cache):
+    assert fakeclient_no_cache.evict() == 0
+    assert fakeclient_no_cache.cache_usage() == {}
+
+
+# =============================================================================
+# CACHE BACKENDS
+# =============================================================================
+
+
+class FakeRedis:
+    """Local stand-in of ``redis.Redis`` with the data in memory."""
+
+    def __init__(self):
+        self.data, self.expire_at, self.calls = {}, {}, []
+
+    def _alive(self, key):
+        expire_at = self.expire_at.get(key)
+        if expire_at is not None and expire_at <= time.time():
+            self.delete(key)
+        return key in self.data
+
+    def get(self, key):
+        self.calls.append("get")
+        return self.data[key] if self._alive(key) else None
+
+    def mget(self, keys):
+        self.calls.append("mget")
+        return [self.data[key] if self._alive(key) else None for key in keys]
+
+    def set(self, key, value, px=None):
+        self.data[key] = value
+        self.expire_at.pop(key, None)
+        if px is not None:
+            self.expire_at[key] = time.time() + px / 1000
+
+    def zadd(self, key, mapping):
+        self.data.setdefault(key, {}).update(mapping)
+
+    def zrange(self, key, start, end):
+        zset = self.data.get(key, {})
+        return sorted(zset, key=zset.get)
+
+    def zremrangebyscore(self, key, min, max):
+        zset = self.data.get(key, {})
+        removed = [member for member, score in zset.items() if score <= max]
+        for member in removed:
+            del zset[member]
+        return len(removed)
+
+    def delete(self, *keys):
+        for key in keys:
+            self.expire_at.pop(key, None)
+        return sum(self.data.pop(key, None) is not None for key in keys)
+
+    def exists(self, key):
+        return int(self._alive(key))
+
+    def scan_iter(self, match):
+        prefix = match.rstrip(b"*")
+        return [
+            key
+            for key in list(self.data)
+            if key.startswith(prefix) and self._alive(key)
+        ]
+
+    def pipeline(self, transaction=True):
+        return FakeRedisPipeline(self)
+
+
+class FakeRedisPipeline:
+    def __init__(self, redis):
+        self.redis, self.commands = redis, []
+
+    def __getattr__(self, name):
+        def command(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+
+        return command
+
+    def execute(self):
+        self.redis.calls.append("pipeline")
+        return [
+            getattr(self.redis, name)(*args, **kwargs)
+            for name, args, kwargs in self.commands
+        ]
+
+
+def test_cache_backend_not_implemented():
+    backend = pycf3.CacheBackend()
+    with pytest.raises(NotImplementedError):
+        backend.get(b"key")
+    with pytest.raises(NotImplementedError):
+        backend.set(b"key", b"value")
+    with pytest.raises(NotImplementedError):
+        list(backend)
+    assert backend.expire() == 0
+    assert backend.evict("tag") == 0
+    assert backend.tag_keys("tag") == []
+
+
+def test_redis_cache():
+    redis = FakeRedis()
+    cache = pycf3.RedisCache(redis, prefix="test")
+
+    assert cache.set(b"a", b"1", tag="fake@equatorial")
+    assert cache.set_many({b"b": b"2", b"c": b"3"}, expire=60, tag="other")
+    assert redis.calls == ["pipeline", "pipeline"]
+    assert redis.expire_at[b"test:entry:b"] - time.time() <= 60
+
+    assert cache.get(b"a") == b"1"
+    assert cache.get(b"x", default=b"0") == b"0"
+    assert cache.get_many([b"a", b"x", b"c"]) == [b"1", None, b"3"]
+    assert redis.calls.count("mget") == 1
+    assert b"a" in cache and b"x" not in cache
+    assert sorted(cache) == [b"a", b"b", b"c"]
+    assert len(cache) == 3
+
+    assert sorted(cache.tag_keys("other")) == [b"b", b"c"]
+    assert cache.evict("other") == 2
+    assert cache.tag_keys("other") == []
+    assert list(cache) == [b"a"]
+
+    # the keys of the expired entries are pruned when the tag is written
+    cache.set(b"d", b"4", expire=0.001, tag="fake@equatorial")
+    time.sleep(0.01)
+    cache.set(b"e", b"5", tag="fake@equatorial")
+    assert redis.zrange(b"test:tag:fake@equatorial", 0, -1) == [
+        b"test:entry:a",
+        b"test:entry:e",
+    ]
+    assert cache.delete(b"e")
+    assert cache.delete(b"a")
+    assert not cache.delete(b"a")
+    assert len(cache) == 0
+
+    with pytest.raises(TypeError):
+        cache.set(b"a", "no bytes")
+
+
+def test_redis_cache_client(fakeclient_class, echo_get):
+    redis = FakeRedis()
+    client = fakeclient_class(cache=pycf3.RedisCache(redis), cache_expire=60)
+
+    with mock.patch("requests.Session.get", side_effect=echo_get) as get:
+        # the misses are written with a single set_many()
+        client.calculate_velocity_many(
+            distance=[1, 2, 3], ra=1, dec=1, workers=3
+        )
+        assert redis.calls == ["mget", "pipeline"]
+        redis.calls.clear()
+        rset = client.calculate_velocity_many(distance=[1, 2, 3], ra=1, dec=1)
+
+    assert get.call_count == 3
+    assert redis.calls == ["mget"]
+    np.testing.assert_array_equal(rset.observed_velocity_, [1, 2, 3])
+    assert client.cache_usage()["fake@equatorial"].entries == 3
+    assert client.evict() == 3
+
+
+def test_two_level_cache(fakeclient_class, tmp_path, echo_get):
+    # two nodes with their own local cache and a shared server
+    redis = FakeRedis()
+    local_a = dcache.Cache(directory=str(tmp_path / "a"))
+    local_b = dcache.Cache(directory=str(tmp_path / "b"))
+    node_a = fakeclient_class(
+        cache=pycf3.TwoLevelCache(local_a, pycf3.RedisCache(redis))
+    )
+    node_b = fakeclient_class(
+        cache=pycf3.TwoLevelCache(
+            local_b, pycf3.RedisCache(redis), local_expire=60
+        )
+    )
+
+    with mock.patch("requests.Session.get", side_effect=echo_get) as get:
+        node_a.calculate_velocity_many(distance=[1, 2], ra=1, dec=1)
+        result = node_b.calculate_velocity(ra=1, dec=1, distance=2)
+
+        # the shared hit is copied to the local cache of the node
+        assert len(local_b) == 1
+        redis.calls.clear()
+        node_b.calculate_velocity(ra=1, dec=1, distance=2)
+        assert redis.calls == []
+
+    assert get.call_count == 2
+    assert result.observed_velocity_ == 2
+    assert len(local_a) == 2
+    assert len(node_b.cache) == 2
+    assert node_b.cache.directory == local_b.directory
+
+    # the entries of other calculators survive in the local caches
+    local_b.set(b"other", b"value")
+    assert node_b.evict() == 2
+    assert list(local_b) == [b"other"]
+    assert len(node_a.cache.shared) == 0
+
+
+def test_two_level_cache_local_copy_expires(
+    fakeclient_class, tmp_path, echo_get
+):
+    local = dcache.Cache(directory=str(tmp_path))
+    shared = pycf3.RedisCache(FakeRedis())
+    client = fakeclient_class(
+        cache=pycf3.TwoLevelCache(local, shared), cache_expire=60
+    )
+
+    with mock.patch("requests.Session.get", side_effect=echo_get) as get:
+        client.calculate_velocity(ra=1, dec=1, distance=2)
+        shared.clear()
+
+        # the local copy has no expiry, but it's older than cache_expire
+        age_cache(local, 120)
+        client.calculate_velocity(ra=1, dec=1, distance=2)
+
+    assert get.call_count == 2
+
+
+def test_bundle_two_level_cache(fakeclient_class, tmp_path, echo_get):
+    source = pycf3.TwoLevelCache(
+        dcache.Cache(directory=str(tmp_path / "a")),
+        pycf3.RedisCache(FakeRedis()),
+    )
+    client = fakeclient_class(cache=source)
+    with mock.patch("requests.Session.get", side_effect=echo_get):
+        client.calculate_velocity_many(distance=[1, 2], ra=1, dec=1)
+        client.calculate_velocity(glon=1, glat=1, distance=3)
+
+    path = tmp_path / "bundle.npz"
+    assert pycf3.export_bundle(source, path) == 3
+
+    redis = FakeRedis()
+    target = pycf3.TwoLevelCache(
+        dcache.Cache(directory=str(tmp_path / "b")), pycf3.RedisCache(redis)
+    )
+    assert pycf3.import_bundle(target, path) == 3
+    assert pycf3.import_bundle(target, path) == 0
+    assert sorted(target.shared) == sorted(source.shared)
+    assert sorted(target.tag_keys("fake@equatorial")) == sorted(
+        source.tag_keys("fake@equatorial")
+    )
+
+    # the imported entries are hits for the clients of the other nodes
+    other = fakeclient_class(cache=target)
+    with mock.patch("requests.Session.get") as get:
+        rset = other.calculate_velocity_many(distance=[1, 2], ra=1, dec=1)
+    get.assert_not_called()
+    np.testing.assert_array_equal(rset.observed_velocity_, [1, 2])
+
+
+def test_migrate_legacy_two_level_cache(
+    fakeclient_class, tmp_cache, load_mresponse
+):
+    shared = pycf3.RedisCache(FakeRedis())
+    client = fakeclient_class(cache=pycf3.TwoLevelCache(tmp_cache, shared))
+    system = pycf3.CoordinateSystem.equatorial
+    payload = client._build_payload(
+        system, pycf3.Parameter.distance, 187.78917, 13.33386, 10
+    )
+    mresponse = load_mresponse("cf3", "tcEquatorial_distance_10.pkl")
+    tmp_cache.set(legacy_key(client, payload, system), mresponse, expire=60)
+
+    assert client.migrate_legacy_cache() == 1
+
+    key = client._cache_key(system, payload)
+    assert list(tmp_cache) == [key]
+    assert list(shared) == [key]
+    assert shared.tag_keys("fake@equatorial") == [key]
+    assert fakeclient_class(cache=shared).migrate_legacy_cache() == 0
+
+
+def test_fetch_many_stores_before_result(
+    fakeclient_class, tmp_cache, echo_get
+):
+    client = fakeclient_class(cache=tmp_cache)
+    make_result_set = client._make_result_set
+    stored = []
+
+    def spy(*args, **kwargs):
+        stored.append(len(tmp_cache))
+        return make_result_set(*args, **kwargs)
+
+    object.__setattr__(client, "_make_result_set", spy)
+    with mock.patch("requests.Session.get", side_effect=echo_get):
+        client.calculate_velocity_many(distance=[1, 2, 3], ra=1, dec=1)
+
+    assert stored == [3]
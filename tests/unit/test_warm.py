@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2019, Juan B Cabral
+# License: BSD-3-Clause
+#   Full Text: https://github.com/quatrope/pycf3/blob/master/LICENSE
+
+
+# =============================================================================
+# DOCS
+# =============================================================================
+
+"""Test for the cache warming API and command line interface
+
+"""
+
+
+# =============================================================================
+# IMPORTS
+# =============================================================================
+
+import json
+from unittest import mock
+
+import numpy as np
+
+import pycf3
+
+import pytest
+
+import requests
+
+
+# =============================================================================
+# SKY TILING
+# =============================================================================
+
+
+@pytest.mark.parametrize("step", [1, 5, 30])
+def test_sky_tiling(step):
+    alpha, delta = pycf3.sky_tiling(step)
+
+    expected = 4 * np.pi / np.radians(step) ** 2
+    assert len(alpha) == len(delta)
+    assert len(alpha) == pytest.approx(expected, rel=0.05)
+    assert np.all((alpha >= 0) & (alpha < 360))
+    assert np.all((delta > -90) & (delta < 90))
+
+
+def test_sky_tiling_invalid():
+    with pytest.raises(ValueError):
+        pycf3.sky_tiling(0)
+
+
+# =============================================================================
+# WARM
+# =============================================================================
+
+
+def test_warm(fakeclient_temp_cache, echo_get):
+    client = fakeclient_temp_cache
+
+    with mock.patch("requests.Session.get", side_effect=echo_get) as get:
+        report = client.warm(
+            distance=[1, 2, 3, 4],
+            ra=[10, 20, 30],
+            dec=[0, 95, 10],
+            workers=4,
+            chunksize=5,
+        )
+        assert report == (12, 0, 4, 0, 8, 0)
+        assert get.call_count == 8
+        assert len(client.cache) == 8
+
+        report = client.warm(
+            distance=[1, 2, 3, 4, 5], ra=[10, 20, 30], dec=[0, 95, 10]
+        )
+        assert report == (15, 0, 5, 8, 2, 0)
+        assert get.call_count == 10
+
+        result = client.calculate_velocity(ra=30, dec=10, distance=4)
+
+    assert get.call_count == 10
+    assert result.observed_velocity_ == 4
+
+
+def test_warm_checkpoint(fakeclient_temp_cache, echo_get, tmp_path):
+    client = fakeclient_temp_cache
+    checkpoint = str(tmp_path / "warm.json")
+    kwargs = dict(
+        velocity=[100, 200, 300],
+        sgl=[1, 2, 3, 4],
+        sgb=0,
+        chunksize=4,
+        checkpoint=checkpoint,
+    )
+
+    def failing_get(url, **kwargs):
+        if failing_get.calls == 6:
+            raise ConnectionError("interrupted")
+        failing_get.calls += 1
+        return echo_get(url, **kwargs)
+
+    failing_get.calls = 0
+
+    with mock.patch("requests.Session.get", side_effect=failing_get):
+        with pytest.raises(ConnectionError):
+            client.warm(**kwargs)
+
+    with open(checkpoint) as fp:
+        assert json.load(fp)["done"] == 1
+
+    with mock.patch("requests.Session.get", side_effect=echo_get) as get:
+        report = client.warm(**kwargs)
+
+    assert report == (12, 4, 0, 2, 6, 0)
+    assert get.call_count == 6
+    assert len(client.cache) == 12
+
+    with pytest.raises(ValueError, match="belongs to another run"):
+        client.warm(**dict(kwargs, velocity=[100]))
+
+
+def test_warm_failed(fakeclient_temp_cache, echo_get):
+    client = fakeclient_temp_cache
+
+    def get(url, **kwargs):
+        if kwargs["json"]["value"] == 2:
+            raise requests.HTTPError("500 Server Error")
+        return echo_get(url, **kwargs)
+
+    # the persistent failure of a row doesn't abort the run
+    with mock.patch("requests.Session.get", side_effect=get) as get:
+        report = client.warm(distance=[1, 2, 3], ra=[10, 20], dec=0)
+
+    assert report == (6, 0, 0, 0, 4, 2)
+    assert report.failed == 2
+    assert get.call_count == 6
+    assert len(client.cache) == 4
+
+
+def test_warm_invalid(fakeclient_no_cache):
+    client = fakeclient_no_cache
+    with pytest.raises(ValueError):
+        client.warm(ra=1, dec=1)
+    with pytest.raises(ValueError):
+        client.warm(distance=[1], velocity=[1], ra=1, dec=1)
+    with pytest.raises(ValueError):
+        client.warm(distance=[1], ra=1, dec=1, workers=0)
+    with pytest.raises(ValueError):
+        client.warm(distance=[1], ra=1, dec=1, chunksize=0)
+
+
+# =============================================================================
+# COMMAND LINE INTERFACE
+# =============================================================================
+
+
+def test_main_warm(tmp_path, echo_get, capsys):
+    argv = [
+        "warm",
+        "nam",
+        "--velocity",
+        "100:300:100",
+        "--system",
+        "galactic",
+        "--step",
+        "90",
+        "--cache-dir",
+        str(tmp_path),
+        "--workers",
+        "2",
+    ]
+
+    with mock.patch("requests.Session.get", side_effect=echo_get) as get:
+        pycf3.main(argv)
+
+    alpha, _ = pycf3.sky_tiling(90)
+    assert get.call_count == len(alpha) * 3
+    assert get.call_args[1]["json"]["system"] == "galactic"
+    out = capsys.readouterr().out
+    assert f"NAM cache warmed at {tmp_path}" in out
+    assert f"{len(alpha) * 3} fetched, 0 failed" in out
+
+
+def test_main_evict(tmp_path, echo_get, capsys):
+    cache = pycf3.default_cache(directory=str(tmp_path))
+    with mock.patch("requests.Session.get", side_effect=echo_get):
+        pycf3.CF3(cache=cache).calculate_velocity(ra=1, dec=1, distance=10)
+        pycf3.NAM(cache=cache).calculate_velocity(ra=1, dec=1, distance=10)
+
+    pycf3.main(["evict", "cf3", "--cache-dir", str(tmp_path)])
+
+    assert len(cache) == 1
+    out = capsys.readouterr().out
+    assert f"1 CF3 entries removed from {tmp_path}" in out
+
+
+@pytest.mark.parametrize(
+    "argv",
+    [
+        ["warm", "cf3"],
+        ["warm", "cf3", "--distance", "1:2"],
+        ["warm", "cf3", "--distance", "2:1:1"],
+        ["warm", "cf3", "--distance", "1:2:1", "--velocity", "1:2:1"],
+        ["warm", "foo", "--distance", "1:2:1"],
+        ["warm", "cf3", "--distance", "1:2:1", "--eviction-policy", "foo"],
+        ["evict", "foo"],
+        ["evict", "cf3", "--system", "foo"],
+    ],
+)
+def test_main_invalid(argv, capsys):
+    with pytest.raises(SystemExit):
+        pycf3.main(argv)